@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class DocumentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'documents'
+
+    def ready(self):
+        # Registers the background job handlers used by `run_workers`.
+        from documents.services import purge_service  # noqa: F401
+        # Connects the signals that invalidate the Company/BusinessEntity cache.
+        from documents.services import model_cache  # noqa: F401
@@ -0,0 +1,80 @@
+import uuid
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import Document
+
+
+def _parse_uuid(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be a valid UUID'})
+
+
+def _parse_datetime(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Must be an ISO 8601 datetime'})
+    return parsed
+
+
+def filter_documents(queryset, params):
+    company_id = _parse_uuid(params, 'company')
+    if company_id:
+        queryset = queryset.filter(company_id=company_id)
+
+    business_entity_id = _parse_uuid(params, 'business_entity')
+    if business_entity_id:
+        queryset = queryset.filter(business_entity_id=business_entity_id)
+
+    status = params.get('status')
+    if status:
+        if status not in Document.STATUS.values:
+            raise ValidationError({'status': f'Must be one of: {", ".join(Document.STATUS.values)}'})
+        queryset = queryset.filter(status=status)
+
+    created_after = _parse_datetime(params, 'created_after')
+    if created_after:
+        queryset = queryset.filter(created_at__gte=created_after)
+
+    created_before = _parse_datetime(params, 'created_before')
+    if created_before:
+        queryset = queryset.filter(created_at__lt=created_before)
+
+    return queryset
+
+
+def filter_validation_steps(queryset, params):
+    validation_flow_id = _parse_uuid(params, 'validation_flow')
+    if validation_flow_id:
+        queryset = queryset.filter(validation_flow_id=validation_flow_id)
+
+    return queryset
+
+
+def filter_validation_flow_templates(queryset, params):
+    company_id = _parse_uuid(params, 'company')
+    if company_id:
+        queryset = queryset.filter(company_id=company_id)
+
+    return queryset
+
+
+def parse_event_stream_filters(params):
+    company_id = _parse_uuid(params, 'company')
+    document_id = _parse_uuid(params, 'document')
+    return (
+        str(company_id) if company_id else None,
+        str(document_id) if document_id else None,
+    )
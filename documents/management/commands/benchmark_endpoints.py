@@ -0,0 +1,133 @@
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test document download or creation with N concurrent keep-alive clients, against the sync '
+        'endpoints (WSGI server) and/or their async variants (ASGI server). Start the servers first, e.g. '
+        '`gunicorn storage.wsgi -w 4 --threads 8 -b :8000` and `uvicorn storage.asgi:application --workers 4 --port 8001`, '
+        'with AWS_S3_ENDPOINT_URL pointing at a local S3 stand-in (MinIO, moto_server).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=['download', 'create'], default='download')
+        parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+        parser.add_argument('--sync-url', default='http://127.0.0.1:8000', help='Base URL of the WSGI server')
+        parser.add_argument('--async-url', default='http://127.0.0.1:8001', help='Base URL of the ASGI server')
+        parser.add_argument('--concurrency', type=int, default=1000, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=20000, help='Total requests per mode')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+        parser.add_argument('--document', help='Approved, uploaded document id (download endpoint)')
+        parser.add_argument('--company', help='Company id (create endpoint)')
+        parser.add_argument('--entity', help='Business entity id (create endpoint)')
+
+    def handle(self, *args, **options):
+        if options['endpoint'] == 'download' and not options['document']:
+            raise CommandError('--document is required for the download endpoint')
+        if options['endpoint'] == 'create' and not (options['company'] and options['entity']):
+            raise CommandError('--company and --entity are required for the create endpoint')
+
+        modes = ['sync', 'async'] if options['mode'] == 'both' else [options['mode']]
+        for mode in modes:
+            base_url = options['sync_url'] if mode == 'sync' else options['async_url']
+            method, path, body = self.build_request(options, mode)
+            stats = asyncio.run(self.run_load(base_url, method, path, body, options))
+            self.report(mode, stats)
+
+    def build_request(self, options, mode):
+        prefix = '/api/async' if mode == 'async' else '/api'
+        if options['endpoint'] == 'download':
+            return 'GET', f'{prefix}/documents/{options["document"]}/download/', None
+
+        body = json.dumps({
+            'company_id': options['company'],
+            'entity': {'entity_id': options['entity'], 'entity_type': 'vehicle'},
+            'document': {'name': 'benchmark.pdf', 'mime_type': 'application/pdf', 'size_bytes': 1024},
+        }).encode()
+        return 'POST', f'{prefix}/documents/', body
+
+    async def run_load(self, base_url, method, path, body, options):
+        url = urlsplit(base_url)
+        host, port = url.hostname, url.port or 80
+        headers = f'{method} {path} HTTP/1.1\r\nHost: {url.netloc}\r\nConnection: keep-alive\r\n'
+        if body is not None:
+            headers += f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+        request = headers.encode() + b'\r\n' + (body or b'')
+
+        remaining = [options['requests']]
+        latencies = []
+        statuses = Counter()
+
+        async def client():
+            reader = writer = None
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                started = time.perf_counter()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(host, port)
+                    writer.write(request)
+                    await writer.drain()
+                    status, keep_alive = await asyncio.wait_for(read_response(reader), options['timeout'])
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    statuses[type(e).__name__] += 1
+                    status, keep_alive = None, False
+                else:
+                    statuses[status] += 1
+                    latencies.append(time.perf_counter() - started)
+                if not keep_alive and writer is not None:
+                    writer.close()
+                    reader = writer = None
+            if writer is not None:
+                writer.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+        return {'elapsed': time.perf_counter() - started, 'latencies': latencies, 'statuses': statuses}
+
+    def report(self, mode, stats):
+        latencies = sorted(stats['latencies'])
+        total = sum(stats['statuses'].values())
+        line = f'{mode}: {total} requests in {stats["elapsed"]:.2f}s ({total / stats["elapsed"]:.0f} req/s)'
+        if len(latencies) >= 2:
+            percentiles = statistics.quantiles(latencies, n=100)
+            line += (
+                f', p50={percentiles[49] * 1000:.1f}ms p95={percentiles[94] * 1000:.1f}ms '
+                f'p99={percentiles[98] * 1000:.1f}ms'
+            )
+        line += ', ' + ', '.join(f'{status}={count}' for status, count in sorted(stats['statuses'].items(), key=str))
+        self.stdout.write(line)
+
+
+async def read_response(reader):
+    status_line = await reader.readuntil(b'\r\n')
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readuntil(b'\r\n')
+        if line == b'\r\n':
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+
+    return status, headers.get('connection') != 'close'
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.services.event_queue import SQSEventQueue, SpoolDirectoryEventQueue
+from documents.services.upload_events import apply_object_created_events, parse_object_created_events
+
+
+class Command(BaseCommand):
+    help = 'Consume S3 ObjectCreated notifications in batches and mark the matching documents as uploaded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue-url', default=settings.UPLOAD_EVENTS_QUEUE_URL,
+                            help='SQS queue receiving the bucket notifications')
+        parser.add_argument('--spool-dir', default=settings.UPLOAD_EVENTS_SPOOL_DIR,
+                            help='Directory used as a local queue instead of SQS')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Maximum number of messages processed per batch')
+        parser.add_argument('--once', action='store_true',
+                            help='Process a single batch and exit')
+
+    def handle(self, *args, **options):
+        if options['spool_dir']:
+            queue = SpoolDirectoryEventQueue(options['spool_dir'])
+        elif options['queue_url']:
+            queue = SQSEventQueue(options['queue_url'])
+        else:
+            raise CommandError('Set --queue-url (UPLOAD_EVENTS_QUEUE_URL) or --spool-dir (UPLOAD_EVENTS_SPOOL_DIR)')
+
+        while True:
+            messages = queue.receive(options['batch_size'])
+
+            events = []
+            for message in messages:
+                events.extend(parse_object_created_events(message.body))
+            updated = apply_object_created_events(events)
+            queue.ack(messages)
+
+            if messages:
+                self.stdout.write(f'Processed {len(messages)} messages, {len(events)} events, {updated} documents uploaded')
+
+            if options['once']:
+                break
+            if not messages and isinstance(queue, SpoolDirectoryEventQueue):
+                time.sleep(1)
@@ -0,0 +1,53 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from documents.services.purge_service import PURGE_BATCH_SIZE, purge_batch
+
+
+class Command(BaseCommand):
+    help = 'Drain the storage purge queue, deleting S3 objects of deleted documents with batched DeleteObjects calls'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE,
+                            help='Keys claimed per DeleteObjects call (S3 accepts up to 1000)')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Number of threads draining the queue in parallel')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue has no available entries')
+        parser.add_argument('--idle-sleep', type=float, default=5,
+                            help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.lock = threading.Lock()
+        self.totals = {'purged': 0, 'failed': 0}
+
+        threads = [threading.Thread(target=self.run_worker) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(self.style.SUCCESS(f'purged={self.totals["purged"]}, failed={self.totals["failed"]}'))
+
+    def run_worker(self):
+        batch_size = min(self.options['batch_size'], PURGE_BATCH_SIZE)
+        try:
+            while True:
+                purged, failed = purge_batch(batch_size)
+                with self.lock:
+                    self.totals['purged'] += purged
+                    self.totals['failed'] += failed
+
+                if purged or failed:
+                    if self.options['verbosity'] > 1:
+                        self.stdout.write(f'Purged {purged} objects, {failed} failed')
+                    continue
+                if self.options['once']:
+                    break
+                time.sleep(self.options['idle_sleep'])
+        finally:
+            connection.close()
@@ -0,0 +1,58 @@
+import queue
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from documents.models import Company
+from documents.services.stats_service import rebuild_company_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-company document counters served by /companies/{id}/stats/ from the document rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', action='append', dest='companies',
+                            help='Only rebuild this company id (can be repeated)')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of threads rebuilding companies in parallel')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.lock = threading.Lock()
+        self.totals = {'companies': 0, 'documents': 0, 'corrected_keys': 0}
+
+        companies = Company.objects.order_by('id').values_list('id', flat=True)
+        if options['companies']:
+            companies = companies.filter(id__in=options['companies'])
+        self.pending = queue.SimpleQueue()
+        for company_id in companies:
+            self.pending.put(company_id)
+
+        threads = [threading.Thread(target=self.run_worker) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{name}={count}' for name, count in self.totals.items())
+        ))
+
+    def run_worker(self):
+        try:
+            while True:
+                try:
+                    company_id = self.pending.get_nowait()
+                except queue.Empty:
+                    break
+                documents, corrected_keys = rebuild_company_stats(company_id)
+                with self.lock:
+                    self.totals['companies'] += 1
+                    self.totals['documents'] += documents
+                    self.totals['corrected_keys'] += corrected_keys
+
+                if self.options['verbosity'] > 1:
+                    self.stdout.write(f'Company {company_id}: {documents} documents, {corrected_keys} keys corrected')
+        finally:
+            connection.close()
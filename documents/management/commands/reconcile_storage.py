@@ -0,0 +1,164 @@
+import json
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Collate
+from django.utils import timezone
+
+from documents.models import Company, Document
+from documents.services.purge_service import delete_documents
+from documents.services.s3_service import delete_objects, iter_bucket_objects
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge-join the objects under companies/{company_id}/ against Document.bucket_key and '
+        'report (or clean) objects without rows and rows without objects'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', action='append', dest='companies',
+                            help='Only reconcile this company id (can be repeated)')
+        parser.add_argument('--delete-orphan-objects', action='store_true',
+                            help='Delete objects that have no document row')
+        parser.add_argument('--delete-missing-rows', action='store_true',
+                            help='Delete documents still pending upload whose object does not exist')
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help='Ignore objects and rows newer than this many hours')
+        parser.add_argument('--checkpoint', help='File used to save and resume progress')
+        parser.add_argument('--checkpoint-every', type=int, default=10000,
+                            help='Save the checkpoint every N reconciled keys')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched per round trip from the server-side cursor')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        self.checkpoint_path = Path(options['checkpoint']) if options['checkpoint'] else None
+        self.totals = {'matched': 0, 'orphan_objects': 0, 'missing_rows': 0, 'deleted_objects': 0, 'deleted_rows': 0}
+        self.pending_object_deletes = []
+        self.pending_row_deletes = []
+
+        checkpoint = self.load_checkpoint()
+
+        companies = Company.objects.order_by('id').values_list('id', flat=True)
+        if options['companies']:
+            companies = companies.filter(id__in=options['companies'])
+        if checkpoint and checkpoint['after_key'] is None:
+            companies = companies.filter(id__gt=checkpoint['company_id'])
+        elif checkpoint:
+            companies = companies.filter(id__gte=checkpoint['company_id'])
+
+        for company_id in companies.iterator(chunk_size=options['chunk_size']):
+            after_key = ''
+            if checkpoint and str(company_id) == checkpoint['company_id']:
+                after_key = checkpoint['after_key'] or ''
+            self.reconcile_prefix(str(company_id), f'companies/{company_id}/', after_key)
+            self.save_checkpoint(str(company_id), None)
+
+        if self.checkpoint_path and self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{name}={count}' for name, count in self.totals.items())
+        ))
+
+    def reconcile_prefix(self, company_id, prefix, after_key):
+        objects = iter_bucket_objects(prefix, start_after=after_key)
+        rows = self.iter_document_rows(prefix, after_key)
+
+        s3_object = next(objects, None)
+        row = next(rows, None)
+        processed = 0
+
+        while s3_object is not None or row is not None:
+            if row is None or (s3_object is not None and s3_object[0] < row[0]):
+                key = s3_object[0]
+                self.handle_orphan_object(*s3_object)
+                s3_object = next(objects, None)
+            elif s3_object is None or row[0] < s3_object[0]:
+                key = row[0]
+                self.handle_missing_row(*row)
+                row = next(rows, None)
+            else:
+                key = row[0]
+                self.totals['matched'] += 1
+                while row is not None and row[0] == key:
+                    row = next(rows, None)
+                s3_object = next(objects, None)
+
+            processed += 1
+            if processed % self.options['checkpoint_every'] == 0:
+                self.save_checkpoint(company_id, key)
+
+        self.flush()
+
+    def iter_document_rows(self, prefix, after_key):
+        rows = (
+            Document.objects
+            .annotate(key_c=Collate('bucket_key', 'C'))
+            .filter(key_c__startswith=prefix)
+            .order_by('key_c')
+        )
+        if after_key:
+            rows = rows.filter(key_c__gt=after_key)
+        return rows.values_list('bucket_key', 'id', 'upload_state', 'created_at').iterator(
+            chunk_size=self.options['chunk_size']
+        )
+
+    def handle_orphan_object(self, key, last_modified):
+        self.totals['orphan_objects'] += 1
+        self.report(f'orphan object: {key}')
+        if self.options['delete_orphan_objects'] and last_modified < self.cutoff:
+            self.pending_object_deletes.append(key)
+            if len(self.pending_object_deletes) >= 1000:
+                self.flush()
+
+    def handle_missing_row(self, key, document_id, upload_state, created_at):
+        self.totals['missing_rows'] += 1
+        self.report(f'missing object for document {document_id}: {key}')
+        if (
+            self.options['delete_missing_rows']
+            and upload_state == Document.UPLOAD_STATE.PENDING
+            and created_at < self.cutoff
+        ):
+            self.pending_row_deletes.append(document_id)
+            if len(self.pending_row_deletes) >= 1000:
+                self.flush()
+
+    def flush(self):
+        if self.pending_object_deletes:
+            failed = delete_objects(self.pending_object_deletes)
+            self.totals['deleted_objects'] += len(self.pending_object_deletes) - len(failed)
+            for key in failed:
+                self.stderr.write(f'could not delete object: {key}')
+            self.pending_object_deletes = []
+
+        if self.pending_row_deletes:
+            with transaction.atomic():
+                delete_documents(Document.objects.filter(pk__in=self.pending_row_deletes))
+            self.totals['deleted_rows'] += len(self.pending_row_deletes)
+            self.pending_row_deletes = []
+
+    def report(self, message):
+        if self.options['verbosity'] > 1:
+            self.stdout.write(message)
+
+    def load_checkpoint(self):
+        if not self.checkpoint_path or not self.checkpoint_path.exists():
+            return None
+        checkpoint = json.loads(self.checkpoint_path.read_text())
+        self.stdout.write(f'Resuming from company {checkpoint["company_id"]} after key {checkpoint["after_key"]!r}')
+        return checkpoint
+
+    def save_checkpoint(self, company_id, after_key):
+        if not self.checkpoint_path:
+            return
+        self.flush()
+        # after_key=None marks the company as finished: resume from the next one.
+        checkpoint = {'company_id': company_id, 'after_key': after_key}
+        tmp_path = self.checkpoint_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(checkpoint))
+        tmp_path.replace(self.checkpoint_path)
@@ -0,0 +1,70 @@
+import logging
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from documents.services.jobs import JOB_LEASE_SECONDS, claim_jobs, new_job_stats, record_job_stats, run_job
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of worker threads that claim and execute background jobs from the jobs table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of worker threads')
+        parser.add_argument('--batch-size', type=int, default=10,
+                            help='Jobs claimed per worker round trip')
+        parser.add_argument('--lease-seconds', type=int, default=JOB_LEASE_SECONDS,
+                            help='Seconds before a job claimed by a dead worker can be claimed again')
+        parser.add_argument('--idle-sleep', type=float, default=1,
+                            help='Seconds to wait when there are no jobs available')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when there are no jobs available')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stopping = threading.Event()
+
+        threads = [
+            threading.Thread(target=self.run_worker, name=f'worker-{index}')
+            for index in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping workers after their current jobs...')
+            self.stopping.set()
+            for thread in threads:
+                thread.join()
+
+    def run_worker(self):
+        stats = new_job_stats()
+        try:
+            while not self.stopping.is_set():
+                jobs = claim_jobs(self.options['batch_size'], self.options['lease_seconds'])
+                for job in jobs:
+                    try:
+                        run_job(job, stats)
+                    except Exception:
+                        # Falló al guardar el resultado: el job se vuelve a
+                        # reclamar al vencer su plazo y el worker sigue vivo.
+                        logger.exception('Could not record the result of job %s (%s)', job.pk, job.job_type)
+                record_job_stats(stats)
+
+                if jobs:
+                    if self.options['verbosity'] > 1:
+                        self.stdout.write(f'{threading.current_thread().name}: ran {len(jobs)} jobs')
+                    continue
+                if self.options['once']:
+                    break
+                self.stopping.wait(self.options['idle_sleep'])
+        finally:
+            connection.close()
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from documents.services.idempotency import SWEEP_BATCH_SIZE, sweep_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE,
+                            help='Records deleted per statement')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to wait between batches, to spread the load')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            deleted = sweep_expired_idempotency_keys(options['batch_size'])
+            total += deleted
+            if deleted < options['batch_size']:
+                break
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Deleted {deleted} expired keys')
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'deleted={total}'))
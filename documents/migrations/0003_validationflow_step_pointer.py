@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:16
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_step_pointer(apps, schema_editor):
+    ValidationFlow = apps.get_model('documents', 'ValidationFlow')
+    ValidationStep = apps.get_model('documents', 'ValidationStep')
+
+    flow_steps = ValidationStep.objects.filter(validation_flow=OuterRef('pk')).order_by().values('validation_flow')
+    ValidationFlow.objects.update(
+        total_steps=Coalesce(
+            Subquery(flow_steps.annotate(total=Count('pk')).values('total')),
+            Value(0),
+        ),
+        current_order=Coalesce(
+            Subquery(flow_steps.filter(status='P').annotate(first=Min('order')).values('first')),
+            Subquery(flow_steps.annotate(last=Max('order')).values('last')) + 1,
+            Value(1),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_document_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='validationflow',
+            name='current_order',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='validationflow',
+            name='total_steps',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_step_pointer, migrations.RunPython.noop),
+    ]
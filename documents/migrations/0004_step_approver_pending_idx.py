@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_validationflow_step_pointer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='validationstep',
+            index=models.Index(condition=models.Q(('status', 'P')), fields=['approver_user_id', 'status'], name='step_approver_pending_idx'),
+        ),
+    ]
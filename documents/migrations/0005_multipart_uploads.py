@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_step_approver_pending_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='max_upload_size_bytes',
+            field=models.PositiveBigIntegerField(default=10485760),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='upload_id',
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_multipart_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='etag',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        # Documents created before upload tracking existed are assumed to be uploaded.
+        migrations.AddField(
+            model_name='document',
+            name='upload_state',
+            field=models.CharField(choices=[('P', 'Pending'), ('U', 'Uploaded')], default='U', max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='upload_state',
+            field=models.CharField(choices=[('P', 'Pending'), ('U', 'Uploaded')], default='P', max_length=1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:22
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_document_upload_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(django.db.models.functions.comparison.Collate('bucket_key', 'C'), name='document_bucket_key_c_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('txid', models.BigIntegerField(db_default=models.Func(function='txid_current', output_field=models.BigIntegerField()))),
+                ('event_type', models.CharField(choices=[('document.created', 'Document created'), ('step.approved', 'Step approved'), ('document.approved', 'Document approved'), ('document.rejected', 'Document rejected'), ('document.deleted', 'Document deleted')], max_length=50)),
+                ('document_id', models.UUIDField()),
+                ('company_id', models.UUIDField()),
+                ('status', models.CharField(blank=True, choices=[('P', 'Pending'), ('A', 'Approved'), ('R', 'Rejected')], max_length=1, null=True)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['txid', 'id'], name='document_event_txid_idx')],
+            },
+        ),
+    ]
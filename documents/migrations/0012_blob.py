@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:45
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0011_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='bucket_key',
+            field=models.CharField(db_index=True, max_length=1250),
+        ),
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sha256', models.CharField(max_length=64)),
+                ('bucket_key', models.CharField(max_length=1250, unique=True)),
+                ('size_bytes', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('upload_state', models.CharField(choices=[('P', 'Pending'), ('U', 'Uploaded')], default='P', max_length=1)),
+                ('etag', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='blobs', to='documents.company')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='documents', to='documents.blob'),
+        ),
+        migrations.AddConstraint(
+            model_name='document',
+            constraint=models.UniqueConstraint(condition=models.Q(('blob__isnull', True)), fields=('bucket_key',), name='document_bucket_key_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='blob',
+            constraint=models.UniqueConstraint(fields=('company', 'sha256'), name='blob_company_sha256_uniq'),
+        ),
+    ]
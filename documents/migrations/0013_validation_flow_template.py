@@ -0,0 +1,78 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:58
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_current_approver(apps, schema_editor):
+    ValidationFlow = apps.get_model('documents', 'ValidationFlow')
+    ValidationStep = apps.get_model('documents', 'ValidationStep')
+
+    ValidationFlow.objects.filter(enable=True).update(
+        current_approver_user_id=Subquery(
+            ValidationStep.objects
+            .filter(validation_flow=OuterRef('pk'), order=OuterRef('current_order'), status='P')
+            .values('approver_user_id')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValidationDecision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField()),
+                ('approver_user_id', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('A', 'Approved'), ('R', 'Rejected')], max_length=1)),
+                ('reason', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ValidationFlowTemplate',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('steps', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='validationstep',
+            name='step_approver_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='validationflow',
+            name='current_approver_user_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='validationdecision',
+            name='validation_flow',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='decisions', to='documents.validationflow'),
+        ),
+        migrations.AddField(
+            model_name='validationflowtemplate',
+            name='company',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='validation_flow_templates', to='documents.company'),
+        ),
+        migrations.AddField(
+            model_name='validationflow',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='flows', to='documents.validationflowtemplate'),
+        ),
+        migrations.RunPython(backfill_current_approver, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='validationflow',
+            index=models.Index(condition=models.Q(('enable', True)), fields=['current_approver_user_id', 'id'], name='flow_current_approver_idx'),
+        ),
+    ]
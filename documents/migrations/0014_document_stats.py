@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0013_validation_flow_template'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('V', 'Vehicle'), ('E', 'Employee'), ('O', 'Other')], max_length=1)),
+                ('status', models.CharField(blank=True, max_length=1)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('document_count', models.BigIntegerField(default=0)),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='document_stats', to='documents.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'entity_type', 'status', 'shard'), name='documentstats_key_uniq')],
+            },
+        ),
+    ]
@@ -1,12 +1,20 @@
 from django.db import models
+from django.db.models import Func
+from django.db.models.functions import Collate
+from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 import uuid
 
 
+DEFAULT_MAX_UPLOAD_SIZE_BYTES = 10 * 1024 * 1024
+
+
 class Company(models.Model):
     id =  models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
+    max_upload_size_bytes = models.PositiveBigIntegerField(default=DEFAULT_MAX_UPLOAD_SIZE_BYTES)
 
 
 class BusinessEntity(models.Model):
@@ -22,6 +30,12 @@ class BusinessEntity(models.Model):
 
     company = models.ForeignKey(Company, on_delete=models.PROTECT, related_name='entities')
 
+class DocumentQuerySet(models.QuerySet):
+
+    def alive(self):
+        return self.filter(deleted_at__isnull=True)
+
+
 class Document(models.Model):
 
     class STATUS(models.TextChoices):
@@ -29,11 +43,15 @@ class Document(models.Model):
         APPROVED = 'A', 'Approved'
         REJECTED = 'R', 'Rejected'
 
+    class UPLOAD_STATE(models.TextChoices):
+        PENDING = 'P', 'Pending'
+        UPLOADED = 'U', 'Uploaded'
+
     id =  models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     mime_type = models.CharField(max_length=255)
     size_bytes = models.PositiveBigIntegerField(validators=[MinValueValidator(0)])
-    bucket_key = models.CharField(max_length=1250, unique=True, db_index=True)
+    bucket_key = models.CharField(max_length=1250, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(
@@ -44,17 +62,114 @@ class Document(models.Model):
         default=None
     )
     created_by = models.UUIDField(null=True, blank=True)
+    upload_id = models.CharField(max_length=1024, null=True, blank=True)
+    upload_state = models.CharField(max_length=1, choices=UPLOAD_STATE.choices, default=UPLOAD_STATE.PENDING)
+    etag = models.CharField(max_length=255, null=True, blank=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
 
+    blob = models.ForeignKey('Blob', on_delete=models.PROTECT, null=True, blank=True, related_name='documents')
     business_entity = models.ForeignKey(BusinessEntity, on_delete=models.PROTECT, related_name='documents')
     company = models.ForeignKey(Company, on_delete=models.PROTECT, related_name='documents')
 
+    objects = DocumentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='document_created_idx'),
+            models.Index(fields=['company', 'created_at', 'id'], name='document_company_created_idx'),
+            models.Index(fields=['business_entity', 'created_at', 'id'], name='document_entity_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='document_status_created_idx'),
+            models.Index(Collate('bucket_key', 'C'), name='document_bucket_key_c_idx'),
+        ]
+        constraints = [
+            # Los documentos deduplicados comparten el `bucket_key` de su blob.
+            models.UniqueConstraint(
+                fields=['bucket_key'],
+                condition=models.Q(blob__isnull=True),
+                name='document_bucket_key_uniq',
+            ),
+        ]
+
+    def get_validation_flow(self):
+        try:
+            return self.validation_flow
+        except ValidationFlow.DoesNotExist:
+            return None
+
+
+class Blob(models.Model):
+    """
+    Contenido subido a S3 identificado por su SHA-256 dentro de una empresa.
+    Varios documentos con el mismo contenido comparten el objeto: `ref_count`
+    cuenta los documentos vivos que lo usan y el objeto se purga al llegar a 0.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    sha256 = models.CharField(max_length=64)
+    bucket_key = models.CharField(max_length=1250, unique=True)
+    size_bytes = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    upload_state = models.CharField(max_length=1, choices=Document.UPLOAD_STATE.choices, default=Document.UPLOAD_STATE.PENDING)
+    etag = models.CharField(max_length=255, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    company = models.ForeignKey(Company, on_delete=models.PROTECT, related_name='blobs')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'sha256'], name='blob_company_sha256_uniq'),
+        ]
+
+
+class ValidationFlowTemplate(models.Model):
+    """
+    Cadena de aprobación reutilizable de una empresa. `steps` es la lista
+    `[{"order": 1, "approver_user_id": "..."}, ...]` ordenada por `order`. Las
+    plantillas no se modifican una vez creadas: los flujos en curso dependen
+    de sus pasos.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255)
+    steps = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    company = models.ForeignKey(Company, on_delete=models.PROTECT, related_name='validation_flow_templates')
+
+    def get_approver(self, order):
+        for step in self.steps:
+            if step['order'] == order:
+                return step['approver_user_id']
+        return None
+
 
 class ValidationFlow(models.Model):
+    """
+    Estado de validación de un documento. Los flujos creados desde una
+    plantilla no tienen filas `ValidationStep`: su progreso es
+    `current_order` más sus `ValidationDecision`.
+
+    `current_approver_user_id` es el aprobador del paso actual de cualquier
+    flujo habilitado y alimenta la bandeja de pendientes.
+    """
     id =  models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     enable = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    current_order = models.PositiveIntegerField(default=1)
+    total_steps = models.PositiveIntegerField(default=0)
+    current_approver_user_id = models.CharField(max_length=255, blank=True, null=True)
 
     document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='validation_flow')
+    template = models.ForeignKey(
+        ValidationFlowTemplate, on_delete=models.PROTECT, null=True, blank=True, related_name='flows'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['current_approver_user_id', 'id'],
+                condition=models.Q(enable=True),
+                name='flow_current_approver_idx',
+            ),
+        ]
 
 class ValidationStep(models.Model):
 
@@ -73,3 +188,147 @@ class ValidationStep(models.Model):
 
     class Meta:
         ordering = ['order']
+
+
+class ValidationDecision(models.Model):
+    """
+    Registro de las aprobaciones y rechazos de un flujo de plantilla. Solo se
+    inserta: una fila por decisión, no por paso.
+    """
+    order = models.PositiveIntegerField()
+    approver_user_id = models.CharField(max_length=255)
+    status = models.CharField(max_length=1, choices=ValidationStep.STATUS.choices)
+    reason = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    validation_flow = models.ForeignKey(ValidationFlow, on_delete=models.CASCADE, related_name='decisions')
+
+
+class StoragePurge(models.Model):
+    bucket_key = models.CharField(max_length=1250)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at'], name='storagepurge_available_idx'),
+        ]
+
+
+class Job(models.Model):
+    class STATUS(models.TextChoices):
+        QUEUED = 'Q', 'Queued'
+        RUNNING = 'R', 'Running'
+        FAILED = 'F', 'Failed'
+
+    job_type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=1, choices=STATUS.choices, default=STATUS.QUEUED)
+    unique_key = models.CharField(max_length=255, blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['available_at'],
+                name='job_available_idx',
+                condition=~models.Q(status='F'),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['job_type', 'unique_key'],
+                name='job_unique_queued_key',
+                condition=models.Q(status='Q'),
+            ),
+        ]
+
+
+class JobStats(models.Model):
+    job_type = models.CharField(max_length=100, primary_key=True)
+    completed = models.PositiveBigIntegerField(default=0)
+    retried = models.PositiveBigIntegerField(default=0)
+    failed = models.PositiveBigIntegerField(default=0)
+    runtime_ms = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class DocumentStats(models.Model):
+    """
+    Contadores de documentos vivos y de sus `size_bytes` por empresa, tipo de
+    entidad y estado (`''` si el documento no tiene estado). Cada clave se
+    reparte en `shard`s: las escrituras suman a un shard al azar para no
+    competir por la misma fila, y las lecturas suman todos. Un shard puede
+    quedar en negativo; la suma de la clave no.
+    """
+    entity_type = models.CharField(max_length=1, choices=BusinessEntity.ENTITY_TYPE.choices)
+    status = models.CharField(max_length=1, blank=True)
+    shard = models.PositiveSmallIntegerField()
+    document_count = models.BigIntegerField(default=0)
+    size_bytes = models.BigIntegerField(default=0)
+
+    company = models.ForeignKey(Company, on_delete=models.PROTECT, related_name='document_stats')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'entity_type', 'status', 'shard'], name='documentstats_key_uniq'),
+        ]
+
+
+class DocumentEvent(models.Model):
+    """
+    Outbox de cambios de estado de documentos. Se escribe en la misma
+    transacción que el cambio y nunca se actualiza.
+
+    `txid` es el id de la transacción que escribió el evento: el feed de
+    cambios ordena por `(txid, id)` y solo expone transacciones anteriores a
+    la más antigua en curso, así un consumidor nunca se salta un evento que
+    se confirma tarde.
+    """
+    class EVENT_TYPE(models.TextChoices):
+        CREATED = 'document.created', 'Document created'
+        STEP_APPROVED = 'step.approved', 'Step approved'
+        APPROVED = 'document.approved', 'Document approved'
+        REJECTED = 'document.rejected', 'Document rejected'
+        DELETED = 'document.deleted', 'Document deleted'
+
+    txid = models.BigIntegerField(db_default=Func(function='txid_current', output_field=models.BigIntegerField()))
+    event_type = models.CharField(max_length=50, choices=EVENT_TYPE.choices)
+    document_id = models.UUIDField()
+    company_id = models.UUIDField()
+    status = models.CharField(max_length=1, choices=Document.STATUS.choices, blank=True, null=True)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='document_event_txid_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Respuesta guardada de una petición con cabecera `Idempotency-Key`.
+    Mientras `response_status` es nulo la petición original sigue en curso.
+    """
+    scope = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    request_fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
@@ -0,0 +1,182 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor sobre una clave compuesta (`ordering`).
+
+    El cursor codifica los valores de la última fila devuelta, de modo que la
+    página siguiente se obtiene con un rango sobre el índice y no con OFFSET:
+    la página N cuesta lo mismo que la página 1.
+    """
+    ordering = ('-created_at', '-id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request, queryset.model)
+        if cursor is not None:
+            queryset = queryset.filter(self.build_keyset_filter(cursor))
+
+        rows = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor opaco devuelto en `next` por la página anterior',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Número de resultados por página (máximo {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size is None:
+            return self.page_size
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Must be an integer'})
+        if page_size <= 0:
+            raise ValidationError({self.page_size_query_param: 'Must be greater than 0'})
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [getattr(last, field.lstrip('-')) for field in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values))
+
+    def encode_cursor(self, values):
+        payload = json.dumps([
+            value.isoformat() if hasattr(value, 'isoformat') else str(value)
+            for value in values
+        ])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            raw_values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if not isinstance(raw_values, list) or len(raw_values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, raw_values)
+            ]
+        except (ValueError, TypeError, binascii.Error, DjangoValidationError):
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor'})
+
+    def build_keyset_filter(self, values):
+        """
+        Traduce `(a, b) < (x, y)` a `a <= x AND (a < x OR (a = x AND b < y))`.
+
+        La primera condición es un rango simple sobre la columna inicial del
+        índice, lo que permite a Postgres recorrerlo sin ordenar en memoria.
+        """
+        fields = [field.lstrip('-') for field in self.ordering]
+        descending = self.ordering[0].startswith('-')
+        strict = 'lt' if descending else 'gt'
+        inclusive = 'lte' if descending else 'gte'
+
+        keyset = Q()
+        for position, (field, value) in enumerate(zip(fields, values)):
+            clause = Q(**{f'{field}__{strict}': value})
+            for previous_field, previous_value in zip(fields[:position], values[:position]):
+                clause &= Q(**{previous_field: previous_value})
+            keyset |= clause
+
+        return Q(**{f'{fields[0]}__{inclusive}': values[0]}) & keyset
+
+
+class DocumentCursorPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class PendingStepCursorPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class ChangeFeedPagination(KeysetPagination):
+    """
+    Paginación del feed de cambios. Además de `next`, devuelve siempre en
+    `since` el cursor desde el que pedir los cambios siguientes, aunque la
+    página esté vacía.
+    """
+    ordering = ('txid', 'id')
+    cursor_query_param = 'since'
+    page_size = 500
+    max_page_size = 5000
+
+    def get_paginated_response(self, data):
+        if self.page:
+            last = self.page[-1]
+            since = self.encode_cursor([getattr(last, field) for field in self.ordering])
+        else:
+            since = self.request.query_params.get(self.cursor_query_param)
+        return Response({
+            'next': self.get_next_link(),
+            'since': since,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['since'] = {
+            'type': 'string',
+            'nullable': True,
+            'description': 'Cursor para pedir los cambios posteriores a esta página',
+        }
+        return response_schema
@@ -1,5 +1,12 @@
 from .company import CompanySerializer
 from .businessentity import BusinessEntitySerializer
 from .document import DocumentSerializer
-from .validationflow import ValidationFlowSerializer
-from .validationstep import ValidationStepSerializer
\ No newline at end of file
+from .validationflow import ValidationFlowSerializer, ValidationFlowWithStepsSerializer
+from .validationflowtemplate import ValidationFlowTemplateSerializer
+from .validationstep import ValidationStepSerializer
+from .pendingstep import PendingStepSerializer
+from .documentevent import DocumentEventSerializer
+from .documentaction import (
+    BulkCreateDocumentsSerializer, ApproveDocumentSerializer, RejectDocumentSerializer,
+    CompleteMultipartUploadSerializer, BulkApproveDocumentsSerializer, BulkRejectDocumentsSerializer
+)
@@ -4,5 +4,5 @@ from documents.models import Company
 class CompanySerializer(serializers.ModelSerializer):
     class Meta:
         model = Company
-        fields = ['id','name','created_at']
+        fields = ['id','name','created_at','max_upload_size_bytes']
         read_only_fields = ['id','created_at']
@@ -1,15 +1,36 @@
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from documents.models import Document
+from .validationflow import ValidationFlowSerializer, ValidationFlowWithStepsSerializer
 
 class DocumentSerializer(serializers.ModelSerializer):
+    EXPANDABLE_FIELDS = ('validation_flow', 'steps')
+
     class Meta:
         model = Document
         fields = [
             'id', 'name', 'mime_type', 'size_bytes',
             'bucket_key', 'created_at', 'updated_at',
-            'status', 'company', 'business_entity'
+            'status', 'upload_state', 'etag', 'company', 'business_entity'
         ]
         read_only_fields = [
             'id', 'name', 'mime_type', 'size_bytes',
-            'bucket_key', 'created_at', 'updated_at', 'status'
+            'bucket_key', 'created_at', 'updated_at', 'status',
+            'upload_state', 'etag'
         ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.context.get('expand', ())
+        if 'validation_flow' in expand or 'steps' in expand:
+            self.fields['validation_flow'] = serializers.SerializerMethodField()
+
+    @extend_schema_field(ValidationFlowWithStepsSerializer(allow_null=True))
+    def get_validation_flow(self, document):
+        flow = document.get_validation_flow()
+        if flow is None:
+            return None
+
+        if 'steps' in self.context.get('expand', ()):
+            return ValidationFlowWithStepsSerializer(flow).data
+        return ValidationFlowSerializer(flow).data
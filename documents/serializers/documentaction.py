@@ -0,0 +1,35 @@
+from rest_framework import serializers
+
+
+class ApproveDocumentSerializer(serializers.Serializer):
+    approver_user_id = serializers.CharField(help_text='ID del usuario que aprueba el documento')
+    reason = serializers.CharField(required=False, help_text='Razón de la aprobación (opcional)')
+
+
+class RejectDocumentSerializer(serializers.Serializer):
+    approver_user_id = serializers.CharField(help_text='ID del usuario que rechaza el documento')
+    reason = serializers.CharField(help_text='Razón obligatoria del rechazo')
+
+
+class BulkApproveDocumentsSerializer(ApproveDocumentSerializer):
+    document_ids = serializers.ListField(child=serializers.UUIDField())
+
+
+class BulkRejectDocumentsSerializer(RejectDocumentSerializer):
+    document_ids = serializers.ListField(child=serializers.UUIDField())
+
+
+class BulkCreateDocumentsSerializer(serializers.Serializer):
+    documents = serializers.ListField(
+        child=serializers.DictField(),
+        help_text='Lista de documentos con el mismo formato que la creación individual',
+    )
+
+
+class MultipartPartSerializer(serializers.Serializer):
+    part_number = serializers.IntegerField()
+    etag = serializers.CharField(help_text='ETag devuelto por S3 al subir la parte')
+
+
+class CompleteMultipartUploadSerializer(serializers.Serializer):
+    parts = MultipartPartSerializer(many=True)
@@ -0,0 +1,9 @@
+from rest_framework import serializers
+from documents.models import DocumentEvent
+
+
+class DocumentEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentEvent
+        fields = ['id','event_type','document_id','company_id','status','payload','created_at']
+        read_only_fields = fields
@@ -0,0 +1,19 @@
+from rest_framework import serializers
+from documents.models import ValidationFlow, ValidationStep
+from .document import DocumentSerializer
+
+
+class PendingStepSerializer(serializers.ModelSerializer):
+    order = serializers.IntegerField(source='current_order', read_only=True)
+    approver_user_id = serializers.CharField(source='current_approver_user_id', read_only=True)
+    validation_flow_id = serializers.UUIDField(source='id', read_only=True)
+    status = serializers.SerializerMethodField()
+    document = DocumentSerializer(read_only=True)
+
+    class Meta:
+        model = ValidationFlow
+        fields = ['order','approver_user_id','validation_flow_id','status','document']
+        read_only_fields = fields
+
+    def get_status(self, flow) -> str:
+        return ValidationStep.STATUS.PENDING
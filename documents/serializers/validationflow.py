@@ -1,9 +1,38 @@
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
-from documents.models import ValidationFlow
+from documents.models import ValidationFlow, ValidationStep
+from .validationstep import ValidationStepSerializer
 
 
 class ValidationFlowSerializer(serializers.ModelSerializer):
     class Meta:
         model = ValidationFlow
-        fields = ['id','enable','created_at']
-        read_only_fields = ['id','created_at']
+        fields = ['id','enable','created_at','template','current_order']
+        read_only_fields = ['id','created_at','template','current_order']
+
+
+class ValidationFlowWithStepsSerializer(ValidationFlowSerializer):
+    steps = serializers.SerializerMethodField()
+
+    class Meta(ValidationFlowSerializer.Meta):
+        fields = ValidationFlowSerializer.Meta.fields + ['steps']
+
+    @extend_schema_field(ValidationStepSerializer(many=True))
+    def get_steps(self, flow):
+        if not flow.template_id:
+            return ValidationStepSerializer(flow.steps.all(), many=True).data
+
+        # Pasos de la plantilla con el estado que se deduce del progreso del flujo.
+        decided = {decision.order: decision.status for decision in flow.decisions.all()}
+        return [
+            {
+                'id': None,
+                'order': step['order'],
+                'approver_user_id': step['approver_user_id'],
+                'validation_flow_id': flow.pk,
+                'status': decided.get(step['order'], (
+                    ValidationStep.STATUS.APPROVED if step['order'] < flow.current_order else ValidationStep.STATUS.PENDING
+                )),
+            }
+            for step in flow.template.steps
+        ]
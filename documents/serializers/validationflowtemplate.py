@@ -0,0 +1,30 @@
+from rest_framework import serializers
+from documents.models import ValidationFlowTemplate
+
+
+class ValidationFlowTemplateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ValidationFlowTemplate
+        fields = ['id','name','company','steps','created_at']
+        read_only_fields = ['id','created_at']
+
+    def validate_steps(self, steps):
+        if not isinstance(steps, list) or not steps:
+            raise serializers.ValidationError('steps must be a non-empty list')
+
+        for step in steps:
+            if (
+                not isinstance(step, dict)
+                or not isinstance(step.get('order'), int)
+                or not isinstance(step.get('approver_user_id'), str)
+                or not step['approver_user_id']
+            ):
+                raise serializers.ValidationError('Each step requires an integer order and approver_user_id')
+
+        if sorted(step['order'] for step in steps) != list(range(1, len(steps) + 1)):
+            raise serializers.ValidationError('Step orders must be consecutive integers starting at 1')
+
+        return [
+            {'order': step['order'], 'approver_user_id': step['approver_user_id']}
+            for step in sorted(steps, key=lambda step: step['order'])
+        ]
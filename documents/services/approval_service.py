@@ -0,0 +1,299 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Max, Min, OuterRef, Subquery, TextField, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from documents.models import (
+    Document, DocumentEvent, ValidationDecision, ValidationFlow, ValidationFlowTemplate, ValidationStep
+)
+from documents.services.outbox import build_document_event, record_document_events
+from documents.services.stats_service import document_stats_change, record_document_stats
+
+
+MAX_BULK_DECISIONS = 5000
+
+
+def refresh_current_approvers(flows):
+    """
+    Recalcula `current_approver_user_id` de los flujos con filas
+    `ValidationStep` a partir del paso pendiente en `current_order`. Los
+    flujos de plantilla lo mantienen al aplicar cada decisión.
+    """
+    return flows.filter(template__isnull=True).update(
+        current_approver_user_id=Subquery(
+            ValidationStep.objects
+            .filter(validation_flow=OuterRef('pk'), order=OuterRef('current_order'), status=ValidationStep.STATUS.PENDING)
+            .values('approver_user_id')[:1]
+        ),
+    )
+
+
+def refresh_step_flows(flows):
+    """
+    Recalcula el progreso de los flujos con filas `ValidationStep` tras
+    crear, modificar o borrar pasos: `total_steps` pasa a ser el orden del
+    último paso (lo que compara la aprobación para saber si es el último),
+    `current_order` el primer paso pendiente, o el actual acotado a
+    `total_steps` si no queda ninguno, y después el aprobador actual.
+    """
+    flows = flows.filter(template__isnull=True)
+    steps = ValidationStep.objects.filter(validation_flow=OuterRef('pk')).order_by().values('validation_flow')
+    flows.update(total_steps=Coalesce(Subquery(steps.annotate(last=Max('order')).values('last')), 0))
+    flows.update(current_order=Coalesce(
+        Subquery(steps.filter(status=ValidationStep.STATUS.PENDING).annotate(first=Min('order')).values('first')),
+        Least(F('current_order'), Greatest(F('total_steps'), 1)),
+    ))
+    return refresh_current_approvers(flows)
+
+
+def _approver_step(flow, steps):
+    # Un aprobador puede tener varios pasos en un flujo: le toca el primero
+    # pendiente desde `current_order`; si no le queda ninguno, se devuelve el
+    # último suyo (ya decidido) para responder que no está pendiente.
+    pending = [
+        step for step in steps
+        if step.status == ValidationStep.STATUS.PENDING and step.order >= flow.current_order
+    ]
+    if pending:
+        return min(pending, key=lambda step: step.order)
+    return max(steps, key=lambda step: step.order, default=None)
+
+
+def _template_steps(flow, approver_user_id):
+    # Pasos del aprobador en la plantilla como ValidationStep sin guardar: los
+    # anteriores a `current_order` ya están aprobados.
+    return [
+        ValidationStep(
+            order=step['order'],
+            approver_user_id=approver_user_id,
+            status=ValidationStep.STATUS.PENDING if step['order'] >= flow.current_order else ValidationStep.STATUS.APPROVED,
+        )
+        for step in flow.template.steps
+        if step['approver_user_id'] == approver_user_id
+    ]
+
+
+def _load_decisions(document_ids, approver_user_id):
+    """
+    Bloquea en una sola sentencia los flujos de los documentos, ordenados por
+    id para que dos lotes que se solapan no se bloqueen mutuamente, y carga el
+    paso del aprobador en cada uno. Devuelve `(documents, flows, steps)`
+    indexados por id de documento.
+    """
+    documents = (
+        Document.objects.alive()
+        .only('id', 'company_id', 'status', 'size_bytes')
+        .annotate(entity_type=F('business_entity__entity_type'))
+        .in_bulk(document_ids)
+    )
+    flows = {
+        flow.document_id: flow
+        for flow in ValidationFlow.objects
+        .select_for_update()
+        .filter(document_id__in=documents.keys())
+        .order_by('id')
+        .only('id', 'document_id', 'enable', 'total_steps', 'current_order', 'template_id')
+    }
+    enabled_flows = [flow for flow in flows.values() if flow.enable]
+
+    templates = ValidationFlowTemplate.objects.in_bulk({flow.template_id for flow in enabled_flows if flow.template_id})
+    approver_steps = defaultdict(list)
+    for step in (
+        ValidationStep.objects
+        .filter(validation_flow_id__in=[flow.pk for flow in enabled_flows if not flow.template_id], approver_user_id=approver_user_id)
+        .only('id', 'validation_flow_id', 'order', 'status', 'approver_user_id')
+    ):
+        approver_steps[step.validation_flow_id].append(step)
+
+    steps = {}
+    for flow in enabled_flows:
+        if flow.template_id:
+            flow.template = templates[flow.template_id]
+            steps[flow.pk] = _approver_step(flow, _template_steps(flow, approver_user_id))
+        else:
+            steps[flow.pk] = _approver_step(flow, approver_steps[flow.pk])
+
+    return documents, flows, {document_id: steps.get(flow.pk) for document_id, flow in flows.items()}
+
+
+def _check_decision(document_id, documents, flows, steps, approver_user_id, verb):
+    if document_id not in documents:
+        return 404, 'Document not found'
+    flow = flows.get(document_id)
+    if not flow or not flow.enable:
+        return 400, 'Validation flow is not enabled'
+    step = steps.get(document_id)
+    if step is None:
+        return 403, f'User {approver_user_id} is not authorized to {verb} this document'
+    if step.status != ValidationStep.STATUS.PENDING:
+        return 400, 'Your validation step is not pending'
+    return None
+
+
+def _build_decision(flow, step, status, reason):
+    return ValidationDecision(
+        validation_flow=flow,
+        order=step.order,
+        approver_user_id=step.approver_user_id,
+        status=status,
+        reason=reason,
+    )
+
+
+def _advance_template_flows(template_flows):
+    # Los flujos que avanzan al mismo paso de la misma plantilla comparten
+    # `current_order` y aprobador: un UPDATE por grupo, no por flujo.
+    groups = {}
+    for flow, order in template_flows:
+        groups.setdefault((flow.template_id, order), []).append(flow)
+    for (template_id, order), flows in groups.items():
+        ValidationFlow.objects.filter(pk__in=[flow.pk for flow in flows]).update(
+            current_order=order + 1,
+            current_approver_user_id=flows[0].template.get_approver(order + 1),
+        )
+
+
+def _approve_step_flows(step_flows, approver_user_id, reason):
+    # Un UPDATE por orden aprobado: el paso del aprobador y los pendientes
+    # anteriores quedan aprobados, y el flujo pasa al orden siguiente.
+    groups = defaultdict(list)
+    for flow_id, order in step_flows:
+        groups[order].append(flow_id)
+    for order, flow_ids in groups.items():
+        ValidationStep.objects.filter(
+            validation_flow_id__in=flow_ids,
+            status=ValidationStep.STATUS.PENDING,
+            order__lte=order,
+        ).update(
+            status=ValidationStep.STATUS.APPROVED,
+            reason=Case(
+                When(order=order, approver_user_id=approver_user_id, then=Value(reason)),
+                default=F('reason'), output_field=TextField(),
+            ),
+        )
+        ValidationFlow.objects.filter(pk__in=flow_ids).update(current_order=order + 1)
+    refresh_current_approvers(ValidationFlow.objects.filter(pk__in=[flow_id for flow_id, _ in step_flows]))
+
+
+def approve_documents(document_ids, approver_user_id, reason=''):
+    """
+    Aprueba el paso de `approver_user_id` en cada documento de `document_ids`:
+    el paso y los anteriores pendientes quedan aprobados, y el documento si
+    era el último. Aplica el lote con un UPDATE por tabla y devuelve un
+    resultado por documento, en el orden recibido.
+    """
+    with transaction.atomic():
+        documents, flows, steps = _load_decisions(document_ids, approver_user_id)
+
+        results = {}
+        step_flows, template_flows, completed_flows, completed_documents = [], [], [], []
+        decisions, events, stats = [], [], []
+        for document_id in document_ids:
+            error = _check_decision(document_id, documents, flows, steps, approver_user_id, 'approve')
+            if error:
+                results[document_id] = error
+                continue
+
+            document, flow, step = documents[document_id], flows[document_id], steps[document_id]
+            is_last_step = step.order == flow.total_steps
+            if flow.template_id:
+                decisions.append(_build_decision(flow, step, ValidationStep.STATUS.APPROVED, reason))
+                template_flows.append((flow, step.order))
+            else:
+                step_flows.append((flow.pk, step.order))
+
+            if is_last_step:
+                completed_flows.append(flow.pk)
+                completed_documents.append(document_id)
+                stats.append(document_stats_change(document, sign=-1))
+                document.status = Document.STATUS.APPROVED
+                stats.append(document_stats_change(document))
+                results[document_id] = (200, 'Document approved')
+                events.append(build_document_event(
+                    DocumentEvent.EVENT_TYPE.APPROVED, document, status=Document.STATUS.APPROVED,
+                    step_order=step.order, approver_user_id=approver_user_id,
+                ))
+            else:
+                results[document_id] = (200, 'Step approved')
+                events.append(build_document_event(
+                    DocumentEvent.EVENT_TYPE.STEP_APPROVED, document,
+                    step_order=step.order, approver_user_id=approver_user_id,
+                ))
+
+        if step_flows:
+            _approve_step_flows(step_flows, approver_user_id, reason)
+        if template_flows:
+            _advance_template_flows(template_flows)
+            ValidationDecision.objects.bulk_create(decisions, batch_size=1000)
+        if completed_flows:
+            ValidationFlow.objects.filter(pk__in=completed_flows).update(enable=False, current_approver_user_id=None)
+            Document.objects.filter(pk__in=completed_documents).update(
+                status=Document.STATUS.APPROVED,
+                updated_at=timezone.now(),
+            )
+        record_document_events(events)
+        record_document_stats(stats)
+
+    return [_build_result(document_id, results[document_id]) for document_id in document_ids]
+
+
+def reject_documents(document_ids, approver_user_id, reason):
+    """
+    Rechaza cada documento de `document_ids` en el paso de `approver_user_id`,
+    deteniendo su flujo. Aplica el lote con un UPDATE por tabla y devuelve un
+    resultado por documento, en el orden recibido.
+    """
+    with transaction.atomic():
+        documents, flows, steps = _load_decisions(document_ids, approver_user_id)
+
+        results = {}
+        rejected_documents, rejected_flows, rejected_steps = [], [], []
+        decisions, events, stats = [], [], []
+        for document_id in document_ids:
+            error = _check_decision(document_id, documents, flows, steps, approver_user_id, 'reject')
+            if error:
+                results[document_id] = error
+                continue
+
+            document, flow, step = documents[document_id], flows[document_id], steps[document_id]
+            rejected_documents.append(document_id)
+            stats.append(document_stats_change(document, sign=-1))
+            document.status = Document.STATUS.REJECTED
+            stats.append(document_stats_change(document))
+            rejected_flows.append(flow.pk)
+            if flow.template_id:
+                decisions.append(_build_decision(flow, step, ValidationStep.STATUS.REJECTED, reason))
+            else:
+                rejected_steps.append(step.pk)
+            results[document_id] = (200, 'Document rejected')
+            events.append(build_document_event(
+                DocumentEvent.EVENT_TYPE.REJECTED, document, status=Document.STATUS.REJECTED,
+                step_order=step.order, approver_user_id=approver_user_id, reason=reason,
+            ))
+
+        if rejected_steps:
+            ValidationStep.objects.filter(pk__in=rejected_steps).update(
+                status=ValidationStep.STATUS.REJECTED,
+                reason=reason,
+            )
+        if decisions:
+            ValidationDecision.objects.bulk_create(decisions, batch_size=1000)
+        if rejected_flows:
+            ValidationFlow.objects.filter(pk__in=rejected_flows).update(enable=False, current_approver_user_id=None)
+            Document.objects.filter(pk__in=rejected_documents).update(
+                status=Document.STATUS.REJECTED,
+                updated_at=timezone.now(),
+            )
+        record_document_events(events)
+        record_document_stats(stats)
+
+    return [_build_result(document_id, results[document_id]) for document_id in document_ids]
+
+
+def _build_result(document_id, result):
+    status, message = result
+    if status == 200:
+        return {'document_id': str(document_id), 'status': status, 'message': message}
+    return {'document_id': str(document_id), 'status': status, 'error': message}
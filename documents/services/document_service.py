@@ -0,0 +1,341 @@
+import math
+import re
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from documents.models import Blob, Document, DocumentEvent, ValidationFlow, ValidationFlowTemplate, ValidationStep
+from documents.services.outbox import build_document_event, record_document_events
+from documents.services.purge_service import release_blob
+from documents.services.stats_service import document_stats_change, record_document_stats
+from documents.services.s3_service import (
+    abort_multipart_upload, create_multipart_upload, generate_presigned_part_urls, generate_presigned_upload_url
+)
+
+
+MAX_BULK_DOCUMENTS = 1000
+
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_MAX_PARTS = 10000
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+ALLOWED_MIME_TYPES = [
+    'application/pdf', 'image/jpeg', 'image/png', 'image/jpg',
+    'application/msword',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+]
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        return False
+    return True
+
+
+def validate_document_payload(data):
+    """
+    Valida el payload de creación de un documento (`company_id`, `entity`,
+    `document`, `validation_flow`). Devuelve el mensaje de error o None.
+    """
+    company_id = data.get('company_id')
+    entity_data = data.get('entity')
+    document_data = data.get('document')
+    validation_flow_data = data.get('validation_flow')
+
+    if not company_id or not entity_data or not document_data:
+        return 'Missing required fields: company_id, entity, document'
+
+    if not document_data.get('name') or document_data.get('size_bytes') is None:
+        return 'Missing required document fields: name, size_bytes'
+
+    if not isinstance(document_data['size_bytes'], int) or document_data['size_bytes'] < 0:
+        return 'size_bytes must be a non-negative integer'
+
+    if document_data.get('mime_type') not in ALLOWED_MIME_TYPES:
+        return f'MIME type not allowed. Allowed: {", ".join(ALLOWED_MIME_TYPES)}'
+
+    sha256 = document_data.get('sha256')
+    if sha256 is not None and (not isinstance(sha256, str) or not SHA256_PATTERN.match(sha256)):
+        return 'sha256 must be a lowercase hex SHA-256 digest'
+
+    if not _is_uuid(company_id):
+        return f'Company with id {company_id} does not exist'
+
+    if 'entity_id' not in entity_data:
+        return 'entity_id is required in entity data'
+
+    if not _is_uuid(entity_data['entity_id']):
+        return f'BusinessEntity with id {entity_data["entity_id"]} does not exist'
+
+    if validation_flow_data and validation_flow_data.get('enabled', False) and 'template_id' in validation_flow_data:
+        if validation_flow_data.get('steps'):
+            return 'Use either validation_flow.template_id or validation_flow.steps, not both'
+        if not _is_uuid(validation_flow_data['template_id']):
+            return f'ValidationFlowTemplate with id {validation_flow_data["template_id"]} does not exist'
+
+    elif validation_flow_data and validation_flow_data.get('enabled', False):
+        steps = validation_flow_data.get('steps') or []
+        for step_data in steps:
+            if not isinstance(step_data.get('order'), int) or not step_data.get('approver_user_id'):
+                return 'Each validation step requires an integer order and approver_user_id'
+
+        if sorted(step_data['order'] for step_data in steps) != list(range(1, len(steps) + 1)):
+            return 'Validation step orders must be consecutive integers starting at 1'
+
+    return None
+
+
+def validate_upload_size(document_data, company):
+    if document_data['size_bytes'] > company.max_upload_size_bytes:
+        return f'File size exceeds the company limit of {company.max_upload_size_bytes} bytes'
+    return None
+
+
+def use_multipart_upload(document_data):
+    return bool(document_data.get('multipart')) or document_data['size_bytes'] > settings.MULTIPART_UPLOAD_THRESHOLD
+
+
+def get_multipart_layout(size_bytes):
+    """
+    Devuelve `(part_size, part_count)` para una subida multiparte, respetando el
+    tamaño mínimo de parte y el máximo de partes de S3.
+    """
+    part_size = max(settings.MULTIPART_PART_SIZE, S3_MIN_PART_SIZE, math.ceil(size_bytes / S3_MAX_PARTS))
+    part_count = max(1, math.ceil(size_bytes / part_size))
+    return part_size, part_count
+
+
+def build_bucket_key(company_id, entity_data, document_data):
+    bucket_key = document_data.get('bucket_key')
+    if not bucket_key:
+        entity_type = entity_data.get('entity_type', 'entity')
+        bucket_key = f'companies/{company_id}/{entity_type}s/{entity_data["entity_id"]}/docs/{uuid.uuid4()}-{document_data.get("name")}'
+    return bucket_key
+
+
+def get_flow_template_id(data):
+    validation_flow_data = data.get('validation_flow')
+    if not validation_flow_data or not validation_flow_data.get('enabled', False):
+        return None
+    template_id = validation_flow_data.get('template_id')
+    return uuid.UUID(str(template_id)) if template_id else None
+
+
+def get_flow_template(data, company):
+    """
+    Resuelve la plantilla de `validation_flow.template_id`, que debe ser de la
+    empresa del documento. Devuelve `(template, error)`.
+    """
+    template_id = get_flow_template_id(data)
+    if template_id is None:
+        return None, None
+    template = ValidationFlowTemplate.objects.filter(id=template_id, company=company).first()
+    if template is None:
+        return None, f'ValidationFlowTemplate with id {template_id} does not exist'
+    return template, None
+
+
+def build_document_records(data, company, business_entity, bucket_key, created_by=None, template=None):
+    """
+    Construye (sin guardar) el documento, su flujo de validación y sus pasos,
+    para poder insertarlos con `bulk_create` junto a los de otros documentos.
+    Con `template` el flujo no tiene pasos propios: sigue los de la plantilla.
+    """
+    document_data = data['document']
+    validation_flow_data = data.get('validation_flow')
+
+    has_validation = validation_flow_data.get('enabled', False) if validation_flow_data else False
+
+    document = Document(
+        name=document_data['name'],
+        mime_type=document_data['mime_type'],
+        size_bytes=document_data['size_bytes'],
+        bucket_key=bucket_key,
+        company=company,
+        business_entity=business_entity,
+        status=Document.STATUS.PENDING if has_validation else None,
+        created_by=created_by,
+    )
+
+    validation_flow = None
+    steps = []
+    if has_validation and template is not None:
+        validation_flow = ValidationFlow(
+            document=document,
+            template=template,
+            enable=True,
+            current_order=1,
+            total_steps=len(template.steps),
+            current_approver_user_id=template.get_approver(1),
+        )
+    elif has_validation and validation_flow_data.get('steps'):
+        validation_flow = ValidationFlow(
+            document=document,
+            enable=True,
+            current_order=1,
+            total_steps=len(validation_flow_data['steps']),
+            current_approver_user_id=next(
+                step_data['approver_user_id'] for step_data in validation_flow_data['steps'] if step_data['order'] == 1
+            ),
+        )
+        steps = [
+            ValidationStep(
+                order=step_data['order'],
+                approver_user_id=step_data['approver_user_id'],
+                validation_flow=validation_flow,
+            )
+            for step_data in validation_flow_data['steps']
+        ]
+
+    return document, validation_flow, steps
+
+
+def reuse_uploaded_blob(document, document_data):
+    """
+    Si el payload trae `sha256` y la empresa ya subió ese contenido (mismo
+    hash y tamaño), suma una referencia al blob y apunta el documento a su
+    objeto, ya subido. Devuelve True si el documento no necesita subida.
+
+    Solo se reutilizan blobs subidos y con referencias: uno con `ref_count` 0
+    ya está encolado para purga y no puede volver a usarse.
+    """
+    sha256 = document_data.get('sha256')
+    if not sha256:
+        return False
+
+    blobs = Blob.objects.filter(
+        company=document.company,
+        sha256=sha256,
+        size_bytes=document_data['size_bytes'],
+        upload_state=Document.UPLOAD_STATE.UPLOADED,
+        ref_count__gt=0,
+    )
+    if not blobs.update(ref_count=F('ref_count') + 1):
+        return False
+
+    blob = Blob.objects.get(company=document.company, sha256=sha256)
+    document.blob = blob
+    document.bucket_key = blob.bucket_key
+    document.upload_state = Document.UPLOAD_STATE.UPLOADED
+    document.etag = blob.etag
+    return True
+
+
+def register_blob(document, sha256):
+    """
+    Crea el blob de un documento que sube un contenido nuevo, con el documento
+    como primera referencia. Si ya existe uno con ese hash (subida en curso o
+    pendiente de purga) el documento se guarda sin deduplicar.
+    """
+    try:
+        with transaction.atomic():
+            document.blob = Blob.objects.create(
+                company=document.company,
+                sha256=sha256,
+                bucket_key=document.bucket_key,
+                size_bytes=document.size_bytes,
+                ref_count=1,
+            )
+    except IntegrityError:
+        pass
+
+
+def presign_document_upload(document, document_data):
+    """
+    Prepara la subida del documento: inicia la subida multiparte (guardando
+    su `upload_id` en el documento) o presigna un PUT simple. Devuelve la
+    parte de la respuesta con `multipart_upload` o `upload_url`, o
+    `deduplicated` si el contenido ya estaba subido.
+    """
+    if reuse_uploaded_blob(document, document_data):
+        return {'deduplicated': True}
+
+    if use_multipart_upload(document_data):
+        return start_multipart_upload(document, document_data)
+
+    return {
+        'upload_url': generate_presigned_upload_url(
+            bucket_key=document.bucket_key,
+            content_type=document_data['mime_type'],
+        )
+    }
+
+
+def start_multipart_upload(document, document_data):
+    """
+    Inicia la subida multiparte en S3, guarda su `upload_id` en el documento
+    (sin persistirlo) y presigna una URL por parte. No usa la base de datos.
+    """
+    part_size, part_count = get_multipart_layout(document_data['size_bytes'])
+    document.upload_id = create_multipart_upload(
+        bucket_key=document.bucket_key,
+        content_type=document_data['mime_type'],
+    )
+    return {
+        'multipart_upload': {
+            'part_size': part_size,
+            'parts': generate_presigned_part_urls(document.bucket_key, document.upload_id, part_count),
+        }
+    }
+
+
+def refresh_upload_urls(body):
+    """
+    Vuelve a presignar las URLs de subida de una respuesta de creación
+    guardada para `Idempotency-Key`: la clave vive `IDEMPOTENCY_KEY_TTL` y las
+    URLs solo `PRESIGNED_URL_EXPIRES_IN`. Firma en local; solo lee el
+    `upload_id` de las subidas multiparte que siguen abiertas.
+    """
+    results = body['results'] if 'results' in body else [body]
+    multipart_ids = [result['document']['id'] for result in results if 'multipart_upload' in result]
+    upload_ids = {}
+    if multipart_ids:
+        upload_ids = {
+            str(pk): upload_id
+            for pk, upload_id in Document.objects.filter(pk__in=multipart_ids).values_list('id', 'upload_id')
+        }
+
+    for result in results:
+        document = result.get('document')
+        if 'upload_url' in result:
+            result['upload_url'] = generate_presigned_upload_url(
+                bucket_key=document['bucket_key'],
+                content_type=document['mime_type'],
+            )
+        elif 'multipart_upload' in result and upload_ids.get(document['id']):
+            parts = result['multipart_upload']['parts']
+            result['multipart_upload']['parts'] = generate_presigned_part_urls(
+                document['bucket_key'], upload_ids[document['id']], len(parts)
+            )
+    return body
+
+
+def save_document_records(document, validation_flow, steps, sha256=None):
+    """
+    Inserta el documento, su flujo, sus pasos y el evento de creación en una
+    transacción corta, registrando el blob de `sha256` si el contenido es
+    nuevo. Si falla, aborta la subida multiparte ya iniciada o libera la
+    referencia al blob reutilizado.
+    """
+    reused_blob = document.blob_id is not None
+    try:
+        with transaction.atomic():
+            if sha256 and not reused_blob:
+                register_blob(document, sha256)
+            document.save()
+            if validation_flow:
+                validation_flow.save()
+                ValidationStep.objects.bulk_create(steps)
+            record_document_events([build_document_event(DocumentEvent.EVENT_TYPE.CREATED, document)])
+            record_document_stats([document_stats_change(document)])
+    except Exception:
+        if document.upload_id:
+            abort_multipart_upload(document.bucket_key, document.upload_id)
+        if reused_blob:
+            release_blob(document.blob_id)
+        raise
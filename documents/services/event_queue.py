@@ -0,0 +1,84 @@
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+
+class QueueMessage:
+
+    def __init__(self, receipt, body):
+        self.receipt = receipt
+        self.body = body
+
+
+class SQSEventQueue:
+    """
+    Cola de notificaciones de S3 en Amazon SQS.
+    """
+    MAX_MESSAGES_PER_RECEIVE = 10
+
+    def __init__(self, queue_url, wait_time_seconds=20):
+        import boto3
+
+        self.queue_url = queue_url
+        self.wait_time_seconds = wait_time_seconds
+        self.client = boto3.client(
+            'sqs',
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_S3_REGION_NAME,
+            endpoint_url=settings.UPLOAD_EVENTS_SQS_ENDPOINT_URL,
+        )
+
+    def receive(self, max_messages):
+        messages = []
+        while len(messages) < max_messages:
+            response = self.client.receive_message(
+                QueueUrl=self.queue_url,
+                MaxNumberOfMessages=min(self.MAX_MESSAGES_PER_RECEIVE, max_messages - len(messages)),
+                WaitTimeSeconds=0 if messages else self.wait_time_seconds,
+            )
+            received = response.get('Messages', [])
+            if not received:
+                break
+            messages.extend(QueueMessage(message['ReceiptHandle'], message['Body']) for message in received)
+        return messages
+
+    def ack(self, messages):
+        for start in range(0, len(messages), self.MAX_MESSAGES_PER_RECEIVE):
+            batch = messages[start:start + self.MAX_MESSAGES_PER_RECEIVE]
+            self.client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {'Id': str(index), 'ReceiptHandle': message.receipt}
+                    for index, message in enumerate(batch)
+                ],
+            )
+
+
+class SpoolDirectoryEventQueue:
+    """
+    Sustituto local de SQS para desarrollo y tests: cada mensaje es un fichero
+    `.json` en `directory`. Se consumen por orden de nombre y se borran al confirmarlos.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def publish(self, body):
+        name = f'{time.time_ns():020d}-{uuid.uuid4().hex}.json'
+        tmp_path = self.directory / f'.{name}.tmp'
+        tmp_path.write_text(body if isinstance(body, str) else json.dumps(body))
+        os.replace(tmp_path, self.directory / name)
+
+    def receive(self, max_messages):
+        paths = sorted(self.directory.glob('*.json'))[:max_messages]
+        return [QueueMessage(path, path.read_text()) for path in paths]
+
+    def ack(self, messages):
+        for message in messages:
+            message.receipt.unlink(missing_ok=True)
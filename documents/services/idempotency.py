@@ -0,0 +1,95 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from documents.models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+SWEEP_BATCH_SIZE = 5000
+
+
+def get_request_fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder).encode()).hexdigest()
+
+
+def claim_idempotency_key(scope, key, fingerprint):
+    """
+    Reserva `key` para una petición nueva. Devuelve `(record, None)` si la
+    petición debe ejecutarse, o `(None, (status, body, replayed))` con la
+    respuesta a devolver sin ejecutarla:
+
+    - la respuesta guardada, si la petición original ya terminó;
+    - 409 si la petición original sigue en curso;
+    - 422 si la clave se reutiliza con otro payload.
+
+    Una reserva sin respuesta más antigua que IDEMPOTENCY_LOCK_TIMEOUT se da
+    por abandonada (el proceso murió) y se puede volver a reservar.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return None, (400, {'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}, False)
+
+    now = timezone.now()
+    existing = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+    if existing is not None:
+        abandoned = (
+            existing.response_status is None
+            and existing.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        )
+        if existing.expires_at > now and not abandoned:
+            return None, _existing_response(existing, fingerprint)
+        IdempotencyKey.objects.filter(pk=existing.pk).delete()
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                scope=scope,
+                key=key,
+                request_fingerprint=fingerprint,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+            )
+        return record, None
+    except IntegrityError:
+        # Otra petición con la misma clave la reservó a la vez.
+        return None, _existing_response(IdempotencyKey.objects.filter(scope=scope, key=key).first(), fingerprint)
+
+
+def _existing_response(existing, fingerprint):
+    if existing is not None and existing.request_fingerprint != fingerprint:
+        return 422, {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request body'}, False
+    if existing is None or existing.response_status is None:
+        return 409, {'error': f'A request with this {IDEMPOTENCY_HEADER} is already in progress'}, False
+    return existing.response_status, existing.response_body, True
+
+
+def save_idempotent_response(record, status, body):
+    """
+    Guarda la respuesta de la petición reservada. Los errores 5xx no se
+    guardan: se libera la clave para que el cliente pueda reintentar.
+    """
+    if status >= 500:
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+        return
+    IdempotencyKey.objects.filter(pk=record.pk).update(response_status=status, response_body=body)
+
+
+def sweep_expired_idempotency_keys(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Borra un lote de claves caducadas. Devuelve cuántas borró.
+    """
+    expired_ids = list(
+        IdempotencyKey.objects
+        .filter(expires_at__lte=timezone.now())
+        .order_by('expires_at')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not expired_ids:
+        return 0
+    deleted, _ = IdempotencyKey.objects.filter(pk__in=expired_ids).delete()
+    return deleted
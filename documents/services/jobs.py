@@ -0,0 +1,147 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from documents.models import Job, JobStats
+
+
+logger = logging.getLogger(__name__)
+
+JOB_RETRY_BASE_SECONDS = 10
+JOB_RETRY_MAX_SECONDS = 3600
+JOB_LEASE_SECONDS = 300
+
+_handlers = {}
+
+
+def register_job(job_type):
+    """
+    Registra la función que ejecuta los jobs de tipo `job_type`. La función
+    recibe el `payload` del job; si lanza una excepción el job se reintenta.
+    """
+    def decorator(func):
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+
+def enqueue_job(job_type, payload=None, delay=None, unique_key=None, max_attempts=5):
+    """
+    Encola un job. Llamada dentro de una transacción, el job solo existe si la
+    transacción se confirma. Con `unique_key` no se encola si ya hay un job
+    del mismo tipo y clave esperando a ejecutarse.
+    """
+    job = Job(
+        job_type=job_type,
+        payload=payload or {},
+        unique_key=unique_key,
+        max_attempts=max_attempts,
+        available_at=timezone.now() + (delay or timedelta()),
+    )
+    Job.objects.bulk_create([job], ignore_conflicts=unique_key is not None)
+    return job
+
+
+def get_retry_delay(attempts):
+    return timedelta(seconds=min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS))
+
+
+def claim_jobs(batch_size, lease_seconds=JOB_LEASE_SECONDS):
+    """
+    Reclama hasta `batch_size` jobs disponibles con `FOR UPDATE SKIP LOCKED`,
+    de modo que varios workers no se bloquean entre sí. Los jobs reclamados
+    quedan en RUNNING con `available_at` al final del plazo de `lease_seconds`:
+    si el worker muere, otro los vuelve a reclamar al vencer el plazo.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects
+            .select_for_update(skip_locked=True)
+            .exclude(status=Job.STATUS.FAILED)
+            .filter(available_at__lte=now)
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        for job in jobs:
+            job.status = Job.STATUS.RUNNING
+            job.attempts += 1
+            job.available_at = now + timedelta(seconds=lease_seconds)
+        Job.objects.bulk_update(jobs, ['status', 'attempts', 'available_at'])
+    return jobs
+
+
+def run_job(job, stats):
+    """
+    Ejecuta un job reclamado. Si termina bien se borra; si falla se reprograma
+    con espera exponencial o, agotados los intentos, queda en FAILED. Si al
+    reprogramarlo ya hay otro job en cola con la misma `unique_key`, se borra:
+    el que está en cola hará el trabajo.
+    """
+    handler = _handlers.get(job.job_type)
+    started = time.monotonic()
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for job type {job.job_type}')
+        handler(job.payload)
+    except Exception as e:
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.job_type, job.attempts)
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(status=Job.STATUS.FAILED, last_error=str(e))
+            stats[job.job_type]['failed'] += 1
+        else:
+            try:
+                with transaction.atomic():
+                    Job.objects.filter(pk=job.pk).update(
+                        status=Job.STATUS.QUEUED,
+                        available_at=timezone.now() + get_retry_delay(job.attempts),
+                        last_error=str(e),
+                    )
+            except IntegrityError:
+                Job.objects.filter(pk=job.pk).delete()
+            stats[job.job_type]['retried'] += 1
+    else:
+        Job.objects.filter(pk=job.pk).delete()
+        stats[job.job_type]['completed'] += 1
+    stats[job.job_type]['runtime_ms'] += int((time.monotonic() - started) * 1000)
+
+
+def new_job_stats():
+    return defaultdict(lambda: defaultdict(int))
+
+
+def record_job_stats(stats):
+    """
+    Suma a `JobStats` los contadores acumulados por un worker, con un UPDATE
+    por tipo de job y lote en lugar de uno por job.
+    """
+    for job_type, counters in stats.items():
+        increments = {name: F(name) + value for name, value in counters.items()}
+        if not JobStats.objects.filter(job_type=job_type).update(**increments, updated_at=timezone.now()):
+            JobStats.objects.bulk_create([JobStats(job_type=job_type)], ignore_conflicts=True)
+            JobStats.objects.filter(job_type=job_type).update(**increments, updated_at=timezone.now())
+    stats.clear()
+
+
+def get_job_metrics():
+    metrics = defaultdict(lambda: {
+        'queued': 0, 'running': 0, 'dead': 0,
+        'completed': 0, 'retried': 0, 'failed': 0, 'avg_runtime_ms': None,
+    })
+    status_names = {Job.STATUS.QUEUED: 'queued', Job.STATUS.RUNNING: 'running', Job.STATUS.FAILED: 'dead'}
+    for row in Job.objects.values('job_type', 'status').annotate(count=Count('id')).order_by():
+        metrics[row['job_type']][status_names[row['status']]] = row['count']
+
+    for job_stats in JobStats.objects.all():
+        finished = job_stats.completed + job_stats.retried + job_stats.failed
+        metrics[job_stats.job_type].update({
+            'completed': job_stats.completed,
+            'retried': job_stats.retried,
+            'failed': job_stats.failed,
+            'avg_runtime_ms': round(job_stats.runtime_ms / finished, 1) if finished else None,
+        })
+    return dict(metrics)
@@ -0,0 +1,232 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from documents.models import BusinessEntity, Company
+
+
+class ModelCache:
+    """
+    Caché de lectura de filas por clave primaria, para modelos que casi nunca
+    cambian. Tiene dos niveles:
+
+    - un LRU en memoria del proceso (MODEL_CACHE_MAX_ENTRIES entradas, válidas
+      MODEL_CACHE_LOCAL_TTL segundos);
+    - opcionalmente, la caché de Django MODEL_CACHE_ALIAS compartida entre
+      procesos (MODEL_CACHE_TTL segundos).
+
+    Las escrituras invalidan la fila en el LRU del proceso que escribe y en la
+    caché compartida (señales `post_save`/`post_delete`). Los LRU de los demás
+    procesos la sirven como mucho MODEL_CACHE_LOCAL_TTL segundos más. Las filas
+    inexistentes no se cachean, y las leídas de la base de datos dentro de una
+    transacción se cachean al confirmarse: si se deshace, no queda nada.
+
+    Devuelve copias: quien las modifique no altera la instancia cacheada.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def get(self, pk):
+        """
+        Devuelve la fila con clave `pk`, o None si no existe.
+        """
+        pk = self._to_pk(pk)
+        if pk is None:
+            return None
+
+        instance = self._get_local(pk)
+        if instance is None:
+            shared = self._shared_cache()
+            if shared is not None:
+                instance = shared.get(self._cache_key(pk))
+            if instance is not None:
+                self._count('shared_hits')
+                self._set_local(pk, instance)
+            else:
+                self._count('misses')
+                instance = self.model.objects.filter(pk=pk).first()
+                if instance is None:
+                    return None
+                self._remember({pk: instance}, shared)
+        return copy.copy(instance)
+
+    async def aget(self, pk):
+        """
+        Versión async de `get`: el LRU se consulta sin cambiar de hilo y la
+        caché compartida y la base de datos con sus APIs async.
+        """
+        pk = self._to_pk(pk)
+        if pk is None:
+            return None
+
+        instance = self._get_local(pk)
+        if instance is None:
+            shared = self._shared_cache()
+            if shared is not None:
+                instance = await shared.aget(self._cache_key(pk))
+            if instance is not None:
+                self._count('shared_hits')
+            else:
+                self._count('misses')
+                instance = await self.model.objects.filter(pk=pk).afirst()
+                if instance is None:
+                    return None
+                if shared is not None:
+                    await shared.aset(self._cache_key(pk), instance, timeout=settings.MODEL_CACHE_TTL)
+            self._set_local(pk, instance)
+        return copy.copy(instance)
+
+    def get_many(self, pks):
+        """
+        Como `in_bulk`: devuelve `{pk: instancia}` de las filas que existen,
+        con una consulta a la caché compartida y otra a la base de datos para
+        las que falten en el LRU.
+        """
+        found = {}
+        missing = set()
+        for pk in {self._to_pk(pk) for pk in pks} - {None}:
+            instance = self._get_local(pk)
+            if instance is not None:
+                found[pk] = instance
+            else:
+                missing.add(pk)
+
+        shared = self._shared_cache()
+        if missing and shared is not None:
+            keys = {self._cache_key(pk): pk for pk in missing}
+            for key, instance in shared.get_many(keys.keys()).items():
+                self._count('shared_hits')
+                found[keys[key]] = instance
+                missing.discard(keys[key])
+                self._set_local(keys[key], instance)
+
+        if missing:
+            for _ in missing:
+                self._count('misses')
+            loaded = self.model.objects.in_bulk(missing)
+            if loaded:
+                self._remember(loaded, shared)
+            found.update(loaded)
+
+        return {pk: copy.copy(instance) for pk, instance in found.items()}
+
+    def invalidate(self, pks):
+        """
+        Olvida las filas de `pks` ahora y, de nuevo, al confirmarse la
+        transacción en curso: una lectura concurrente de la fila antigua
+        anterior al commit no queda cacheada.
+        """
+        pks = {self._to_pk(pk) for pk in pks} - {None}
+        if not pks:
+            return
+        self._forget(pks)
+        transaction.on_commit(lambda: self._forget(pks))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        total = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['local_hits'] + stats['shared_hits']) / total if total else 0.0
+        return stats
+
+    def _forget(self, pks):
+        with self._lock:
+            for pk in pks:
+                self._entries.pop(pk, None)
+        shared = self._shared_cache()
+        if shared is not None:
+            shared.delete_many([self._cache_key(pk) for pk in pks])
+
+    def _remember(self, instances, shared):
+        """
+        Cachea `instances` (`{pk: instancia}`) recién leídas de la base de
+        datos. Dentro de una transacción espera al commit, después del
+        `invalidate` de las escrituras de la propia transacción; fuera de ella
+        las cachea ya.
+        """
+        def remember():
+            if shared is not None:
+                shared.set_many(
+                    {self._cache_key(pk): instance for pk, instance in instances.items()},
+                    timeout=settings.MODEL_CACHE_TTL,
+                )
+            for pk, instance in instances.items():
+                self._set_local(pk, instance)
+
+        transaction.on_commit(remember)
+
+    def _get_local(self, pk):
+        with self._lock:
+            entry = self._entries.get(pk)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(pk)
+                self._stats['local_hits'] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[pk]
+        return None
+
+    def _set_local(self, pk, instance):
+        with self._lock:
+            self._entries[pk] = (time.monotonic() + settings.MODEL_CACHE_LOCAL_TTL, instance)
+            self._entries.move_to_end(pk)
+            while len(self._entries) > settings.MODEL_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _to_pk(self, pk):
+        try:
+            return self.model._meta.pk.to_python(pk)
+        except ValidationError:
+            return None
+
+    def _cache_key(self, pk):
+        return f'model:{self.model._meta.label_lower}:{pk}'
+
+    def _shared_cache(self):
+        if not settings.MODEL_CACHE_ALIAS:
+            return None
+        return caches[settings.MODEL_CACHE_ALIAS]
+
+
+company_cache = ModelCache(Company)
+business_entity_cache = ModelCache(BusinessEntity)
+
+
+def get_model_cache_stats():
+    return {
+        'company': company_cache.get_stats(),
+        'business_entity': business_entity_cache.get_stats(),
+    }
+
+
+@receiver([post_save, post_delete], sender=Company, dispatch_uid='company_cache_invalidation')
+def invalidate_company(sender, instance, **kwargs):
+    company_cache.invalidate([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=BusinessEntity, dispatch_uid='business_entity_cache_invalidation')
+def invalidate_business_entity(sender, instance, **kwargs):
+    business_entity_cache.invalidate([instance.pk])
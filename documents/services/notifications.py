@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+
+from django.db import connection, connections
+
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EVENTS_CHANNEL = 'document_events'
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def notify_document_events(events):
+    """
+    Publica los eventos con NOTIFY en una sola sentencia. NOTIFY es
+    transaccional: los suscriptores solo los reciben si la transacción se
+    confirma, y en el orden de confirmación.
+    """
+    payloads = [
+        json.dumps({
+            'id': event.pk,
+            'event_type': event.event_type,
+            'document_id': str(event.document_id),
+            'company_id': str(event.company_id),
+            'status': event.status,
+        })
+        for event in events
+    ]
+    if not payloads:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+            [DOCUMENT_EVENTS_CHANNEL, payloads],
+        )
+
+
+class Subscription:
+
+    def __init__(self, company_id=None, document_id=None):
+        self.company_id = company_id
+        self.document_id = document_id
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def matches(self, event):
+        if self.company_id and event['company_id'] != self.company_id:
+            return False
+        if self.document_id and event['document_id'] != self.document_id:
+            return False
+        return True
+
+
+class DocumentEventBroadcaster:
+    """
+    Reparte las notificaciones de `document_events` entre los suscriptores del
+    proceso. Usa una única conexión LISTEN por proceso, vigilada con
+    `loop.add_reader`, así que los suscriptores inactivos no ocupan hilos ni
+    conexiones a la base de datos. La conexión se abre con el primer
+    suscriptor y se cierra al irse el último.
+    """
+
+    def __init__(self):
+        self.subscriptions = set()
+        self.listen_connection = None
+        self.loop = None
+        self.lock = None
+
+    async def subscribe(self, company_id=None, document_id=None):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self._stop_listening()
+            self.loop = loop
+            self.lock = asyncio.Lock()
+
+        subscription = Subscription(company_id, document_id)
+        async with self.lock:
+            if self.listen_connection is None:
+                self.listen_connection = await loop.run_in_executor(None, self._connect)
+                loop.add_reader(self.listen_connection.fileno(), self._on_readable)
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions:
+            self._stop_listening()
+
+    def _connect(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        listen_connection = psycopg2.connect(**connections['default'].get_connection_params())
+        listen_connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with listen_connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {DOCUMENT_EVENTS_CHANNEL}')
+        return listen_connection
+
+    def _stop_listening(self):
+        if self.listen_connection is None:
+            return
+        try:
+            self.loop.remove_reader(self.listen_connection.fileno())
+            self.listen_connection.close()
+        except Exception:
+            logger.exception('Error closing the LISTEN connection')
+        self.listen_connection = None
+
+    def _on_readable(self):
+        try:
+            self.listen_connection.poll()
+        except Exception:
+            # Se perdió la conexión: se cierran los streams y los clientes se
+            # reconectan (EventSource lo hace solo), abriendo una conexión nueva.
+            logger.exception('LISTEN connection lost')
+            self._stop_listening()
+            for subscription in list(self.subscriptions):
+                self._close(subscription)
+            return
+
+        notifies = self.listen_connection.notifies
+        while notifies:
+            event = json.loads(notifies.pop(0).payload)
+            for subscription in list(self.subscriptions):
+                if not subscription.matches(event):
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # Cliente demasiado lento: se cierra su stream en lugar de
+                    # acumular eventos sin límite en memoria.
+                    self._close(subscription)
+
+    def _close(self, subscription):
+        self.subscriptions.discard(subscription)
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+
+broadcaster = DocumentEventBroadcaster()
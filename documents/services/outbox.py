@@ -0,0 +1,35 @@
+from django.db.models.expressions import RawSQL
+
+from documents.models import DocumentEvent
+from documents.services.notifications import notify_document_events
+
+
+def build_document_event(event_type, document, status=None, **payload):
+    return DocumentEvent(
+        event_type=event_type,
+        document_id=document.pk,
+        company_id=document.company_id,
+        status=status if status is not None else document.status,
+        payload=payload,
+    )
+
+
+def record_document_events(events):
+    """
+    Inserta los eventos en el outbox y los notifica a los streams SSE. Debe
+    llamarse dentro de la transacción que aplica el cambio para que evento,
+    notificación y cambio se confirmen juntos.
+    """
+    DocumentEvent.objects.bulk_create(events, batch_size=1000)
+    notify_document_events(events)
+
+
+def visible_document_events():
+    """
+    Eventos cuyo `txid` es anterior a la transacción más antigua todavía en
+    curso: ninguna transacción pendiente puede añadir eventos antes de ellos.
+    Una transacción larga retrasa el feed, pero no hace que se pierdan eventos.
+    """
+    return DocumentEvent.objects.filter(
+        txid__lt=RawSQL('txid_snapshot_xmin(txid_current_snapshot())', []),
+    )
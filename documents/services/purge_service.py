@@ -0,0 +1,245 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.utils import timezone
+
+from documents.models import (
+    Blob, BusinessEntity, Document, DocumentEvent, DocumentStats, StoragePurge, ValidationDecision, ValidationFlow, ValidationFlowTemplate,
+    ValidationStep
+)
+from documents.services.jobs import enqueue_job, register_job
+from documents.services.model_cache import business_entity_cache
+from documents.services.outbox import build_document_event, record_document_events
+from documents.services.s3_service import delete_objects
+from documents.services.stats_service import document_stats_changes_of, record_document_stats
+
+
+PURGE_BATCH_SIZE = 1000
+PURGE_RETRY_BASE_SECONDS = 30
+PURGE_RETRY_MAX_SECONDS = 3600
+PURGE_JOB_TYPE = 'storage.purge'
+PURGE_JOB_PARALLELISM = 4
+# Cada lote es una llamada DeleteObjects: 20 lotes caben de sobra en JOB_LEASE_SECONDS.
+PURGE_JOB_MAX_BATCHES = 20
+
+
+def enqueue_purge(documents):
+    """
+    Encola en `StoragePurge` el objeto de cada fila de `documents` (documentos
+    o blobs) con un único INSERT ... SELECT, sin traer las claves a Python.
+    """
+    select_sql, select_params = documents.values_list('bucket_key').query.sql_with_params()
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {StoragePurge._meta.db_table} (bucket_key, attempts, available_at, created_at) '
+            f'SELECT keys.bucket_key, 0, %s, %s FROM ({select_sql}) AS keys',
+            (now, now, *select_params),
+        )
+        return cursor.rowcount
+
+
+def _release_references(blobs, references):
+    blobs.update(ref_count=F('ref_count') - references)
+    return enqueue_purge(blobs.filter(ref_count=0))
+
+
+def release_blobs(documents):
+    """
+    Resta de cada blob los documentos de `documents` que lo usan y encola la
+    purga de los objetos que se quedan sin referencias. El UPDATE bloquea los
+    blobs, así que no compite con `reuse_uploaded_blob`, que solo suma
+    referencias a blobs con `ref_count` mayor que 0.
+    """
+    references = Subquery(
+        documents.filter(blob=OuterRef('pk')).order_by().values('blob').annotate(count=Count('pk')).values('count')
+    )
+    return _release_references(Blob.objects.filter(pk__in=documents.values('blob')), references)
+
+
+def release_blob(blob_id):
+    """
+    Libera una referencia a un blob que no llegó a guardarse en un documento.
+    """
+    with transaction.atomic():
+        if _release_references(Blob.objects.filter(pk=blob_id), 1):
+            schedule_purge()
+
+
+def enqueue_document_objects(documents):
+    """
+    Encola la purga de los objetos de `documents`: los propios y, para los
+    deduplicados, los de sus blobs cuando se quedan sin referencias.
+    """
+    enqueue_purge(documents.filter(blob__isnull=True))
+    release_blobs(documents.filter(blob__isnull=False))
+
+
+def soft_delete_documents(documents):
+    """
+    Marca como borrados los documentos de `documents`, los descuenta de
+    `DocumentStats`, desactiva sus flujos de validación y encola sus objetos
+    para el worker de purga. Debe llamarse
+    dentro de una transacción para que la marca y la cola sean atómicas.
+    """
+    documents = documents.alive()
+    record_document_stats(document_stats_changes_of(documents))
+    enqueue_document_objects(documents)
+    ValidationFlow.objects.filter(document__in=documents).update(enable=False)
+    schedule_purge()
+    return documents.update(deleted_at=timezone.now(), updated_at=timezone.now())
+
+
+def record_deleted_events(documents):
+    """
+    Registra un evento `document.deleted` por cada documento vivo de
+    `documents`, en lotes de PURGE_BATCH_SIZE para no cargarlos todos a la vez.
+    """
+    events = []
+    for document in documents.alive().only('id', 'company_id', 'status').iterator(chunk_size=PURGE_BATCH_SIZE):
+        events.append(build_document_event(DocumentEvent.EVENT_TYPE.DELETED, document))
+        if len(events) >= PURGE_BATCH_SIZE:
+            record_document_events(events)
+            events = []
+    record_document_events(events)
+
+
+def delete_documents(documents):
+    """
+    Borra de la base de datos los documentos de `documents` cuya subida no
+    llegó a completarse (no hay objeto que purgar). Los vivos se descuentan de
+    `DocumentStats`, emiten `document.deleted` y liberan sus blobs; los
+    borrados lógicamente ya lo hicieron. Debe llamarse dentro de una
+    transacción.
+    """
+    alive = documents.alive()
+    record_document_stats(document_stats_changes_of(alive))
+    record_deleted_events(alive)
+    release_blobs(alive.filter(blob__isnull=False))
+    return documents.delete()
+
+
+def _delete_rows(queryset):
+    # Borrado en una sola sentencia, sin el collector de Django (que cargaría
+    # millones de ids en memoria). Las filas dependientes se borran antes.
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_documents_of(company=None, business_entity=None):
+    """
+    Borra de la base de datos todos los documentos de una empresa o entidad,
+    con sus flujos y pasos, tras encolar la purga de sus objetos y registrar
+    `document.deleted` de cada uno. Los documentos ya borrados lógicamente
+    tienen su purga y su evento de antes.
+    """
+    scope = {'company': company} if company is not None else {'business_entity': business_entity}
+    documents = Document.objects.filter(**scope)
+
+    record_deleted_events(documents)
+    enqueue_document_objects(documents.alive())
+    schedule_purge(PURGE_JOB_PARALLELISM)
+    _delete_rows(ValidationStep.objects.filter(**{f'validation_flow__document__{key}': value for key, value in scope.items()}))
+    _delete_rows(ValidationDecision.objects.filter(**{f'validation_flow__document__{key}': value for key, value in scope.items()}))
+    _delete_rows(ValidationFlow.objects.filter(**{f'document__{key}': value for key, value in scope.items()}))
+    return _delete_rows(documents)
+
+
+def delete_business_entity(business_entity):
+    with transaction.atomic():
+        record_document_stats(document_stats_changes_of(Document.objects.alive().filter(business_entity=business_entity)))
+        delete_documents_of(business_entity=business_entity)
+        business_entity.delete()
+
+
+def delete_company(company):
+    with transaction.atomic():
+        delete_documents_of(company=company)
+        # Sin documentos, todos los blobs tienen 0 referencias y su purga encolada.
+        _delete_rows(Blob.objects.filter(company=company))
+        _delete_rows(ValidationFlowTemplate.objects.filter(company=company))
+        _delete_rows(DocumentStats.objects.filter(company=company))
+        # El borrado en bloque no emite señales: se invalidan a mano.
+        business_entity_cache.invalidate(BusinessEntity.objects.filter(company=company).values_list('pk', flat=True))
+        _delete_rows(BusinessEntity.objects.filter(company=company))
+        company.delete()
+
+
+def get_retry_delay(attempts):
+    return timedelta(seconds=min(PURGE_RETRY_BASE_SECONDS * 2 ** (attempts - 1), PURGE_RETRY_MAX_SECONDS))
+
+
+def purge_batch(batch_size=PURGE_BATCH_SIZE):
+    """
+    Reclama hasta `batch_size` entradas disponibles de la cola, borra sus
+    objetos con una llamada `DeleteObjects` y elimina las entradas y las filas
+    de documento borradas lógicamente. Las claves que fallan se reprograman
+    con espera exponencial. Varios workers pueden ejecutarla a la vez: las
+    entradas bloqueadas por otro worker se saltan (`SKIP LOCKED`).
+
+    Devuelve `(purged, failed)`.
+    """
+    with transaction.atomic():
+        entries = list(
+            StoragePurge.objects
+            .select_for_update(skip_locked=True)
+            .filter(available_at__lte=timezone.now())
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        if not entries:
+            return 0, 0
+
+        keys = {entry.bucket_key for entry in entries}
+        try:
+            failed = {key: 'DeleteObjects error' for key in delete_objects(sorted(keys))}
+        except Exception as e:
+            failed = {key: str(e) for key in keys}
+
+        purged_keys = keys - set(failed)
+        StoragePurge.objects.filter(pk__in=[entry.pk for entry in entries if entry.bucket_key in purged_keys]).delete()
+        Document.objects.filter(bucket_key__in=purged_keys, deleted_at__isnull=False).delete()
+        Blob.objects.filter(bucket_key__in=purged_keys, ref_count=0).delete()
+
+        now = timezone.now()
+        retried = [entry for entry in entries if entry.bucket_key in failed]
+        for entry in retried:
+            entry.attempts += 1
+            entry.available_at = now + get_retry_delay(entry.attempts)
+            entry.last_error = failed[entry.bucket_key]
+        StoragePurge.objects.bulk_update(retried, ['attempts', 'available_at', 'last_error'])
+
+    return len(purged_keys), len(failed)
+
+
+def schedule_purge(parallelism=1, delay=None):
+    """
+    Encola hasta `parallelism` jobs que vacían la cola de purga en paralelo.
+    Cada job tiene su propia `unique_key`, así que borrar muchos documentos
+    seguidos no multiplica los jobs pendientes.
+    """
+    for slot in range(parallelism):
+        enqueue_job(PURGE_JOB_TYPE, {'slot': slot}, delay=delay, unique_key=str(slot))
+
+
+@register_job(PURGE_JOB_TYPE)
+def run_purge_job(payload):
+    """
+    Procesa como mucho PURGE_JOB_MAX_BATCHES lotes para terminar dentro del
+    plazo del job. Si queda trabajo, encola la continuación en el mismo hueco
+    en lugar de seguir y que otro worker reclame el job a la vez.
+    """
+    slot = payload.get('slot', 0)
+    failed_total = 0
+    for _ in range(PURGE_JOB_MAX_BATCHES):
+        purged, failed = purge_batch()
+        failed_total += failed
+        if not purged and not failed:
+            break
+    else:
+        enqueue_job(PURGE_JOB_TYPE, {'slot': slot}, unique_key=str(slot))
+        return
+
+    if failed_total:
+        # Las claves fallidas se reprogramaron en StoragePurge; este job vuelve a
+        # ejecutarse cuando vence la primera espera.
+        enqueue_job(PURGE_JOB_TYPE, {'slot': slot}, delay=get_retry_delay(1), unique_key=str(slot))
@@ -1,17 +1,187 @@
-import boto3
+import hashlib
+import hmac
+import threading
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import caches
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Crea el cliente de S3 en el primer uso y lo comparte entre hilos.
+
+    boto3 se importa aquí para no cargarlo en procesos que nunca hablan con S3
+    (migraciones, comandos de gestión, tests).
+    """
+    global _s3_client
+
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                import boto3
+                from botocore.config import Config
+
+                _s3_client = boto3.client(
+                    's3',
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME,
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    config=Config(
+                        max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS,
+                        connect_timeout=settings.AWS_S3_CONNECT_TIMEOUT,
+                        read_timeout=settings.AWS_S3_READ_TIMEOUT,
+                        retries={
+                            'max_attempts': settings.AWS_S3_MAX_ATTEMPTS,
+                            'mode': settings.AWS_S3_RETRY_MODE,
+                        },
+                        s3={'addressing_style': settings.AWS_S3_ADDRESSING_STYLE},
+                        signature_version=settings.AWS_S3_SIGNATURE_VERSION,
+                    ),
+                )
+    return _s3_client
+
+
+async def aget_s3_client():
+    """
+    Versión async de `get_s3_client`: la primera creación (importar boto3 y
+    cargar los modelos de servicio) se hace en un hilo para no bloquear el
+    event loop; después devuelve el cliente ya creado sin cambiar de hilo.
+    """
+    if _s3_client is None:
+        return await sync_to_async(get_s3_client, thread_sensitive=False)()
+    return _s3_client
+
+
+class SigV4Presigner:
+    """
+    Firma URLs presignadas SigV4 de S3 localmente, produciendo exactamente la
+    misma URL que `generate_presigned_url` de botocore pero sin pasar por su
+    sistema de eventos, validación y serialización en cada llamada.
+
+    El esquema, host y prefijo de ruta (que dependen de la región, el estilo
+    de direccionamiento y `endpoint_url`) se obtienen una vez presignando una
+    clave de prueba con botocore. La clave de firma derivada se cachea por día.
+    """
+    PROBE_KEY = 'presign-probe'
+
+    def __init__(self, s3_client, bucket, access_key, secret_key):
+        probe_url = s3_client.generate_presigned_url(
+            'get_object', Params={'Bucket': bucket, 'Key': self.PROBE_KEY},
+        )
+        base = urlsplit(probe_url)
+        self.scheme = base.scheme
+        self.host = base.netloc
+        self.path_prefix = base.path[:-len(self.PROBE_KEY)]
+        self.region = s3_client.meta.region_name
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self._day_contexts = {}
+
+    def get_signing_key(self, date_stamp):
+        return self._get_day_context(date_stamp)[0]
+
+    def _get_day_context(self, date_stamp):
+        # (clave de firma, scope, X-Amz-Credential ya codificado) del día.
+        context = self._day_contexts.get(date_stamp)
+        if context is None:
+            signing_key = ('AWS4' + self.secret_key).encode()
+            for part in (date_stamp, self.region, 's3', 'aws4_request'):
+                signing_key = hmac.new(signing_key, part.encode(), hashlib.sha256).digest()
+            scope = f'{date_stamp}/{self.region}/s3/aws4_request'
+            context = (signing_key, scope, quote(f'{self.access_key}/{scope}', safe='-_.~'))
+            # Solo hace falta la del día en curso.
+            self._day_contexts = {date_stamp: context}
+        return context
+
+    def presign(self, method, bucket_key, expires_in, params=(), content_type=None, now=None):
+        """
+        Devuelve la URL presignada para `method` sobre `bucket_key`. `params`
+        son los parámetros de la operación (p. ej. `uploadId`, `partNumber`)
+        en el orden en que botocore los serializa.
+        """
+        amz_date = (now or datetime.now(timezone.utc)).strftime('%Y%m%dT%H%M%SZ')
+        signing_key, scope, credential = self._get_day_context(amz_date[:8])
+
+        if content_type is None:
+            canonical_headers = f'host:{self.host}\n'
+            signed_headers, encoded_signed_headers = 'host', 'host'
+        else:
+            canonical_headers = f'content-type:{" ".join(content_type.split())}\nhost:{self.host}\n'
+            signed_headers, encoded_signed_headers = 'content-type;host', 'content-type%3Bhost'
+
+        # Los valores de autenticación solo contienen caracteres que no se codifican.
+        auth_query = (
+            f'X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Credential={credential}&X-Amz-Date={amz_date}'
+            f'&X-Amz-Expires={expires_in}&X-Amz-SignedHeaders={encoded_signed_headers}'
+        )
+        if params:
+            encoded_params = [(quote(name, safe='-_.~'), quote(str(value), safe='-_.~')) for name, value in params]
+            operation_query = '&'.join(f'{name}={value}' for name, value in encoded_params) + '&'
+            canonical_query = '&'.join(
+                f'{name}={value}' for name, value in sorted(encoded_params + [
+                    tuple(pair.split('=', 1)) for pair in auth_query.split('&')
+                ])
+            )
+        else:
+            operation_query = ''
+            canonical_query = auth_query
+
+        path = self.path_prefix + quote(bucket_key, safe='/~')
+        canonical_request = (
+            f'{method}\n{path}\n{canonical_query}\n{canonical_headers}\n{signed_headers}\nUNSIGNED-PAYLOAD'
+        )
+        string_to_sign = (
+            f'AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n'
+            f'{hashlib.sha256(canonical_request.encode()).hexdigest()}'
+        )
+        signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+        return f'{self.scheme}://{self.host}{path}?{operation_query}{auth_query}&X-Amz-Signature={signature}'
+
 
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    region_name=settings.AWS_S3_REGION_NAME
-)
+_presigner = None
+_presigner_lock = threading.Lock()
+
+
+def get_presigner():
+    """
+    Devuelve el `SigV4Presigner` compartido, o None si hay que presignar con
+    botocore: firma distinta de SigV4, credenciales que no vienen de settings
+    (rol de instancia, credenciales temporales con token) o
+    AWS_S3_FAST_PRESIGN desactivado.
+    """
+    global _presigner
+
+    if (
+        not settings.AWS_S3_FAST_PRESIGN
+        or settings.AWS_S3_SIGNATURE_VERSION != 's3v4'
+        or not settings.AWS_ACCESS_KEY_ID
+        or not settings.AWS_SECRET_ACCESS_KEY
+    ):
+        return None
+
+    if _presigner is None:
+        with _presigner_lock:
+            if _presigner is None:
+                _presigner = SigV4Presigner(
+                    get_s3_client(),
+                    settings.AWS_STORAGE_BUCKET_NAME,
+                    settings.AWS_ACCESS_KEY_ID,
+                    settings.AWS_SECRET_ACCESS_KEY,
+                )
+    return _presigner
 
 
 """ def upload_to_s3(file_obj, bucket_key, content_type):
 
-    s3_client.upload_fileobj(
+    get_s3_client().upload_fileobj(
         Fileobj=file_obj,
         Bucket=settings.AWS_STORAGE_BUCKET_NAME,
         Key=bucket_key,
@@ -20,20 +190,110 @@ s3_client = boto3.client(
     return f's3://{settings.AWS_STORAGE_BUCKET_NAME}/{bucket_key}' """
 
 
+_cache_stats_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def _count_cache_access(hit):
+    with _cache_stats_lock:
+        _cache_stats['hits' if hit else 'misses'] += 1
+
+
+def get_presigned_url_cache_stats():
+    with _cache_stats_lock:
+        hits, misses = _cache_stats['hits'], _cache_stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def _download_url_cache_key(bucket_key):
+    digest = hashlib.sha256(f'{settings.AWS_STORAGE_BUCKET_NAME}/{bucket_key}'.encode()).hexdigest()
+    return f'presigned:get_object:{digest}'
+
+
 def download_from_s3(bucket_key):
+    """
+    Devuelve una URL presignada de descarga, reutilizando la última generada para
+    `bucket_key` mientras le quede más de PRESIGNED_URL_REFRESH_MARGIN segundos de validez.
+    """
+    cache = caches[settings.PRESIGNED_URL_CACHE_ALIAS]
+    cache_key = _download_url_cache_key(bucket_key)
 
-    presigned_url = s3_client.generate_presigned_url(
+    presigned_url = cache.get(cache_key)
+    if presigned_url is not None:
+        _count_cache_access(hit=True)
+        return presigned_url
+    _count_cache_access(hit=False)
+
+    presigned_url = _presign_download_url(get_s3_client(), bucket_key)
+
+    timeout = _download_url_cache_timeout()
+    if timeout > 0:
+        cache.set(cache_key, presigned_url, timeout=timeout)
+    return presigned_url
+
+
+async def adownload_from_s3(bucket_key):
+    """
+    Versión async de `download_from_s3`. Presignar es cálculo local (HMAC),
+    sin red, así que se hace directamente en el event loop; solo la caché usa
+    su API async por si el backend es remoto.
+    """
+    cache = caches[settings.PRESIGNED_URL_CACHE_ALIAS]
+    cache_key = _download_url_cache_key(bucket_key)
+
+    presigned_url = await cache.aget(cache_key)
+    if presigned_url is not None:
+        _count_cache_access(hit=True)
+        return presigned_url
+    _count_cache_access(hit=False)
+
+    presigned_url = _presign_download_url(await aget_s3_client(), bucket_key)
+
+    timeout = _download_url_cache_timeout()
+    if timeout > 0:
+        await cache.aset(cache_key, presigned_url, timeout=timeout)
+    return presigned_url
+
+
+def _download_url_cache_timeout():
+    return settings.PRESIGNED_URL_EXPIRES_IN - settings.PRESIGNED_URL_REFRESH_MARGIN
+
+
+def _presign_download_url(s3_client, bucket_key):
+    presigner = get_presigner()
+    if presigner is not None:
+        return presigner.presign('GET', bucket_key, settings.PRESIGNED_URL_EXPIRES_IN)
+
+    return s3_client.generate_presigned_url(
         'get_object',
         Params={
             'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
             'Key': bucket_key,
         },
-        ExpiresIn=3600,
+        ExpiresIn=settings.PRESIGNED_URL_EXPIRES_IN,
     )
-    return presigned_url
 
 def generate_presigned_upload_url(bucket_key, content_type):
  
+    return _presign_upload_url(get_s3_client(), bucket_key, content_type)
+
+
+async def agenerate_presigned_upload_url(bucket_key, content_type):
+
+    return _presign_upload_url(await aget_s3_client(), bucket_key, content_type)
+
+
+def _presign_upload_url(s3_client, bucket_key, content_type):
+
+    presigner = get_presigner()
+    if presigner is not None:
+        return presigner.presign('PUT', bucket_key, settings.PRESIGNED_URL_EXPIRES_IN, content_type=content_type)
+
     presigned_url = s3_client.generate_presigned_url(
         'put_object',
         Params={
@@ -41,8 +301,116 @@ def generate_presigned_upload_url(bucket_key, content_type):
             'Key': bucket_key,
             'ContentType': content_type
         },
-        ExpiresIn=3600,
+        ExpiresIn=settings.PRESIGNED_URL_EXPIRES_IN,
     )
         
     return presigned_url
         
+
+def generate_presigned_upload_urls(uploads):
+
+    return [
+        generate_presigned_upload_url(bucket_key=bucket_key, content_type=content_type)
+        for bucket_key, content_type in uploads
+    ]
+
+
+def create_multipart_upload(bucket_key, content_type):
+
+    response = get_s3_client().create_multipart_upload(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=bucket_key,
+        ContentType=content_type,
+    )
+    return response['UploadId']
+
+def generate_presigned_part_urls(bucket_key, upload_id, part_count):
+
+    s3_client = get_s3_client()
+    presigner = get_presigner()
+    if presigner is not None:
+        return [
+            {
+                'part_number': part_number,
+                'upload_url': presigner.presign(
+                    'PUT', bucket_key, settings.PRESIGNED_URL_EXPIRES_IN,
+                    params=[('uploadId', upload_id), ('partNumber', part_number)],
+                ),
+            }
+            for part_number in range(1, part_count + 1)
+        ]
+
+    return [
+        {
+            'part_number': part_number,
+            'upload_url': s3_client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+                    'Key': bucket_key,
+                    'UploadId': upload_id,
+                    'PartNumber': part_number,
+                },
+                ExpiresIn=settings.PRESIGNED_URL_EXPIRES_IN,
+            ),
+        }
+        for part_number in range(1, part_count + 1)
+    ]
+
+def complete_multipart_upload(bucket_key, upload_id, parts):
+
+    response = get_s3_client().complete_multipart_upload(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=bucket_key,
+        UploadId=upload_id,
+        MultipartUpload={
+            'Parts': [
+                {'PartNumber': part['part_number'], 'ETag': part['etag']}
+                for part in sorted(parts, key=lambda part: part['part_number'])
+            ]
+        },
+    )
+    return response.get('ETag')
+
+def abort_multipart_upload(bucket_key, upload_id):
+
+    get_s3_client().abort_multipart_upload(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=bucket_key,
+        UploadId=upload_id,
+    )
+
+def iter_bucket_objects(prefix, start_after=''):
+    """
+    Recorre las claves bajo `prefix` en el orden binario (UTF-8) en que las
+    devuelve ListObjectsV2, página a página.
+    """
+    paginator = get_s3_client().get_paginator('list_objects_v2')
+    params = {'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Prefix': prefix}
+    if start_after:
+        params['StartAfter'] = start_after
+
+    for page in paginator.paginate(**params):
+        for s3_object in page.get('Contents', []):
+            yield s3_object['Key'], s3_object['LastModified']
+
+def delete_objects(bucket_keys):
+    """
+    Borra claves con DeleteObjects en lotes de hasta 1000. Devuelve las claves
+    que S3 no pudo borrar.
+    """
+    s3_client = get_s3_client()
+    bucket_keys = list(bucket_keys)
+    failed = []
+
+    for start in range(0, len(bucket_keys), 1000):
+        response = s3_client.delete_objects(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Delete={
+                'Objects': [{'Key': bucket_key} for bucket_key in bucket_keys[start:start + 1000]],
+                'Quiet': True,
+            },
+        )
+        failed.extend(error['Key'] for error in response.get('Errors', []))
+
+    return failed
@@ -0,0 +1,132 @@
+import random
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+
+from documents.models import Document, DocumentStats
+
+
+STATS_SHARDS = 16
+
+
+def document_stats_change(document, sign=1):
+    """
+    Cambio de `DocumentStats` que aporta `document` (`sign=-1` para restarlo).
+    Usa su `business_entity` ya cargada, o el `entity_type` anotado.
+    """
+    entity_type = getattr(document, 'entity_type', None) or document.business_entity.entity_type
+    return document.company_id, entity_type, document.status, sign, sign * document.size_bytes
+
+
+def document_stats_changes_of(documents, sign=-1):
+    """
+    Cambios de `DocumentStats` de los documentos de un queryset, agregados en
+    la base de datos (una fila por clave, sin traer los documentos).
+    """
+    return [
+        (row['company_id'], row['entity_type'], row['status'], sign * row['count'], sign * (row['size'] or 0))
+        for row in documents.order_by()
+        .values('company_id', 'status', entity_type=F('business_entity__entity_type'))
+        .annotate(count=Count('pk'), size=Sum('size_bytes'))
+    ]
+
+
+def record_document_stats(changes):
+    """
+    Suma a `DocumentStats` los cambios `(company_id, entity_type, status,
+    document_count, size_bytes)` con un único INSERT ... ON CONFLICT DO
+    UPDATE sobre un shard al azar. Debe llamarse en la transacción del cambio
+    para que los contadores se confirmen con él. Las claves se escriben
+    ordenadas para que dos transacciones no se bloqueen en orden inverso.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for company_id, entity_type, status, document_count, size_bytes in changes:
+        total = totals[(company_id, entity_type, status or '')]
+        total[0] += document_count
+        total[1] += size_bytes
+    rows = sorted((key, total) for key, total in totals.items() if total != [0, 0])
+    if not rows:
+        return
+
+    shard = random.randrange(STATS_SHARDS)
+    company_field = DocumentStats._meta.get_field('company')
+    params = []
+    for (company_id, entity_type, status), (document_count, size_bytes) in rows:
+        params += [company_field.get_db_prep_value(company_id, connection), entity_type, status, shard, document_count, size_bytes]
+
+    table = DocumentStats._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (company_id, entity_type, status, shard, document_count, size_bytes) '
+            f'VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows))} '
+            f'ON CONFLICT (company_id, entity_type, status, shard) DO UPDATE SET '
+            f'document_count = {table}.document_count + EXCLUDED.document_count, '
+            f'size_bytes = {table}.size_bytes + EXCLUDED.size_bytes',
+            params,
+        )
+
+
+def get_company_stats(company_id):
+    """
+    Totales de documentos vivos de una empresa y su desglose por tipo de
+    entidad y estado, sumando los shards.
+    """
+    breakdown = [
+        {
+            'entity_type': row['entity_type'],
+            'status': row['status'] or None,
+            'document_count': row['document_count'],
+            'size_bytes': row['size_bytes'],
+        }
+        for row in DocumentStats.objects
+        .filter(company_id=company_id)
+        .values('entity_type', 'status')
+        .annotate(document_count=Sum('document_count'), size_bytes=Sum('size_bytes'))
+        .order_by('entity_type', 'status')
+        if row['document_count'] or row['size_bytes']
+    ]
+    return {
+        'company': str(company_id),
+        'document_count': sum(row['document_count'] for row in breakdown),
+        'size_bytes': sum(row['size_bytes'] for row in breakdown),
+        'breakdown': breakdown,
+    }
+
+
+def rebuild_company_stats(company_id):
+    """
+    Recalcula desde cero los contadores de una empresa a partir de sus
+    documentos vivos. Los documentos y los contadores se leen en la misma
+    instantánea y se suma a un shard la diferencia: las escrituras
+    confirmadas después ya suman su propio cambio, así que no hace falta
+    bloquear a nadie mientras se recalcula. Devuelve `(documentos contados,
+    claves corregidas)`.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        actual = {
+            (entity_type, status or ''): (document_count, size_bytes)
+            for _, entity_type, status, document_count, size_bytes
+            in document_stats_changes_of(Document.objects.alive().filter(company_id=company_id), sign=1)
+        }
+        counted = {
+            (row['entity_type'], row['status']): (row['document_count'], row['size_bytes'])
+            for row in DocumentStats.objects
+            .filter(company_id=company_id)
+            .values('entity_type', 'status')
+            .annotate(document_count=Sum('document_count'), size_bytes=Sum('size_bytes'))
+            .order_by()
+        }
+
+    corrections = []
+    for key in actual.keys() | counted.keys():
+        document_count, size_bytes = actual.get(key, (0, 0))
+        counted_count, counted_size = counted.get(key, (0, 0))
+        if (document_count, size_bytes) != (counted_count, counted_size):
+            corrections.append((company_id, *key, document_count - counted_count, size_bytes - counted_size))
+    with transaction.atomic():
+        record_document_stats(corrections)
+    return sum(document_count for document_count, _ in actual.values()), len(corrections)
@@ -0,0 +1,94 @@
+import json
+from urllib.parse import unquote_plus
+
+from django.conf import settings
+from django.db import transaction
+
+from django.db.models import F
+
+from documents.models import Blob, Document
+from documents.services.stats_service import record_document_stats
+
+
+def parse_object_created_events(body):
+    """
+    Extrae `(bucket_key, size, etag)` de una notificación de S3. Acepta el
+    mensaje tal cual lo publica S3 en SQS o envuelto por SNS.
+    """
+    try:
+        payload = json.loads(body)
+    except (TypeError, ValueError):
+        return []
+
+    if isinstance(payload, dict) and 'Message' in payload and 'Records' not in payload:
+        try:
+            payload = json.loads(payload['Message'])
+        except (TypeError, ValueError):
+            return []
+
+    events = []
+    for record in payload.get('Records', []) if isinstance(payload, dict) else []:
+        if not record.get('eventName', '').startswith('ObjectCreated:'):
+            continue
+        s3 = record.get('s3', {})
+        if s3.get('bucket', {}).get('name') != settings.AWS_STORAGE_BUCKET_NAME:
+            continue
+        s3_object = s3.get('object', {})
+        if 'key' not in s3_object:
+            continue
+        events.append((
+            unquote_plus(s3_object['key']),
+            s3_object.get('size'),
+            s3_object.get('eTag'),
+        ))
+    return events
+
+
+def apply_object_created_events(events):
+    """
+    Marca como subidos los documentos de un lote de eventos, y los blobs de
+    sus objetos, con una consulta y una actualización masiva por tabla. El
+    tamaño real del objeto sustituye al declarado, también en `DocumentStats`.
+    Devuelve el número de documentos actualizados.
+    """
+    latest = {bucket_key: (size, etag) for bucket_key, size, etag in events}
+    if not latest:
+        return 0
+
+    with transaction.atomic():
+        documents = list(
+            Document.objects.select_for_update(of=('self',))
+            .filter(bucket_key__in=latest.keys())
+            .only('id', 'bucket_key', 'size_bytes', 'etag', 'upload_state', 'upload_id', 'company_id', 'status', 'deleted_at')
+            .annotate(entity_type=F('business_entity__entity_type'))
+        )
+        stats = []
+        for document in documents:
+            size, etag = latest[document.bucket_key]
+            document.upload_state = Document.UPLOAD_STATE.UPLOADED
+            document.upload_id = None
+            document.etag = etag
+            if size is not None and size != document.size_bytes and document.deleted_at is None:
+                stats.append((document.company_id, document.entity_type, document.status, 0, size - document.size_bytes))
+            if size is not None:
+                document.size_bytes = size
+
+        Document.objects.bulk_update(
+            documents, ['upload_state', 'upload_id', 'etag', 'size_bytes'], batch_size=500
+        )
+        record_document_stats(stats)
+
+        blobs = list(
+            Blob.objects.select_for_update()
+            .filter(bucket_key__in=latest.keys())
+            .only('id', 'bucket_key', 'size_bytes', 'etag', 'upload_state')
+        )
+        for blob in blobs:
+            size, etag = latest[blob.bucket_key]
+            blob.upload_state = Document.UPLOAD_STATE.UPLOADED
+            blob.etag = etag
+            if size is not None:
+                blob.size_bytes = size
+
+        Blob.objects.bulk_update(blobs, ['upload_state', 'etag', 'size_bytes'], batch_size=500)
+    return len(documents)
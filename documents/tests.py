@@ -1,3 +1,1376 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    Blob, BusinessEntity, Company, Document, DocumentEvent, Job, StoragePurge, ValidationFlow, ValidationFlowTemplate,
+    ValidationStep
+)
+from .services.approval_service import MAX_BULK_DECISIONS
+from .services.document_service import S3_MAX_PARTS, S3_MIN_PART_SIZE, get_multipart_layout, reuse_uploaded_blob
+from .services.event_queue import SpoolDirectoryEventQueue
+from .services.idempotency import claim_idempotency_key, get_request_fingerprint
+from .services.jobs import _handlers, claim_jobs, enqueue_job, get_retry_delay, new_job_stats, run_job
+from .services.model_cache import company_cache
+from .services.notifications import broadcaster
+from .services.outbox import build_document_event, record_document_events
+from .services.purge_service import (
+    PURGE_JOB_MAX_BATCHES, PURGE_JOB_TYPE, delete_business_entity, delete_company, delete_documents, purge_batch,
+    run_purge_job
+)
+from .services.s3_service import SigV4Presigner, download_from_s3, get_presigned_url_cache_stats
+from .services.stats_service import document_stats_change, get_company_stats, record_document_stats
+from .services.upload_events import apply_object_created_events
+
+
+def create_document(company, entity, bucket_key='companies/acme/doc.pdf', **fields):
+    return Document.objects.create(
+        name='doc.pdf',
+        mime_type='application/pdf',
+        size_bytes=1024,
+        bucket_key=bucket_key,
+        company=company,
+        business_entity=entity,
+        status=Document.STATUS.PENDING,
+        **fields,
+    )
+
+
+def create_document_with_steps(company, entity, approvers, bucket_key='companies/acme/doc.pdf'):
+    document = create_document(company, entity, bucket_key=bucket_key)
+    flow = ValidationFlow.objects.create(
+        document=document, enable=True, current_order=1, total_steps=len(approvers), current_approver_user_id=approvers[0],
+    )
+    ValidationStep.objects.bulk_create([
+        ValidationStep(validation_flow=flow, order=order, approver_user_id=approver_user_id)
+        for order, approver_user_id in enumerate(approvers, start=1)
+    ])
+    return document
+
+
+def document_payload(company, entity, name, **document):
+    return {
+        'company_id': str(company.pk),
+        'entity': {'entity_id': str(entity.pk), 'entity_type': 'vehicle'},
+        'document': {'name': name, 'mime_type': 'application/pdf', 'size_bytes': 1024, **document},
+        'validation_flow': {'enabled': True, 'steps': [{'order': 1, 'approver_user_id': 'approver-1'}]},
+    }
+
+
+def mock_s3_client(test):
+    """
+    Sustituye el cliente de S3 durante el test por un mock que devuelve URLs
+    presignadas distintas en cada llamada.
+    """
+    patcher = mock.patch('documents.services.s3_service.get_s3_client')
+    client = patcher.start().return_value
+    client.generate_presigned_url.side_effect = lambda *args, **kwargs: f'https://bucket.s3.amazonaws.com/{uuid.uuid4()}'
+    test.addCleanup(patcher.stop)
+    return client
+
+
+def fake_presigned_urls(uploads):
+    return [f'https://bucket.s3.amazonaws.com/{bucket_key}' for bucket_key, _ in uploads]
+
+
+# Credenciales ficticias: las URLs presignadas se firman en local, sin llamar a S3.
+s3_test_settings = override_settings(
+    AWS_ACCESS_KEY_ID='AKIDEXAMPLE', AWS_SECRET_ACCESS_KEY='secret',
+    AWS_STORAGE_BUCKET_NAME='bucket', AWS_S3_REGION_NAME='us-east-1',
+)
+
+
+class DocumentPaginationTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='ACME')
+        self.entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        self.documents = [
+            create_document(self.company, self.entity, bucket_key=f'companies/acme/{index}.pdf') for index in range(5)
+        ]
+        # Todos con el mismo created_at: el orden lo decide el id.
+        Document.objects.update(created_at=timezone.now())
+
+    def test_cursor_pages_are_stable_across_equal_created_at(self):
+        ids = []
+        url = '/api/documents/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [document['id'] for document in response.json()['results']]
+            url = response.json()['next']
+            # Un documento nuevo no desplaza las páginas siguientes.
+            create_document(self.company, self.entity, bucket_key=f'companies/acme/new-{len(ids)}.pdf')
+
+        self.assertEqual(ids, sorted((str(document.pk) for document in self.documents), reverse=True))
+
+    def test_filters_combine_with_the_cursor(self):
+        Document.objects.filter(pk=self.documents[0].pk).update(status=Document.STATUS.APPROVED)
+        other_company = Company.objects.create(name='Other')
+        create_document(
+            other_company,
+            BusinessEntity.objects.create(company=other_company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE),
+            bucket_key='companies/other/doc.pdf',
+        )
+
+        response = self.client.get('/api/documents/', {'company': str(self.company.pk), 'status': 'P', 'page_size': 10})
+
+        self.assertEqual(
+            sorted(document['id'] for document in response.json()['results']),
+            sorted(str(document.pk) for document in self.documents[1:]),
+        )
+        self.assertIsNone(response.json()['next'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/documents/', {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class DocumentExpandTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='ACME')
+        self.entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+
+    def _create_documents(self, count):
+        template = ValidationFlowTemplate.objects.create(company=self.company, name='Dos firmas', steps=[
+            {'order': order, 'approver_user_id': f'approver-{order}'} for order in (1, 2)
+        ])
+        for index in range(Document.objects.count(), count):
+            document = create_document(self.company, self.entity, bucket_key=f'companies/acme/{index}.pdf')
+            # La mitad de los flujos copian sus pasos y la otra mitad usa la plantilla.
+            if index % 2:
+                ValidationFlow.objects.create(document=document, enable=True, template=template, total_steps=2)
+                continue
+            flow = ValidationFlow.objects.create(document=document, enable=True)
+            ValidationStep.objects.bulk_create([
+                ValidationStep(validation_flow=flow, order=order, approver_user_id=f'approver-{order}') for order in (1, 2)
+            ])
+
+    def _list(self, expand, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get('/api/documents/', {'expand': expand, 'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_expanded_page_costs_a_constant_number_of_queries(self):
+        for count in (10, 100):
+            self._create_documents(count)
+
+            results = self._list('validation_flow', 1)
+            self.assertEqual(len(results), count)
+            self.assertTrue(all(document['validation_flow']['enable'] for document in results))
+
+            results = self._list('steps', 3)
+            self.assertTrue(all(
+                [step['approver_user_id'] for step in document['validation_flow']['steps']] == ['approver-1', 'approver-2']
+                for document in results
+            ))
+
+    def test_unknown_expand_value_is_rejected(self):
+        response = self.client.get('/api/documents/', {'expand': 'owner'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+@s3_test_settings
+class TemplateFlowTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name='ACME')
+        entity = BusinessEntity.objects.create(company=company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        template = ValidationFlowTemplate.objects.create(company=company, name='Dos firmas', steps=[
+            {'order': 1, 'approver_user_id': 'approver-1'},
+            {'order': 2, 'approver_user_id': 'approver-2'},
+        ])
+        self.client = APIClient()
+        self.document_ids = []
+        for index in range(2):
+            payload = document_payload(company, entity, f'{index}.pdf')
+            payload['validation_flow'] = {'enabled': True, 'template_id': str(template.pk)}
+            response = self.client.post('/api/documents/', payload, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.document_ids.append(response.json()['document']['id'])
+
+    def _inbox(self, approver_user_id):
+        response = self.client.get(f'/api/approvers/{approver_user_id}/pending/')
+        return sorted(step['document']['id'] for step in response.json()['results'])
+
+    def _decide(self, action, document_id, approver_user_id, **data):
+        return self.client.post(
+            f'/api/documents/{document_id}/{action}/', {'approver_user_id': approver_user_id, **data}, format='json',
+        ).json()
+
+    def test_approve_walks_the_template_steps(self):
+        approved, other = self.document_ids
+        self.assertEqual(self._inbox('approver-1'), sorted(self.document_ids))
+        self.assertEqual(self._inbox('approver-2'), [])
+
+        self.assertEqual(self._decide('approve', approved, 'approver-1'), {'message': 'Step approved'})
+        self.assertEqual(self._inbox('approver-1'), [other])
+        self.assertEqual(self._inbox('approver-2'), [approved])
+
+        self.assertEqual(self._decide('approve', approved, 'approver-2'), {'message': 'Document approved'})
+        self.assertEqual(self._inbox('approver-2'), [])
+
+        document = self.client.get(f'/api/documents/{approved}/', {'expand': 'steps'}).json()
+        self.assertEqual(document['status'], Document.STATUS.APPROVED)
+        self.assertEqual([step['status'] for step in document['validation_flow']['steps']], ['A', 'A'])
+        self.assertFalse(ValidationStep.objects.exists())
+
+    def test_reject_ends_the_template_flow(self):
+        rejected, other = self.document_ids
+
+        self.assertEqual(
+            self._decide('reject', rejected, 'approver-1', reason='Ilegible'), {'message': 'Document rejected'},
+        )
+        self.assertEqual(self._inbox('approver-1'), [other])
+
+        document = self.client.get(f'/api/documents/{rejected}/', {'expand': 'steps'}).json()
+        self.assertEqual(document['status'], Document.STATUS.REJECTED)
+        self.assertEqual([step['status'] for step in document['validation_flow']['steps']], ['R', 'P'])
+
+
+@mock.patch('documents.views.generate_presigned_upload_urls', fake_presigned_urls)
+class BulkDocumentCreateTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='ACME')
+        self.entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+
+    def _bulk(self, payloads):
+        return self.client.post('/api/documents/bulk/', {'documents': payloads}, content_type='application/json')
+
+    def test_creates_all_documents_in_request_order(self):
+        response = self._bulk([document_payload(self.company, self.entity, f'{index}.pdf') for index in range(3)])
+
+        self.assertEqual(response.status_code, 201)
+        results = response.json()['results']
+        self.assertEqual([result['document']['name'] for result in results], ['0.pdf', '1.pdf', '2.pdf'])
+        self.assertTrue(all(result['upload_url'] for result in results))
+        self.assertEqual(ValidationStep.objects.count(), 3)
+        self.assertEqual(get_company_stats(self.company.pk)['document_count'], 3)
+        self.assertEqual(
+            sorted(DocumentEvent.objects.values_list('document_id', flat=True)),
+            sorted(uuid.UUID(result['document']['id']) for result in results),
+        )
+
+    def test_invalid_document_rejects_the_whole_batch(self):
+        missing_entity = document_payload(self.company, self.entity, 'b.pdf')
+        missing_entity['entity']['entity_id'] = str(uuid.uuid4())
+
+        response = self._bulk([document_payload(self.company, self.entity, 'a.pdf'), missing_entity])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertFalse(Document.objects.exists())
+
+    def test_failure_while_saving_rolls_back_every_row(self):
+        with mock.patch.object(ValidationStep.objects, 'bulk_create', side_effect=RuntimeError('boom')):
+            response = self._bulk([document_payload(self.company, self.entity, f'{index}.pdf') for index in range(3)])
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Document.objects.exists())
+        self.assertFalse(ValidationFlow.objects.exists())
+        self.assertFalse(DocumentEvent.objects.exists())
+
+
+@s3_test_settings
+class IdempotentDocumentCreateTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name='ACME')
+        entity = BusinessEntity.objects.create(company=company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        self.payload = document_payload(company, entity, 'a.pdf')
+        self.client = APIClient()
+
+    def _create(self, payload, key='key-1'):
+        return self.client.post('/api/documents/', payload, format='json', headers={'Idempotency-Key': key})
+
+    def test_retry_replays_the_original_response(self):
+        first = self._create(self.payload)
+        retry = self._create(self.payload)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.json()['document']), (201, first.json()['document']))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Document.objects.count(), 1)
+
+    def test_retry_after_the_urls_expired_gets_them_signed_again(self):
+        first = self._create(self.payload)
+        later = timezone.now() + timedelta(seconds=settings.PRESIGNED_URL_EXPIRES_IN + 60)
+        with mock.patch('documents.services.s3_service.datetime') as clock:
+            clock.now.return_value = later
+            retry = self._create(self.payload)
+
+        original_url, replayed_url = first.json()['upload_url'], retry.json()['upload_url']
+        self.assertEqual(replayed_url.split('?')[0], original_url.split('?')[0])
+        self.assertIn(f"X-Amz-Date={later.strftime('%Y%m%dT%H%M%SZ')}", replayed_url)
+        self.assertEqual(Document.objects.count(), 1)
+
+    def test_reusing_a_key_with_another_body_is_rejected(self):
+        self._create(self.payload)
+        other = dict(self.payload, document=dict(self.payload['document'], name='b.pdf'))
+
+        self.assertEqual(self._create(other).status_code, 422)
+        self.assertEqual(Document.objects.count(), 1)
+
+    def test_retry_while_the_original_is_in_flight_conflicts(self):
+        claim_idempotency_key('documents.create', 'key-1', get_request_fingerprint(self.payload))
+
+        self.assertEqual(self._create(self.payload).status_code, 409)
+        self.assertFalse(Document.objects.exists())
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentValidationTests(TransactionTestCase):
+    CALLS = 300
+    WORKERS = 30
+
+    def setUp(self):
+        company = Company.objects.create(name='ACME')
+        entity = BusinessEntity.objects.create(company=company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        self.document = Document.objects.create(
+            name='dossier.pdf',
+            mime_type='application/pdf',
+            size_bytes=1024,
+            bucket_key='companies/acme/dossier.pdf',
+            company=company,
+            business_entity=entity,
+            status=Document.STATUS.PENDING,
+        )
+        flow = ValidationFlow.objects.create(document=self.document, enable=True, current_order=1, total_steps=2)
+        ValidationStep.objects.bulk_create([
+            ValidationStep(validation_flow=flow, order=1, approver_user_id='approver-1'),
+            ValidationStep(validation_flow=flow, order=2, approver_user_id='approver-2'),
+        ])
+
+    def _call(self, index):
+        action = 'approve' if index % 2 else 'reject'
+        approver_user_id = 'approver-1' if index % 4 < 2 else 'approver-2'
+        try:
+            response = APIClient().post(
+                f'/api/documents/{self.document.pk}/{action}/',
+                {'approver_user_id': approver_user_id, 'reason': f'{action} #{index}'},
+                format='json',
+            )
+            return response.status_code, response.data
+        finally:
+            connection.close()
+
+    def test_parallel_approve_and_reject_have_one_consistent_outcome(self):
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            results = list(executor.map(self._call, range(self.CALLS)))
+
+        self.assertTrue(all(status in (200, 400) for status, _ in results), results)
+        messages = [data.get('message') for status, data in results if status == 200]
+        finals = [message for message in messages if message in ('Document approved', 'Document rejected')]
+        self.assertEqual(len(finals), 1, messages)
+
+        self.document.refresh_from_db()
+        flow = ValidationFlow.objects.get(document=self.document)
+        step_statuses = list(flow.steps.values_list('status', flat=True))
+        self.assertFalse(flow.enable)
+
+        if finals[0] == 'Document approved':
+            self.assertEqual(self.document.status, Document.STATUS.APPROVED)
+            self.assertEqual(step_statuses, [ValidationStep.STATUS.APPROVED] * 2)
+            self.assertNotIn('Document rejected', messages)
+        else:
+            self.assertEqual(self.document.status, Document.STATUS.REJECTED)
+            self.assertEqual(step_statuses.count(ValidationStep.STATUS.REJECTED), 1)
+            self.assertEqual(messages.count('Step approved'), step_statuses.count(ValidationStep.STATUS.APPROVED))
+
+
+class ApprovalChainTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='ACME')
+        self.entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        self.client = APIClient()
+
+    def _approve(self, document, approver_user_id):
+        return self.client.post(f'/api/documents/{document.pk}/approve/', {'approver_user_id': approver_user_id}, format='json')
+
+    def test_approver_with_several_steps_approves_them_in_turn(self):
+        document = create_document_with_steps(self.company, self.entity, ['approver-1', 'approver-2', 'approver-1'])
+
+        response = self._approve(document, 'approver-1')
+        self.assertEqual(response.data, {'message': 'Step approved'})
+        flow = ValidationFlow.objects.get(document=document)
+        self.assertEqual(list(flow.steps.order_by('order').values_list('status', flat=True)), ['A', 'P', 'P'])
+        self.assertEqual((flow.current_order, flow.current_approver_user_id), (2, 'approver-2'))
+
+        self.assertEqual(self._approve(document, 'approver-2').data, {'message': 'Step approved'})
+        self.assertEqual(self._approve(document, 'approver-1').data, {'message': 'Document approved'})
+
+        document.refresh_from_db()
+        self.assertEqual(document.status, Document.STATUS.APPROVED)
+        self.assertEqual(set(flow.steps.values_list('status', flat=True)), {'A'})
+
+    def test_editing_steps_recomputes_flow_progress(self):
+        document = create_document_with_steps(self.company, self.entity, ['approver-1', 'approver-2', 'approver-3'])
+        flow = ValidationFlow.objects.get(document=document)
+
+        response = self.client.delete(f'/api/validationsteps/{flow.steps.get(order=3).pk}/')
+        self.assertEqual(response.status_code, 204)
+        flow.refresh_from_db()
+        self.assertEqual((flow.total_steps, flow.current_order, flow.current_approver_user_id), (2, 1, 'approver-1'))
+
+        self.assertEqual(self._approve(document, 'approver-1').data, {'message': 'Step approved'})
+        self.assertEqual(self._approve(document, 'approver-2').data, {'message': 'Document approved'})
+
+    def test_reassigning_the_current_step_updates_the_approver(self):
+        document = create_document_with_steps(self.company, self.entity, ['approver-1', 'approver-2'])
+        flow = ValidationFlow.objects.get(document=document)
+        self.assertEqual(self._approve(document, 'approver-1').data, {'message': 'Step approved'})
+
+        response = self.client.patch(
+            f'/api/validationsteps/{flow.steps.get(order=2).pk}/', {'approver_user_id': 'approver-9'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        flow.refresh_from_db()
+        self.assertEqual((flow.total_steps, flow.current_order, flow.current_approver_user_id), (2, 2, 'approver-9'))
+        self.assertEqual(self._approve(document, 'approver-9').data, {'message': 'Document approved'})
+
+
+class DocumentDeletionTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='ACME')
+        self.entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+
+    def _create_document(self, bucket_key):
+        document = create_document_with_steps(self.company, self.entity, ['approver-1'], bucket_key=bucket_key)
+        record_document_stats([document_stats_change(document)])
+        return document
+
+    def _deleted_events(self):
+        return set(DocumentEvent.objects.filter(event_type=DocumentEvent.EVENT_TYPE.DELETED).values_list('document_id', flat=True))
+
+    def test_delete_documents_updates_stats_and_emits_events(self):
+        documents = [self._create_document(f'companies/acme/{index}.pdf') for index in range(2)]
+
+        delete_documents(Document.objects.filter(pk__in=[document.pk for document in documents]))
+
+        self.assertFalse(Document.objects.exists())
+        self.assertFalse(ValidationFlow.objects.exists())
+        self.assertEqual(get_company_stats(self.company.pk)['document_count'], 0)
+        self.assertEqual(self._deleted_events(), {document.pk for document in documents})
+
+    def test_deleting_an_entity_emits_events_for_its_live_documents(self):
+        document = self._create_document('companies/acme/alive.pdf')
+        deleted = self._create_document('companies/acme/deleted.pdf')
+        Document.objects.filter(pk=deleted.pk).update(deleted_at=timezone.now())
+        other_entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.EMPLOYEE)
+        create_document_with_steps(self.company, other_entity, ['approver-1'], bucket_key='companies/acme/other.pdf')
+
+        delete_business_entity(self.entity)
+
+        self.assertEqual(self._deleted_events(), {document.pk})
+        self.assertEqual(Document.objects.count(), 1)
+
+    def test_deleting_a_company_emits_events_for_its_documents(self):
+        documents = [self._create_document(f'companies/acme/{index}.pdf') for index in range(2)]
+
+        delete_company(self.company)
+
+        self.assertEqual(self._deleted_events(), {document.pk for document in documents})
+        self.assertFalse(Document.objects.exists())
+
+
+class CompanyDocumentExportTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='ACME')
+        entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        self.documents = [
+            create_document_with_steps(self.company, entity, ['approver-1'], bucket_key=f'companies/acme/{index}.pdf')
+            for index in range(3)
+        ]
+        Document.objects.filter(pk=self.documents[2].pk).update(deleted_at=timezone.now())
+        self.expected = [
+            {name: value for name, value in self.client.get(f'/api/documents/{document.pk}/').json().items() if name != 'validation_flow'}
+            for document in Document.objects.filter(pk__in=[document.pk for document in self.documents[:2]]).order_by('created_at', 'id')
+        ]
+
+    def _export(self, export_format):
+        response = self.client.get(f'/api/companies/{self.company.pk}/documents/export/', {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_matches_the_document_api(self):
+        lines = self._export('ndjson').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.expected)
+
+    def test_csv_matches_the_document_api(self):
+        rows = list(csv.DictReader(io.StringIO(self._export('csv'))))
+        self.assertEqual(rows, [
+            {name: '' if value is None else str(value) for name, value in document.items()} for document in self.expected
+        ])
+
+
+class ApproverInboxTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='ACME')
+        self.entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+
+    def _create(self, approvers, name):
+        return create_document_with_steps(self.company, self.entity, approvers, bucket_key=f'companies/acme/{name}.pdf')
+
+    def _inbox(self, approver_user_id, **params):
+        response = self.client.get(f'/api/approvers/{approver_user_id}/pending/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _inbox_documents(self, approver_user_id):
+        return sorted(step['document']['id'] for step in self._inbox(approver_user_id)['results'])
+
+    def test_lists_only_the_current_step_of_each_flow(self):
+        first = self._create(['approver-1', 'approver-2'], 'first')
+        second = self._create(['approver-2', 'approver-1'], 'second')
+
+        self.assertEqual(self._inbox_documents('approver-1'), [str(first.pk)])
+        self.assertEqual(self._inbox_documents('approver-2'), [str(second.pk)])
+
+        self.client.post(f'/api/documents/{second.pk}/approve/', {'approver_user_id': 'approver-2'}, content_type='application/json')
+        self.assertEqual(self._inbox_documents('approver-1'), sorted([str(first.pk), str(second.pk)]))
+        self.assertEqual(self._inbox_documents('approver-2'), [])
+
+    def test_excludes_disabled_flows(self):
+        document = self._create(['approver-1'], 'disabled')
+        ValidationFlow.objects.filter(document=document).update(enable=False)
+
+        self.assertEqual(self._inbox_documents('approver-1'), [])
+
+    def test_excludes_soft_deleted_documents(self):
+        document = self._create(['approver-1'], 'deleted')
+
+        response = self.client.delete(f'/api/documents/{document.pk}/')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self._inbox_documents('approver-1'), [])
+        self.assertEqual(self.client.get(f'/api/documents/{document.pk}/').status_code, 404)
+        self.assertTrue(StoragePurge.objects.filter(bucket_key=document.bucket_key).exists())
+
+    def test_pages_through_every_pending_step_once(self):
+        documents = {str(self._create(['approver-1'], f'doc-{index}').pk) for index in range(5)}
+
+        seen = []
+        page = self._inbox('approver-1', page_size=2)
+        seen += [step['document']['id'] for step in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            seen += [step['document']['id'] for step in page['results']]
+
+        self.assertEqual(len(seen), len(documents))
+        self.assertEqual(set(seen), documents)
+
+
+class BulkDecisionTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='ACME')
+        self.entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+
+    def _create(self, approvers, name):
+        document = create_document_with_steps(self.company, self.entity, approvers, bucket_key=f'companies/acme/{name}.pdf')
+        record_document_stats([document_stats_change(document)])
+        return document
+
+    def _stats_by_status(self):
+        response = self.client.get(f'/api/companies/{self.company.pk}/stats/')
+        return {row['status']: row['document_count'] for row in response.json()['breakdown']}
+
+    def _decide(self, action, document_ids, **data):
+        return self.client.post(
+            f'/api/documents/bulk-{action}/',
+            {'document_ids': [str(document_id) for document_id in document_ids], 'approver_user_id': 'approver-1', **data},
+            content_type='application/json',
+        )
+
+    def _inbox(self, approver_user_id):
+        response = self.client.get(f'/api/approvers/{approver_user_id}/pending/')
+        return sorted(step['document']['id'] for step in response.json()['results'])
+
+    def test_approve_returns_one_result_per_document_in_request_order(self):
+        step = self._create(['approver-1', 'approver-2'], 'step')
+        last = self._create(['approver-1'], 'last')
+        other = self._create(['approver-2'], 'other')
+        disabled = self._create(['approver-1'], 'disabled')
+        ValidationFlow.objects.filter(document=disabled).update(enable=False)
+        missing = uuid.uuid4()
+
+        response = self._decide('approve', [last.pk, missing, other.pk, step.pk, disabled.pk, last.pk])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(result['document_id'], result['status']) for result in response.json()['results']],
+            [(str(last.pk), 200), (str(missing), 404), (str(other.pk), 403), (str(step.pk), 200), (str(disabled.pk), 400)],
+        )
+        self.assertEqual(
+            [result.get('message') for result in response.json()['results']],
+            ['Document approved', None, None, 'Step approved', None],
+        )
+        self.assertEqual(Document.objects.get(pk=last.pk).status, Document.STATUS.APPROVED)
+        self.assertEqual(self._stats_by_status(), {Document.STATUS.PENDING: 3, Document.STATUS.APPROVED: 1})
+        self.assertEqual(ValidationFlow.objects.get(document=step).current_order, 2)
+        self.assertEqual(self._inbox('approver-2'), sorted([str(other.pk), str(step.pk)]))
+        self.assertEqual(
+            sorted(DocumentEvent.objects.values_list('event_type', 'document_id')),
+            sorted([(DocumentEvent.EVENT_TYPE.APPROVED, last.pk), (DocumentEvent.EVENT_TYPE.STEP_APPROVED, step.pk)]),
+        )
+
+        # Un segundo intento no vuelve a aprobar pasos ya aprobados.
+        response = self._decide('approve', [step.pk])
+        self.assertEqual(response.json()['results'][0]['error'], 'Your validation step is not pending')
+
+    def test_reject_requires_a_reason_and_rejects_each_document(self):
+        first = self._create(['approver-1', 'approver-2'], 'first')
+        other = self._create(['approver-2'], 'other')
+
+        self.assertEqual(self._decide('reject', [first.pk]).status_code, 400)
+
+        response = self._decide('reject', [first.pk, other.pk], reason='Ilegible')
+
+        self.assertEqual(
+            [(result['document_id'], result['status']) for result in response.json()['results']],
+            [(str(first.pk), 200), (str(other.pk), 403)],
+        )
+        first.refresh_from_db()
+        self.assertEqual(first.status, Document.STATUS.REJECTED)
+        self.assertEqual(self._stats_by_status(), {Document.STATUS.PENDING: 1, Document.STATUS.REJECTED: 1})
+        self.assertFalse(ValidationFlow.objects.get(document=first).enable)
+        self.assertEqual(
+            list(DocumentEvent.objects.values_list('event_type', 'document_id', 'payload__reason')),
+            [(DocumentEvent.EVENT_TYPE.REJECTED, first.pk, 'Ilegible')],
+        )
+
+    def test_invalid_payloads_are_rejected_before_touching_the_database(self):
+        for document_ids in ([], ['not-a-uuid'], [uuid.uuid4() for _ in range(MAX_BULK_DECISIONS + 1)]):
+            with self.subTest(count=len(document_ids)), self.assertNumQueries(0):
+                self.assertEqual(self._decide('approve', document_ids).status_code, 400)
+
+
+@override_settings(PRESIGNED_URL_EXPIRES_IN=3600, PRESIGNED_URL_REFRESH_MARGIN=300)
+class DownloadUrlCacheTests(TestCase):
+    def setUp(self):
+        caches[settings.PRESIGNED_URL_CACHE_ALIAS].clear()
+        mock_s3_client(self)
+
+    def _download(self, at):
+        with mock.patch('time.time', return_value=at):
+            return download_from_s3('companies/acme/doc.pdf')
+
+    def test_url_is_reused_until_the_refresh_margin(self):
+        before = get_presigned_url_cache_stats()
+        now = time.time()
+
+        url = self._download(now)
+        self.assertEqual(self._download(now + 3299), url)
+        self.assertNotEqual(self._download(now + 3301), url)
+
+        after = get_presigned_url_cache_stats()
+        self.assertEqual((after['hits'] - before['hits'], after['misses'] - before['misses']), (1, 2))
+        self.assertEqual(self.client.get('/api/metrics/').json()['presigned_url_cache'], after)
+
+    @override_settings(PRESIGNED_URL_REFRESH_MARGIN=3600)
+    def test_url_is_not_cached_when_the_margin_covers_the_expiry(self):
+        now = time.time()
+
+        self.assertNotEqual(self._download(now), self._download(now))
+
+
+@override_settings(MULTIPART_UPLOAD_THRESHOLD=10 * 1024 * 1024, MULTIPART_PART_SIZE=8 * 1024 * 1024)
+class MultipartUploadTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='ACME', max_upload_size_bytes=100 * 1024 * 1024)
+        self.entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        self.s3_client = mock_s3_client(self)
+        self.s3_client.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        self.s3_client.complete_multipart_upload.return_value = {'ETag': '"etag-3"'}
+
+    def _post(self, url, data):
+        return self.client.post(url, data, content_type='application/json')
+
+    def _create(self, size_bytes):
+        return self._post('/api/documents/', document_payload(self.company, self.entity, 'big.pdf', size_bytes=size_bytes))
+
+    def test_part_size_grows_to_respect_the_s3_limits(self):
+        self.assertEqual(get_multipart_layout(20 * 1024 * 1024), (8 * 1024 * 1024, 3))
+        with self.settings(MULTIPART_PART_SIZE=1024):
+            self.assertEqual(get_multipart_layout(12 * 1024 * 1024), (S3_MIN_PART_SIZE, 3))
+
+        size_bytes = 200 * 1024 ** 3
+        part_size, part_count = get_multipart_layout(size_bytes)
+        self.assertGreater(part_size, 8 * 1024 * 1024)
+        self.assertLessEqual(part_count, S3_MAX_PARTS)
+        self.assertGreaterEqual(part_size * part_count, size_bytes)
+
+    def test_large_document_gets_one_presigned_url_per_part(self):
+        response = self._create(20 * 1024 * 1024)
+
+        self.assertEqual(response.status_code, 201)
+        multipart_upload = response.json()['multipart_upload']
+        self.assertEqual(multipart_upload['part_size'], 8 * 1024 * 1024)
+        self.assertEqual([part['part_number'] for part in multipart_upload['parts']], [1, 2, 3])
+        self.assertEqual(Document.objects.get().upload_id, 'upload-1')
+
+    def test_replayed_create_signs_the_part_urls_again(self):
+        payload = document_payload(self.company, self.entity, 'big.pdf', size_bytes=20 * 1024 * 1024)
+        first = self.client.post('/api/documents/', payload, content_type='application/json', headers={'Idempotency-Key': 'key-1'})
+        retry = self.client.post('/api/documents/', payload, content_type='application/json', headers={'Idempotency-Key': 'key-1'})
+
+        original_parts, replayed_parts = first.json()['multipart_upload']['parts'], retry.json()['multipart_upload']['parts']
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual([part['part_number'] for part in replayed_parts], [1, 2, 3])
+        self.assertTrue(set(part['upload_url'] for part in replayed_parts).isdisjoint(part['upload_url'] for part in original_parts))
+        self.s3_client.create_multipart_upload.assert_called_once()
+
+    def test_async_create_checks_the_blob_once_and_starts_the_upload(self):
+        payload = document_payload(self.company, self.entity, 'big.pdf', size_bytes=20 * 1024 * 1024, sha256='a' * 64)
+        reuse = mock.Mock(wraps=reuse_uploaded_blob)
+        with mock.patch('documents.views.reuse_uploaded_blob', reuse), \
+                mock.patch('documents.services.document_service.reuse_uploaded_blob', reuse):
+            response = self._post('/api/async/documents/', payload)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['multipart_upload']['parts']), 3)
+        self.assertEqual(Document.objects.get().upload_id, 'upload-1')
+        reuse.assert_called_once()
+        self.s3_client.create_multipart_upload.assert_called_once()
+
+    def test_company_limit_is_enforced(self):
+        response = self._create(self.company.max_upload_size_bytes + 1)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Document.objects.exists())
+        self.s3_client.create_multipart_upload.assert_not_called()
+
+    def test_complete_sends_the_parts_in_order(self):
+        document_id = self._create(20 * 1024 * 1024).json()['document']['id']
+        url = f'/api/documents/{document_id}/multipart/complete/'
+
+        self.assertEqual(self._post(url, {'parts': [{'part_number': 1}]}).status_code, 400)
+        response = self._post(url, {'parts': [{'part_number': number, 'etag': f'e{number}'} for number in (3, 1, 2)]})
+
+        self.assertEqual(response.status_code, 200)
+        parts = self.s3_client.complete_multipart_upload.call_args.kwargs['MultipartUpload']['Parts']
+        self.assertEqual([part['PartNumber'] for part in parts], [1, 2, 3])
+        self.assertIsNone(Document.objects.get(pk=document_id).upload_id)
+        self.assertEqual(self._post(url, {'parts': parts}).status_code, 400)
+
+    def test_abort_removes_the_document(self):
+        document_id = self._create(20 * 1024 * 1024).json()['document']['id']
+
+        response = self._post(f'/api/documents/{document_id}/multipart/abort/', {})
+
+        self.assertEqual(response.status_code, 200)
+        self.s3_client.abort_multipart_upload.assert_called_once()
+        self.assertFalse(Document.objects.exists())
+        self.assertFalse(ValidationFlow.objects.exists())
+        self.assertEqual(get_company_stats(self.company.pk)['document_count'], 0)
+        self.assertEqual(
+            list(DocumentEvent.objects.order_by('id').values_list('event_type', flat=True)),
+            [DocumentEvent.EVENT_TYPE.CREATED, DocumentEvent.EVENT_TYPE.DELETED],
+        )
+
+
+@s3_test_settings
+class UploadEventIngestionTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name='ACME')
+        entity = BusinessEntity.objects.create(company=company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        self.document = create_document(company, entity, bucket_key='companies/acme/my doc.pdf')
+        record_document_stats([document_stats_change(self.document)])
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool_dir = spool_dir.name
+        self.queue = SpoolDirectoryEventQueue(self.spool_dir)
+
+    def _notification(self, key, bucket='bucket', event_name='ObjectCreated:Put'):
+        return {'Records': [{
+            'eventName': event_name,
+            's3': {'bucket': {'name': bucket}, 'object': {'key': key, 'size': 4096, 'eTag': 'etag-1'}},
+        }]}
+
+    def _ingest(self):
+        call_command('ingest_upload_events', spool_dir=self.spool_dir, once=True, stdout=io.StringIO())
+
+    def test_ingests_spooled_notifications(self):
+        # Una notificación envuelta por SNS con la clave codificada como en S3.
+        self.queue.publish({'Message': json.dumps(self._notification('companies/acme/my+doc.pdf'))})
+        self.queue.publish(self._notification('companies/acme/my+doc.pdf', bucket='other-bucket'))
+
+        self._ingest()
+
+        self.document.refresh_from_db()
+        self.assertEqual(
+            (self.document.upload_state, self.document.etag, self.document.size_bytes),
+            (Document.UPLOAD_STATE.UPLOADED, 'etag-1', 4096),
+        )
+        self.assertEqual(get_company_stats(self.document.company_id)['size_bytes'], 4096)
+        self.assertEqual(self.queue.receive(10), [])
+
+    def test_ignores_events_that_are_not_object_created(self):
+        self.queue.publish(self._notification('companies/acme/my+doc.pdf', event_name='ObjectRemoved:Delete'))
+
+        self._ingest()
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.upload_state, Document.UPLOAD_STATE.PENDING)
+
+
+@s3_test_settings
+class BlobDeduplicationTests(TestCase):
+    sha256 = 'a' * 64
+
+    def setUp(self):
+        company = Company.objects.create(name='ACME')
+        entity = BusinessEntity.objects.create(company=company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        self.payloads = [document_payload(company, entity, f'{index}.pdf', sha256=self.sha256) for index in range(2)]
+        self.client = APIClient()
+
+    def _create(self, payload):
+        response = self.client.post('/api/documents/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_shared_object_is_purged_after_its_last_reference(self):
+        original = self._create(self.payloads[0])
+        blob = Blob.objects.get()
+        apply_object_created_events([(blob.bucket_key, 1024, 'etag-1')])
+
+        duplicate = self._create(self.payloads[1])
+        self.assertTrue(duplicate['deduplicated'])
+        self.assertEqual(duplicate['document']['bucket_key'], blob.bucket_key)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 2)
+
+        self.client.delete(f'/api/documents/{original["document"]["id"]}/')
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertFalse(StoragePurge.objects.exists())
+
+        self.client.delete(f'/api/documents/{duplicate["document"]["id"]}/')
+        self.assertEqual(list(StoragePurge.objects.values_list('bucket_key', flat=True)), [blob.bucket_key])
+
+        with mock.patch('documents.services.purge_service.delete_objects', return_value=[]) as delete_objects:
+            self.assertEqual(purge_batch(), (1, 0))
+        delete_objects.assert_called_once_with([blob.bucket_key])
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(Document.objects.exists())
+
+
+class ReconcileStorageTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='ACME')
+        self.entity = BusinessEntity.objects.create(company=self.company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        self.prefix = f'companies/{self.company.pk}/'
+        self.old = timezone.now() - timedelta(days=2)
+        self.objects = []
+
+        patcher = mock.patch('documents.management.commands.reconcile_storage.iter_bucket_objects', self.iter_bucket_objects)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('documents.management.commands.reconcile_storage.delete_objects', return_value=[])
+        self.delete_objects = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def iter_bucket_objects(self, prefix, start_after=''):
+        return iter(sorted(
+            s3_object for s3_object in self.objects
+            if s3_object[0].startswith(prefix) and s3_object[0] > start_after
+        ))
+
+    def add_object(self, name, last_modified):
+        self.objects.append((self.prefix + name, last_modified))
+
+    def add_document(self, name, created_at, **fields):
+        document = create_document(self.company, self.entity, bucket_key=self.prefix + name, **fields)
+        Document.objects.filter(pk=document.pk).update(created_at=created_at)
+        return document
+
+    def reconcile(self, *args):
+        stdout = io.StringIO()
+        call_command('reconcile_storage', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_reports_without_deleting_by_default(self):
+        self.add_object('a.pdf', self.old)
+        self.add_document('a.pdf', self.old)
+        self.add_object('orphan.pdf', self.old)
+        self.add_document('missing.pdf', self.old)
+
+        output = self.reconcile()
+
+        self.assertIn('matched=1, orphan_objects=1, missing_rows=1, deleted_objects=0, deleted_rows=0', output)
+        self.delete_objects.assert_not_called()
+        self.assertEqual(Document.objects.count(), 2)
+
+    def test_deletes_only_what_is_older_than_the_grace_window(self):
+        self.add_object('old-orphan.pdf', self.old)
+        self.add_object('new-orphan.pdf', timezone.now())
+        old_missing = self.add_document('old-missing.pdf', self.old)
+        new_missing = self.add_document('new-missing.pdf', timezone.now())
+        uploaded = self.add_document('uploaded.pdf', self.old)
+        Document.objects.filter(pk=uploaded.pk).update(upload_state=Document.UPLOAD_STATE.UPLOADED)
+
+        output = self.reconcile('--delete-orphan-objects', '--delete-missing-rows')
+
+        self.assertIn('orphan_objects=2, missing_rows=3, deleted_objects=1, deleted_rows=1', output)
+        self.delete_objects.assert_called_once_with([self.prefix + 'old-orphan.pdf'])
+        self.assertFalse(Document.objects.filter(pk=old_missing.pk).exists())
+        self.assertEqual(
+            list(DocumentEvent.objects.values_list('event_type', 'document_id')),
+            [(DocumentEvent.EVENT_TYPE.DELETED, old_missing.pk)],
+        )
+        self.assertEqual(Document.objects.filter(pk__in=[new_missing.pk, uploaded.pk]).count(), 2)
+
+    def test_documents_sharing_a_blob_match_one_object(self):
+        blob = Blob.objects.create(
+            company=self.company, sha256='a' * 64, bucket_key=self.prefix + 'shared.pdf', size_bytes=1024, ref_count=2,
+        )
+        for _ in range(2):
+            self.add_document('shared.pdf', self.old, blob=blob)
+        self.add_object('shared.pdf', self.old)
+        self.add_object('z.pdf', self.old)
+
+        output = self.reconcile('--delete-orphan-objects', '--delete-missing-rows')
+
+        self.assertIn('matched=1, orphan_objects=1, missing_rows=0, deleted_objects=1, deleted_rows=0', output)
+        self.delete_objects.assert_called_once_with([self.prefix + 'z.pdf'])
+
+    def test_resumes_from_a_checkpoint(self):
+        for name in ('a.pdf', 'b.pdf', 'c.pdf'):
+            self.add_object(name, self.old)
+            self.add_document(name, self.old)
+        self.add_object('orphan.pdf', self.old)
+        checkpoint_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(checkpoint_dir.cleanup)
+        checkpoint_path = Path(checkpoint_dir.name) / 'reconcile.json'
+        checkpoint_path.write_text(json.dumps({'company_id': str(self.company.pk), 'after_key': self.prefix + 'b.pdf'}))
+
+        output = self.reconcile('--checkpoint', str(checkpoint_path))
+
+        # Solo se reconcilian las claves posteriores a la guardada.
+        self.assertIn('matched=1, orphan_objects=1, missing_rows=0', output)
+        self.assertFalse(checkpoint_path.exists())
+
+
+def failing_job(payload):
+    raise RuntimeError(payload['error'])
+
+
+@mock.patch.dict(_handlers, {'tests.failing': failing_job})
+class JobQueueTests(TestCase):
+    def _claim_and_run(self):
+        stats = new_job_stats()
+        with self.assertLogs('documents.services.jobs', level='ERROR'):
+            for job in claim_jobs(10):
+                run_job(job, stats)
+        return stats
+
+    def test_failed_job_is_retried_with_exponential_backoff(self):
+        job = enqueue_job('tests.failing', {'error': 'boom'})
+
+        for attempt in (1, 2):
+            Job.objects.filter(pk=job.pk).update(available_at=timezone.now())
+            before = timezone.now()
+            stats = self._claim_and_run()
+
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.last_error), (Job.STATUS.QUEUED, attempt, 'boom'))
+            self.assertGreaterEqual(job.available_at, before + get_retry_delay(attempt))
+            self.assertEqual(stats['tests.failing']['retried'], 1)
+        self.assertEqual(get_retry_delay(2), 2 * get_retry_delay(1))
+
+    def test_job_fails_after_max_attempts(self):
+        job = enqueue_job('tests.failing', {'error': 'boom'}, max_attempts=2)
+
+        for _ in range(2):
+            Job.objects.filter(pk=job.pk).update(available_at=timezone.now())
+            stats = self._claim_and_run()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS.FAILED, 2))
+        self.assertEqual(stats['tests.failing']['failed'], 1)
+        # Un job en FAILED no se vuelve a reclamar.
+        Job.objects.filter(pk=job.pk).update(available_at=timezone.now())
+        self.assertEqual(claim_jobs(10), [])
+
+    def test_unique_key_deduplicates_queued_jobs(self):
+        enqueue_job('tests.failing', unique_key='key-1')
+        enqueue_job('tests.failing', unique_key='key-1')
+        enqueue_job('tests.failing', unique_key='key-2')
+        enqueue_job('tests.other', unique_key='key-1')
+
+        self.assertEqual(Job.objects.filter(job_type='tests.failing').count(), 2)
+
+        # Un job ya reclamado no impide encolar otro con la misma clave.
+        claim_jobs(10)
+        enqueue_job('tests.failing', unique_key='key-1')
+        self.assertEqual(Job.objects.filter(job_type='tests.failing', unique_key='key-1').count(), 2)
+
+    def test_retry_is_dropped_when_an_equivalent_job_is_queued(self):
+        enqueue_job('tests.failing', {'error': 'boom'}, unique_key='key-1')
+        [claimed] = claim_jobs(10)
+        enqueue_job('tests.failing', {'error': 'boom'}, unique_key='key-1')
+
+        stats = new_job_stats()
+        with self.assertLogs('documents.services.jobs', level='ERROR'):
+            run_job(claimed, stats)
+
+        self.assertFalse(Job.objects.filter(pk=claimed.pk).exists())
+        self.assertEqual(list(Job.objects.values_list('status', 'attempts')), [(Job.STATUS.QUEUED, 0)])
+        self.assertEqual(stats['tests.failing']['retried'], 1)
+
+    def test_purge_job_processes_a_bounded_number_of_batches(self):
+        with mock.patch('documents.services.purge_service.purge_batch', return_value=(1000, 0)) as purge_batch:
+            run_purge_job({'slot': 2})
+
+        self.assertEqual(purge_batch.call_count, PURGE_JOB_MAX_BATCHES)
+        # Queda trabajo: la continuación se encola en el mismo hueco.
+        self.assertEqual(
+            list(Job.objects.values_list('job_type', 'payload', 'unique_key', 'status')),
+            [(PURGE_JOB_TYPE, {'slot': 2}, '2', Job.STATUS.QUEUED)],
+        )
+
+        Job.objects.all().delete()
+        with mock.patch('documents.services.purge_service.purge_batch', side_effect=[(10, 0), (0, 0)]):
+            run_purge_job({'slot': 2})
+        self.assertFalse(Job.objects.exists())
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class JobClaimConcurrencyTests(TransactionTestCase):
+    def _claim_in_another_connection(self):
+        try:
+            return [job.pk for job in claim_jobs(10)]
+        finally:
+            connection.close()
+
+    def test_claim_skips_jobs_locked_by_another_worker(self):
+        locked = enqueue_job('tests.failing')
+        free = enqueue_job('tests.failing')
+
+        with transaction.atomic():
+            Job.objects.select_for_update().get(pk=locked.pk)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                claimed = executor.submit(self._claim_in_another_connection).result(timeout=10)
+
+        self.assertEqual(claimed, [free.pk])
+        self.assertEqual(claim_jobs(10), [Job.objects.get(pk=locked.pk)])
+
+    def test_worker_survives_an_error_recording_a_job_result(self):
+        job = enqueue_job('tests.failing')
+
+        with mock.patch('documents.management.commands.run_workers.run_job', side_effect=RuntimeError('db down')), \
+                self.assertLogs('documents.management.commands.run_workers', level='ERROR'):
+            call_command('run_workers', concurrency=1, once=True, stdout=io.StringIO())
+
+        # El job sigue reclamado y se reintenta al vencer su plazo.
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS.RUNNING, 1))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'El feed de cambios usa txid_current() de PostgreSQL')
+class ChangeFeedTests(TransactionTestCase):
+    def setUp(self):
+        company = Company.objects.create(name='ACME')
+        entity = BusinessEntity.objects.create(company=company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+        self.documents = [
+            create_document(company, entity, bucket_key=f'companies/acme/{index}.pdf') for index in range(3)
+        ]
+
+    def _record(self, document):
+        record_document_events([build_document_event(DocumentEvent.EVENT_TYPE.CREATED, document)])
+
+    def _changes(self, since=None):
+        response = self.client.get('/api/changes/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _hold_open_transaction(self, document, recorded, release):
+        try:
+            with transaction.atomic():
+                self._record(document)
+                recorded.set()
+                release.wait(timeout=10)
+        finally:
+            connection.close()
+
+    def test_open_transaction_holds_back_later_events(self):
+        first, delayed, last = self.documents
+        self._record(first)
+        recorded, release = threading.Event(), threading.Event()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            holder = executor.submit(self._hold_open_transaction, delayed, recorded, release)
+            self.assertTrue(recorded.wait(timeout=10))
+            self._record(last)
+
+            page = self._changes()
+            self.assertEqual([event['document_id'] for event in page['results']], [str(first.pk)])
+
+            release.set()
+            holder.result(timeout=10)
+
+        page = self._changes(page['since'])
+        # El evento confirmado tarde no queda por detrás del cursor ya entregado.
+        self.assertEqual(
+            [event['document_id'] for event in page['results']],
+            [str(delayed.pk), str(last.pk)],
+        )
+
+    def test_since_is_returned_on_empty_pages(self):
+        self._record(self.documents[0])
+        since = self._changes()['since']
+
+        page = self._changes(since)
+        self.assertEqual((page['results'], page['since']), ([], since))
+
+        self._record(self.documents[1])
+        page = self._changes(since)
+        self.assertEqual([event['document_id'] for event in page['results']], [str(self.documents[1].pk)])
+        self.assertNotEqual(page['since'], since)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Los streams usan LISTEN/NOTIFY de PostgreSQL')
+class DocumentEventStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.companies = [Company.objects.create(name=name) for name in ('ACME', 'Globex')]
+        self.documents = []
+        for company in self.companies:
+            entity = BusinessEntity.objects.create(company=company, entity_type=BusinessEntity.ENTITY_TYPE.VEHICLE)
+            self.documents += [
+                create_document(company, entity, bucket_key=f'companies/{company.pk}/{index}.pdf') for index in range(2)
+            ]
+
+    @sync_to_async
+    def _record(self, document, event_type=DocumentEvent.EVENT_TYPE.CREATED):
+        record_document_events([build_document_event(event_type, document)])
+
+    async def _open_stream(self, **params):
+        response = await self.async_client.get('/api/documents/stream/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        return stream
+
+    async def _next_event(self, stream):
+        chunk = (await asyncio.wait_for(anext(stream), timeout=5)).decode()
+        event_id, event_type, data = chunk.strip().split('\n')
+        return event_type.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    async def _disconnect(self, stream):
+        # Como el servidor ASGI al desconectarse el cliente: cancela la lectura en curso.
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+
+    async def test_streams_committed_events_matching_the_filters(self):
+        acme, globex = self.companies
+        company_stream = await self._open_stream(company=str(acme.pk))
+        document_stream = await self._open_stream(document=str(self.documents[1].pk))
+
+        await self._record(self.documents[2])
+        await self._record(self.documents[0])
+        await self._record(self.documents[1], DocumentEvent.EVENT_TYPE.APPROVED)
+
+        event_type, event = await self._next_event(company_stream)
+        self.assertEqual((event_type, event['document_id']), ('document.created', str(self.documents[0].pk)))
+        event_type, event = await self._next_event(company_stream)
+        self.assertEqual((event_type, event['document_id']), ('document.approved', str(self.documents[1].pk)))
+
+        event_type, event = await self._next_event(document_stream)
+        self.assertEqual((event_type, event['company_id']), ('document.approved', str(acme.pk)))
+
+        await self._disconnect(company_stream)
+        await self._disconnect(document_stream)
+
+    async def test_events_of_a_rolled_back_transaction_are_not_streamed(self):
+        stream = await self._open_stream()
+
+        @sync_to_async
+        def record_and_roll_back():
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    record_document_events([build_document_event(DocumentEvent.EVENT_TYPE.CREATED, self.documents[0])])
+                    raise RuntimeError('rollback')
+
+        await record_and_roll_back()
+        await self._record(self.documents[1])
+
+        _, event = await self._next_event(stream)
+        self.assertEqual(event['document_id'], str(self.documents[1].pk))
+        await self._disconnect(stream)
+
+    async def test_disconnect_removes_the_subscription(self):
+        stream = await self._open_stream()
+        self.assertEqual(len(broadcaster.subscriptions), 1)
+        self.assertIsNotNone(broadcaster.listen_connection)
+
+        await self._disconnect(stream)
+
+        self.assertEqual(broadcaster.subscriptions, set())
+        self.assertIsNone(broadcaster.listen_connection)
+
+    async def test_invalid_filter_is_rejected(self):
+        response = await self.async_client.get('/api/documents/stream/', {'company': 'not-a-uuid'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(broadcaster.subscriptions, set())
+
+
+class SigV4PresignerTests(SimpleTestCase):
+    NOW = datetime(2026, 3, 1, 23, 59, 59)
+    KEYS = [
+        'companies/acme/vehicles/1/docs/dossier.pdf',
+        'companies/acme/a b/ñandú+informe?.pdf',
+        "/leading//double/./../c~d!*'()$&,;=@[]",
+        'emoji/\U0001F4C4.pdf',
+    ]
+    CONFIGS = [
+        {'region_name': 'us-east-1'},
+        {'region_name': 'eu-west-1'},
+        {'region_name': 'eu-west-1', 'addressing_style': 'path'},
+        {'region_name': 'eu-west-1', 'addressing_style': 'virtual'},
+        {'region_name': 'us-east-1', 'endpoint_url': 'http://localhost:9000'},
+        {'region_name': 'us-east-1', 'endpoint_url': 'https://minio.internal:9443', 'addressing_style': 'path'},
+    ]
+
+    def _client(self, region_name, addressing_style='auto', endpoint_url=None):
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client(
+            's3',
+            aws_access_key_id='AKIAEXAMPLE',
+            aws_secret_access_key='wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY',
+            region_name=region_name,
+            endpoint_url=endpoint_url,
+            config=Config(signature_version='s3v4', s3={'addressing_style': addressing_style}),
+        )
+
+    def _assert_same_urls(self, operation, method, params=(), content_type=None, expires_in=3600):
+        for config in self.CONFIGS:
+            s3_client = self._client(**config)
+            presigner = SigV4Presigner(s3_client, 'my-bucket', 'AKIAEXAMPLE', 'wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY')
+            for bucket_key in self.KEYS:
+                with self.subTest(config=config, bucket_key=bucket_key):
+                    botocore_params = {'Bucket': 'my-bucket', 'Key': bucket_key}
+                    botocore_params.update({name[0].upper() + name[1:]: value for name, value in params})
+                    if content_type is not None:
+                        botocore_params['ContentType'] = content_type
+                    with mock.patch('botocore.auth.get_current_datetime', return_value=self.NOW):
+                        expected = s3_client.generate_presigned_url(operation, Params=botocore_params, ExpiresIn=expires_in)
+                    actual = presigner.presign(
+                        method, bucket_key, expires_in, params=params, content_type=content_type, now=self.NOW,
+                    )
+                    self.assertEqual(actual, expected)
+
+    def test_get_object_matches_botocore(self):
+        self._assert_same_urls('get_object', 'GET')
+
+    def test_get_object_custom_expiry_matches_botocore(self):
+        self._assert_same_urls('get_object', 'GET', expires_in=60)
+
+    def test_put_object_with_content_type_matches_botocore(self):
+        self._assert_same_urls('put_object', 'PUT', content_type='application/pdf')
+        self._assert_same_urls(
+            'put_object', 'PUT',
+            content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        )
+
+    def test_upload_part_matches_botocore(self):
+        self._assert_same_urls('upload_part', 'PUT', params=[('uploadId', 'a~b/c+d=EXAMPLE'), ('partNumber', 7)])
+
+    def test_signing_key_is_cached_per_day(self):
+        presigner = SigV4Presigner(self._client('eu-west-1'), 'my-bucket', 'AKIAEXAMPLE', 'secret')
+        first = presigner.get_signing_key('20260301')
+        self.assertIs(presigner.get_signing_key('20260301'), first)
+        self.assertNotEqual(presigner.get_signing_key('20260302'), first)
+
+
+# Sin la transacción de TestCase: lo leído de la base de datos se cachea al confirmarse.
+class ModelCacheTests(TransactionTestCase):
+    def setUp(self):
+        company_cache.clear()
+        self.addCleanup(company_cache.clear)
+        self.company = Company.objects.create(name='ACME')
+
+    def _counters(self):
+        stats = company_cache.get_stats()
+        return stats['local_hits'], stats['shared_hits'], stats['misses']
+
+    def test_counts_hits_and_misses(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(company_cache.get(self.company.pk).name, 'ACME')
+            self.assertEqual(company_cache.get(str(self.company.pk)).name, 'ACME')
+        self.assertEqual(self._counters(), (1, 0, 1))
+
+        # Las filas inexistentes y los ids inválidos no se cachean.
+        missing = uuid.uuid4()
+        with self.assertNumQueries(2):
+            self.assertIsNone(company_cache.get(missing))
+            self.assertIsNone(company_cache.get(missing))
+        self.assertIsNone(company_cache.get('not-a-uuid'))
+        self.assertEqual(self._counters(), (1, 0, 3))
+
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.json()['model_cache']['company'], company_cache.get_stats())
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'models-test'}},
+        MODEL_CACHE_ALIAS='default',
+    )
+    def test_shared_tier_serves_rows_missing_from_the_local_lru(self):
+        company_cache.get(self.company.pk)
+        company_cache.clear()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(company_cache.get_many([self.company.pk]), {self.company.pk: mock.ANY})
+        self.assertEqual(self._counters(), (0, 1, 0))
+
+    def test_returns_copies_of_the_cached_row(self):
+        company_cache.get(self.company.pk).name = 'Changed'
+
+        self.assertEqual(company_cache.get(self.company.pk).name, 'ACME')
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'models-test'}},
+        MODEL_CACHE_ALIAS='default',
+    )
+    def test_rows_read_in_a_rolled_back_transaction_are_not_cached(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.company.name = 'Globex'
+            self.company.save()
+            self.assertEqual(company_cache.get(self.company.pk).name, 'Globex')
+            raise RuntimeError
+
+        self.assertEqual(company_cache.get(self.company.pk).name, 'ACME')
+        self.assertEqual(company_cache.get_many([self.company.pk])[self.company.pk].name, 'ACME')
+
+    def test_save_and_delete_invalidate_the_cached_row(self):
+        self.assertEqual(self.client.get(f'/api/companies/{self.company.pk}/').json()['name'], 'ACME')
+
+        response = self.client.patch(f'/api/companies/{self.company.pk}/', {'name': 'Globex'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(f'/api/companies/{self.company.pk}/').json()['name'], 'Globex')
+
+        self.assertEqual(self.client.delete(f'/api/companies/{self.company.pk}/').status_code, 204)
+        self.assertEqual(self.client.get(f'/api/companies/{self.company.pk}/').status_code, 404)
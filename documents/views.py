@@ -1,14 +1,72 @@
+import asyncio
+import csv
+import json
 import uuid
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from rest_framework import viewsets
+from django.db.models import ProtectedError
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import generics, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample
+from rest_framework.views import APIView
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiParameter
 
 
-from documents.services.s3_service import generate_presigned_upload_url, download_from_s3
-from .serializers import CompanySerializer,BusinessEntitySerializer,DocumentSerializer,ValidationFlowSerializer,ValidationStepSerializer
-from .models import Company,BusinessEntity,Document,ValidationFlow,ValidationStep
+from documents.services.s3_service import (
+    generate_presigned_upload_urls, download_from_s3, adownload_from_s3, agenerate_presigned_upload_url,
+    get_presigned_url_cache_stats, complete_multipart_upload, abort_multipart_upload
+)
+from documents.services.idempotency import (
+    IDEMPOTENCY_HEADER, claim_idempotency_key, get_request_fingerprint, save_idempotent_response
+)
+from documents.services.approval_service import (
+    MAX_BULK_DECISIONS, approve_documents, refresh_step_flows, reject_documents
+)
+from documents.services.jobs import get_job_metrics
+from documents.services.model_cache import business_entity_cache, company_cache, get_model_cache_stats
+from documents.services.notifications import broadcaster
+from documents.services.outbox import build_document_event, record_document_events, visible_document_events
+from documents.services.purge_service import soft_delete_documents, delete_business_entity, delete_company, delete_documents
+from documents.services.stats_service import document_stats_change, get_company_stats, record_document_stats
+from documents.services.document_service import (
+    MAX_BULK_DOCUMENTS, validate_document_payload, validate_upload_size, use_multipart_upload,
+    build_bucket_key, build_document_records, get_flow_template, get_flow_template_id, presign_document_upload,
+    refresh_upload_urls, reuse_uploaded_blob, save_document_records, start_multipart_upload
+)
+from .serializers import CompanySerializer,BusinessEntitySerializer,DocumentSerializer,ValidationFlowSerializer,ValidationFlowTemplateSerializer,ValidationStepSerializer,PendingStepSerializer,DocumentEventSerializer
+from .serializers import (
+    BulkCreateDocumentsSerializer, ApproveDocumentSerializer, RejectDocumentSerializer, CompleteMultipartUploadSerializer,
+    BulkApproveDocumentsSerializer, BulkRejectDocumentsSerializer
+)
+from .models import Company,BusinessEntity,Document,ValidationFlow,ValidationFlowTemplate,ValidationStep,DocumentEvent
+from .filters import filter_documents, filter_validation_flow_templates, filter_validation_steps, parse_event_stream_filters
+from .pagination import DocumentCursorPagination, PendingStepCursorPagination, ChangeFeedPagination
+
+
+class CachedRetrieveMixin:
+    """
+    Sirve las acciones de `cached_actions` desde `model_cache` en lugar de
+    consultar la fila; las escrituras siguen leyendo de la base de datos.
+    """
+    model_cache = None
+    cached_actions = ('retrieve',)
+
+    def get_object(self):
+        if self.action not in self.cached_actions:
+            return super().get_object()
+        instance = self.model_cache.get(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if instance is None:
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
 
 
 @extend_schema_view(
@@ -39,13 +97,67 @@ from .models import Company,BusinessEntity,Document,ValidationFlow,ValidationSte
     ),
     destroy=extend_schema(
         summary="Eliminar empresa",
-        description="Elimina una empresa del sistema",
+        description="""
+        Elimina una empresa del sistema junto con sus entidades de negocio y documentos.
+
+        Los objetos de S3 de los documentos se encolan y los borra en segundo plano
+        el comando `purge_storage`.
+        """,
         tags=["Empresas"]
     )
 )
-class CompanyViewSet(viewsets.ModelViewSet):
+class CompanyViewSet(CachedRetrieveMixin, viewsets.ModelViewSet):
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
+    model_cache = company_cache
+    cached_actions = ('retrieve', 'stats')
+
+    def perform_destroy(self, instance):
+        delete_company(instance)
+
+    @extend_schema(
+        summary="Estadísticas de documentos de la empresa",
+        description="""
+        Devuelve el número de documentos vivos de la empresa y la suma de su `size_bytes`, en total y por tipo
+        de entidad y estado (`status` es null en los documentos sin flujo de validación).
+
+        Se sirve de contadores que se actualizan en la misma transacción que la creación, aprobación, rechazo
+        y borrado de documentos, sin recorrer los documentos. `rebuild_document_stats` los recalcula.
+        """,
+        tags=["Empresas"],
+        responses={
+            200: {
+                'type': 'object',
+                'properties': {
+                    'company': {'type': 'string', 'format': 'uuid'},
+                    'document_count': {'type': 'integer'},
+                    'size_bytes': {'type': 'integer'},
+                    'breakdown': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'entity_type': {'type': 'string', 'enum': BusinessEntity.ENTITY_TYPE.values},
+                                'status': {'type': 'string', 'enum': Document.STATUS.values, 'nullable': True},
+                                'document_count': {'type': 'integer'},
+                                'size_bytes': {'type': 'integer'},
+                            }
+                        }
+                    }
+                }
+            },
+            404: {
+                'type': 'object',
+                'properties': {
+                    'detail': {'type': 'string'}
+                }
+            }
+        }
+    )
+    @action(detail=True, methods=['get'], url_path='stats')
+    def stats(self, request, pk=None):
+        company = self.get_object()
+        return Response(get_company_stats(company.pk), status=200)
 
 @extend_schema_view(
     list=extend_schema(
@@ -75,13 +187,22 @@ class CompanyViewSet(viewsets.ModelViewSet):
     ),
     destroy=extend_schema(
         summary="Eliminar entidad de negocio",
-        description="Elimina una entidad de negocio del sistema",
+        description="""
+        Elimina una entidad de negocio del sistema junto con sus documentos.
+
+        Los objetos de S3 de los documentos se encolan y los borra en segundo plano
+        el comando `purge_storage`.
+        """,
         tags=["Entidades de Negocio"]
     )
 )
-class BusinessEntityViewSet(viewsets.ModelViewSet):
+class BusinessEntityViewSet(CachedRetrieveMixin, viewsets.ModelViewSet):
     queryset = BusinessEntity.objects.all()
     serializer_class = BusinessEntitySerializer
+    model_cache = business_entity_cache
+
+    def perform_destroy(self, instance):
+        delete_business_entity(instance)
 
 @extend_schema_view(
     list=extend_schema(
@@ -119,11 +240,64 @@ class ValidationFlowViewSet(viewsets.ModelViewSet):
     queryset = ValidationFlow.objects.all()
     serializer_class = ValidationFlowSerializer
 
+@extend_schema_view(
+    list=extend_schema(
+        summary="Listar plantillas de flujo de validación",
+        description="Obtiene las cadenas de aprobación reutilizables, opcionalmente de una empresa",
+        tags=["Flujos de Validación"],
+        parameters=[
+            OpenApiParameter('company', str, description='Filtra por ID de empresa'),
+        ]
+    ),
+    create=extend_schema(
+        summary="Crear plantilla de flujo de validación",
+        description="""
+        Crea una cadena de aprobación reutilizable para los documentos de una empresa.
+
+        Los documentos la usan enviando `validation_flow: {"enabled": true, "template_id": "<id>"}` al crearse,
+        en lugar de la lista `steps`: no se copian pasos por documento.
+
+        Las plantillas no se pueden modificar (los flujos en curso dependen de sus pasos); para cambiar la cadena
+        se crea una plantilla nueva.
+        """,
+        tags=["Flujos de Validación"]
+    ),
+    retrieve=extend_schema(
+        summary="Obtener plantilla de flujo de validación",
+        description="Obtiene los pasos de una plantilla",
+        tags=["Flujos de Validación"]
+    ),
+    destroy=extend_schema(
+        summary="Eliminar plantilla de flujo de validación",
+        description="Elimina una plantilla que ningún documento usa",
+        tags=["Flujos de Validación"]
+    )
+)
+class ValidationFlowTemplateViewSet(viewsets.ModelViewSet):
+    queryset = ValidationFlowTemplate.objects.all()
+    serializer_class = ValidationFlowTemplateSerializer
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_validation_flow_templates(queryset, self.request.query_params)
+        return queryset
+
+    def perform_destroy(self, instance):
+        try:
+            instance.delete()
+        except ProtectedError:
+            raise ValidationError({'error': 'The template is used by existing validation flows'})
+
 @extend_schema_view(
     list=extend_schema(
         summary="Listar pasos de validación",
         description="Obtiene la lista de todos los pasos de validación",
-        tags=["Pasos de Validación"]
+        tags=["Pasos de Validación"],
+        parameters=[
+            OpenApiParameter('validation_flow', str, description='Filtra por ID de flujo de validación'),
+        ]
     ),
     create=extend_schema(
         summary="Crear paso de validación",
@@ -155,11 +329,51 @@ class ValidationStepViewSet(viewsets.ModelViewSet):
     queryset = ValidationStep.objects.all()
     serializer_class = ValidationStepSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_validation_steps(queryset, self.request.query_params)
+        return queryset
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+            refresh_step_flows(ValidationFlow.objects.filter(pk=serializer.instance.validation_flow_id))
+
+    def perform_update(self, serializer):
+        # El paso puede cambiar de flujo: se recalculan el anterior y el nuevo.
+        previous_flow_id = serializer.instance.validation_flow_id
+        with transaction.atomic():
+            super().perform_update(serializer)
+            refresh_step_flows(ValidationFlow.objects.filter(pk__in=[previous_flow_id, serializer.instance.validation_flow_id]))
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            refresh_step_flows(ValidationFlow.objects.filter(pk=instance.validation_flow_id))
+
 @extend_schema_view(
     list=extend_schema(
         summary="Listar documentos",
-        description="Obtiene la lista de todos los documentos subidos al sistema con sus estados de validación",
-        tags=["Documentos"]
+        description="""
+        Obtiene la lista paginada de los documentos subidos al sistema con sus estados de validación.
+
+        **Paginación:**
+        - Los resultados se ordenan por `created_at` e `id` descendentes
+        - Para obtener la siguiente página se sigue la URL devuelta en `next`
+        """,
+        tags=["Documentos"],
+        parameters=[
+            OpenApiParameter('company', str, description='Filtra por ID de empresa'),
+            OpenApiParameter('business_entity', str, description='Filtra por ID de entidad de negocio'),
+            OpenApiParameter('status', str, enum=Document.STATUS.values, description='Filtra por estado del documento'),
+            OpenApiParameter('created_after', str, description='Documentos creados desde esta fecha (ISO 8601, inclusive)'),
+            OpenApiParameter('created_before', str, description='Documentos creados antes de esta fecha (ISO 8601, exclusiva)'),
+            OpenApiParameter(
+                'expand', str,
+                description='Incluye relaciones separadas por coma: `validation_flow`, `steps` (flujo con sus pasos)'
+            ),
+        ]
     ),
     create=extend_schema(
         summary="Crear documento y obtener URL de subida",
@@ -167,9 +381,9 @@ class ValidationStepViewSet(viewsets.ModelViewSet):
         Crea un nuevo documento en el sistema y genera una URL presignada de S3 para subir el archivo.
         
         **Proceso:**
-        1. Se crea el registro del documento en la base de datos
+        1. Se valida la petición y se resuelven la empresa y la entidad
         2. Se genera una URL presignada de S3 para subir el archivo
-        3. Se configura el flujo de validación si está habilitado
+        3. Se crean el documento y su flujo de validación (si está habilitado) en una única transacción
         
         **Respuesta:**
         - `document`: Datos del documento creado
@@ -182,8 +396,37 @@ class ValidationStepViewSet(viewsets.ModelViewSet):
         - URL: La URL devuelta en `upload_url`
         - Headers: `Content-Type: {content_type}`
         - Body: Archivo en formato binary
+
+        **Subida multiparte:**
+        - Se usa cuando `document.multipart` es `true` o el tamaño supera `MULTIPART_UPLOAD_THRESHOLD`
+        - El tamaño máximo lo define `max_upload_size_bytes` de la empresa
+        - En lugar de `upload_url` se devuelve `multipart_upload` con `part_size` y una URL presignada por parte
+        - Cada parte se sube con PUT (en paralelo si se desea) y se guarda el `ETag` de la respuesta
+        - Al terminar se llama a `POST /documents/{id}/multipart/complete/` con las partes,
+          o a `POST /documents/{id}/multipart/abort/` para cancelar
+
+        **Plantillas de validación:**
+        - `validation_flow: {"enabled": true, "template_id": "<id>"}` usa una plantilla de la empresa
+          (`/validationflowtemplates/`) en lugar de la lista `steps`
+        - El documento no copia los pasos: su flujo guarda solo el paso actual y el registro de decisiones
+
+        **Deduplicación (`document.sha256`):**
+        - Opcionalmente se envía el SHA-256 del archivo (hex en minúsculas)
+        - Si la empresa ya subió un archivo con ese hash y tamaño, el documento apunta al mismo objeto de S3:
+          se devuelve `deduplicated: true` en lugar de `upload_url` y el documento ya está subido (`upload_state` = `U`)
+        - Si no, la subida es la normal y el archivo queda disponible para deduplicar cuando S3 confirme la subida
+        - El objeto se borra de S3 cuando se borra el último documento que lo usa
+
+        **Reintentos (`Idempotency-Key`):**
+        - Si se envía la cabecera `Idempotency-Key`, los reintentos con la misma clave devuelven la
+          respuesta original (con `Idempotent-Replayed: true`) sin crear nada, con las URLs de subida presignadas de nuevo
+        - Una clave reutilizada con otro payload devuelve 422; mientras la petición original sigue en curso, 409
+        - Las claves caducan a las `IDEMPOTENCY_KEY_TTL` segundos (24 h por defecto)
         """,
         tags=["Documentos"],
+        parameters=[
+            OpenApiParameter('Idempotency-Key', str, OpenApiParameter.HEADER, description='Clave única por intento lógico de creación'),
+        ],
         examples=[
             OpenApiExample(
                 'Documento con validación',
@@ -222,7 +465,8 @@ class ValidationStepViewSet(viewsets.ModelViewSet):
                     "document_data": {
                         "name": "factura-123.pdf",
                         "mime_type": "application/pdf",
-                        "size_bytes": 512000
+                        "size_bytes": 512000,
+                        "sha256": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
                     },
                     "entity_data": {
                         "entity_type": "vehicle",
@@ -240,7 +484,13 @@ class ValidationStepViewSet(viewsets.ModelViewSet):
     retrieve=extend_schema(
         summary="Obtener documento",
         description="Obtiene los detalles completos de un documento específico incluyendo su estado de validación",
-        tags=["Documentos"]
+        tags=["Documentos"],
+        parameters=[
+            OpenApiParameter(
+                'expand', str,
+                description='Incluye relaciones separadas por coma: `validation_flow`, `steps` (flujo con sus pasos)'
+            ),
+        ]
     ),
     update=extend_schema(
         summary="Actualizar documento",
@@ -254,100 +504,302 @@ class ValidationStepViewSet(viewsets.ModelViewSet):
     ),
     destroy=extend_schema(
         summary="Eliminar documento",
-        description="Elimina un documento del sistema y de S3",
+        description="""
+        Elimina un documento del sistema y de S3.
+
+        **Proceso:**
+        1. El documento se marca como borrado y deja de aparecer en la API
+        2. Su flujo de validación se desactiva
+        3. El objeto de S3 se encola; el comando `purge_storage` lo borra en lotes
+           con `DeleteObjects` y elimina después la fila
+        """,
         tags=["Documentos"]
     )
 )
 class DocumentViewSet(viewsets.ModelViewSet):
-    queryset = Document.objects.all()
+    queryset = Document.objects.alive()
     serializer_class = DocumentSerializer
+    pagination_class = DocumentCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_documents(queryset, self.request.query_params)
+
+        expand = self.get_expand()
+        if 'validation_flow' in expand or 'steps' in expand:
+            queryset = queryset.select_related('validation_flow', 'validation_flow__template')
+        if 'steps' in expand:
+            queryset = queryset.prefetch_related('validation_flow__steps', 'validation_flow__decisions')
+        return queryset
+
+    def get_expand(self):
+        if self.action not in ('list', 'retrieve'):
+            return set()
 
+        expand = {
+            value.strip()
+            for value in self.request.query_params.get('expand', '').split(',')
+            if value.strip()
+        }
+        unknown = expand - set(DocumentSerializer.EXPANDABLE_FIELDS)
+        if unknown:
+            raise ValidationError({
+                'expand': f'Unknown values: {", ".join(sorted(unknown))}. '
+                          f'Allowed: {", ".join(DocumentSerializer.EXPANDABLE_FIELDS)}'
+            })
+        return expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+    def run_idempotent(self, request, scope, handler):
+        """
+        Ejecuta `handler` una sola vez por cabecera `Idempotency-Key`: los
+        reintentos con la misma clave reciben la respuesta guardada.
+        """
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return handler()
+
+        record, stored = claim_idempotency_key(scope, key, get_request_fingerprint(request.data))
+        if stored is not None:
+            status, body, replayed = stored
+            if replayed and status == 201:
+                body = refresh_upload_urls(body)
+            return Response(body, status=status, headers={'Idempotent-Replayed': 'true'} if replayed else None)
+
+        try:
+            response = handler()
+        except Exception:
+            save_idempotent_response(record, 500, None)
+            raise
+        save_idempotent_response(record, response.status_code, response.data)
+        return response
+
+    def perform_update(self, serializer):
+        # Cambiar de empresa o entidad mueve el documento entre contadores.
+        with transaction.atomic():
+            previous = document_stats_change(serializer.instance, sign=-1)
+            document = serializer.save()
+            record_document_stats([previous, document_stats_change(document)])
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            soft_delete_documents(Document.objects.filter(pk=instance.pk))
+            record_document_events([build_document_event(DocumentEvent.EVENT_TYPE.DELETED, instance)])
     
-    @transaction.atomic
     def create(self, request, *args, **kwargs):
+        return self.run_idempotent(request, 'documents.create', lambda: self.create_document(request))
+
+    def create_document(self, request):
         try:
+            error = validate_document_payload(request.data)
+            if error:
+                return Response({'error': error}, status=400)
+
             company_id = request.data.get('company_id')
             entity_data = request.data.get('entity')
             document_data = request.data.get('document')
-            validation_flow_data = request.data.get('validation_flow')
 
+            company = company_cache.get(company_id)
+            if company is None:
+                return Response({'error': f'Company with id {company_id} does not exist'}, status=400)
 
-            if not company_id or not entity_data or not document_data:
-                return Response({'error': 'Missing required fields: company_id, entity, document'}, status=400)
+            business_entity = business_entity_cache.get(entity_data['entity_id'])
+            if business_entity is None:
+                return Response({'error': f'BusinessEntity with id {entity_data["entity_id"]} does not exist'}, status=400)
 
-            if document_data.get('size_bytes', 0) > 10 * 1024 * 1024:
-                return Response({'error': 'File size exceeds 10MB limit'}, status=400)
+            error = validate_upload_size(document_data, company)
+            if error:
+                return Response({'error': error}, status=400)
 
-            allowed_mimes = [
-                'application/pdf', 'image/jpeg', 'image/png', 'image/jpg', 
-                'application/msword', 
-                'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-            ]
-            if document_data.get('mime_type') not in allowed_mimes:
-                return Response({'error': f'MIME type not allowed. Allowed: {", ".join(allowed_mimes)}'}, status=400)
+            template, error = get_flow_template(request.data, company)
+            if error:
+                return Response({'error': error}, status=400)
 
-            
-            try:
-                company = Company.objects.get(id=company_id)
-            except Company.DoesNotExist:
-                return Response({'error': f'Company with id {company_id} does not exist'}, status=400)
+            bucket_key = build_bucket_key(company_id, entity_data, document_data)
 
-            
-            try:
-                business_entity = BusinessEntity.objects.get(id=entity_data['entity_id'])
-            except BusinessEntity.DoesNotExist:
-                return Response({'error': f'BusinessEntity with id {entity_data["entity_id"]} does not exist'}, status=400)
-            except KeyError:
-                return Response({'error': 'entity_id is required in entity data'}, status=400)
-
-            
-            bucket_key = document_data.get('bucket_key')
-            if not bucket_key:
-                entity_type = entity_data.get('entity_type', 'entity')
-                bucket_key = f'companies/{company_id}/{entity_type}s/{entity_data["entity_id"]}/docs/{uuid.uuid4()}-{document_data.get("name")}'
-
-            has_validation = validation_flow_data.get('enabled', False) if validation_flow_data else False
-            initial_status = Document.STATUS.PENDING if has_validation else None
-            
-            upload_url = generate_presigned_upload_url(
-                bucket_key=bucket_key,
-                content_type=document_data['mime_type'],
-            )
-            
-            
-            document = Document.objects.create(
-                name=document_data['name'],
-                mime_type=document_data['mime_type'],
-                size_bytes=document_data['size_bytes'],
-                bucket_key=bucket_key,
-                company=company,
-                business_entity=business_entity,
-                status=initial_status,
-                created_by=request.data.get('created_by')
+            document, validation_flow, steps = build_document_records(
+                request.data, company, business_entity, bucket_key,
+                created_by=request.data.get('created_by'), template=template
             )
 
-            
-            if has_validation and validation_flow_data.get('steps'):
-                validation_flow = ValidationFlow.objects.create(document=document, enable=True)
-                
-                for step_data in validation_flow_data['steps']:
-                    ValidationStep.objects.create(
-                        order=step_data['order'],
-                        approver_user_id=step_data['approver_user_id'],
-                        validation_flow=validation_flow
-                    )
+            response_data = presign_document_upload(document, document_data)
+            save_document_records(document, validation_flow, steps, sha256=document_data.get('sha256'))
 
             serializer = self.serializer_class(document)
-            response_data = {
-                'document': serializer.data,
-                'upload_url': upload_url,
-            }
-            
+            response_data['document'] = serializer.data
+
             return Response(response_data, status=201)
 
         except Exception as e:
             return Response({'error': f'Failed to create document: {str(e)}'}, status=500)
 
+    @extend_schema(
+        summary="Crear documentos en lote",
+        description=f"""
+        Crea varios documentos en una sola petición y devuelve una URL presignada de subida por documento.
+
+        **Proceso:**
+        1. Se validan todos los documentos; si alguno es inválido no se crea ninguno
+        2. Las empresas y entidades se resuelven con una consulta por tabla
+        3. Documentos, flujos y pasos se insertan con inserciones masivas en una sola transacción
+        4. Se genera una URL presignada de S3 por documento
+
+        **Límites:**
+        - Máximo {MAX_BULK_DOCUMENTS} documentos por petición
+        - Sin deduplicación: `document.sha256` se ignora y cada documento recibe su propia subida
+
+        **Respuesta:**
+        - `results`: Lista en el mismo orden de la petición con `document` y `upload_url`
+        - `errors`: (solo en 400) Lista de errores con el `index` del documento inválido
+
+        **Reintentos (`Idempotency-Key`):**
+        - Si se envía la cabecera `Idempotency-Key`, los reintentos con la misma clave devuelven la
+          respuesta original (con `Idempotent-Replayed: true`) sin crear nada, con las URLs de subida presignadas de nuevo
+        - Una clave reutilizada con otro payload devuelve 422; mientras la petición original sigue en curso, 409
+        - Las claves caducan a las `IDEMPOTENCY_KEY_TTL` segundos (24 h por defecto)
+        """,
+        tags=["Documentos"],
+        parameters=[
+            OpenApiParameter('Idempotency-Key', str, OpenApiParameter.HEADER, description='Clave única por intento lógico de creación'),
+        ],
+        request=BulkCreateDocumentsSerializer,
+        responses={
+            201: {
+                'type': 'object',
+                'properties': {
+                    'results': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'document': {'type': 'object'},
+                                'upload_url': {'type': 'string', 'format': 'uri'}
+                            }
+                        }
+                    }
+                }
+            },
+            400: {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string'},
+                    'errors': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'index': {'type': 'integer'},
+                                'error': {'type': 'string'}
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        return self.run_idempotent(request, 'documents.bulk', lambda: self.bulk_create_documents(request))
+
+    def bulk_create_documents(self, request):
+        payloads = request.data.get('documents')
+
+        if not isinstance(payloads, list) or not payloads:
+            return Response({'error': 'documents must be a non-empty list'}, status=400)
+
+        if len(payloads) > MAX_BULK_DOCUMENTS:
+            return Response({'error': f'A maximum of {MAX_BULK_DOCUMENTS} documents can be created per request'}, status=400)
+
+        errors = []
+        for index, payload in enumerate(payloads):
+            error = validate_document_payload(payload) if isinstance(payload, dict) else 'Each document must be an object'
+            if error:
+                errors.append({'index': index, 'error': error})
+        if errors:
+            return Response({'error': 'Invalid documents', 'errors': errors}, status=400)
+
+        try:
+            companies = company_cache.get_many({payload['company_id'] for payload in payloads})
+            entities = business_entity_cache.get_many({payload['entity']['entity_id'] for payload in payloads})
+            templates = ValidationFlowTemplate.objects.in_bulk(
+                {get_flow_template_id(payload) for payload in payloads} - {None}
+            )
+
+            documents, flows, steps, uploads = [], [], [], []
+            seen_keys = set()
+            for index, payload in enumerate(payloads):
+                company_id = payload['company_id']
+                entity_data = payload['entity']
+                document_data = payload['document']
+
+                company = companies.get(uuid.UUID(str(company_id)))
+                business_entity = entities.get(uuid.UUID(str(entity_data['entity_id'])))
+                if company is None:
+                    errors.append({'index': index, 'error': f'Company with id {company_id} does not exist'})
+                    continue
+                if business_entity is None:
+                    errors.append({'index': index, 'error': f'BusinessEntity with id {entity_data["entity_id"]} does not exist'})
+                    continue
+
+                error = validate_upload_size(document_data, company)
+                if not error and use_multipart_upload(document_data):
+                    error = 'Multipart uploads are not supported in bulk; create this document individually'
+                if error:
+                    errors.append({'index': index, 'error': error})
+                    continue
+
+                template_id = get_flow_template_id(payload)
+                template = templates.get(template_id)
+                if template_id and (template is None or template.company_id != company.pk):
+                    errors.append({'index': index, 'error': f'ValidationFlowTemplate with id {template_id} does not exist'})
+                    continue
+
+                bucket_key = build_bucket_key(company_id, entity_data, document_data)
+                if bucket_key in seen_keys:
+                    errors.append({'index': index, 'error': f'Duplicated bucket_key {bucket_key}'})
+                    continue
+                seen_keys.add(bucket_key)
+
+                document, validation_flow, document_steps = build_document_records(
+                    payload, company, business_entity, bucket_key,
+                    created_by=payload.get('created_by'), template=template
+                )
+                documents.append(document)
+                if validation_flow:
+                    flows.append(validation_flow)
+                    steps.extend(document_steps)
+                uploads.append((bucket_key, document_data['mime_type']))
+
+            if errors:
+                return Response({'error': 'Invalid documents', 'errors': errors}, status=400)
+
+            upload_urls = generate_presigned_upload_urls(uploads)
+
+            with transaction.atomic():
+                Document.objects.bulk_create(documents, batch_size=500)
+                ValidationFlow.objects.bulk_create(flows, batch_size=500)
+                ValidationStep.objects.bulk_create(steps, batch_size=1000)
+                record_document_events([
+                    build_document_event(DocumentEvent.EVENT_TYPE.CREATED, document) for document in documents
+                ])
+                record_document_stats([document_stats_change(document) for document in documents])
+
+            serializer = self.serializer_class(documents, many=True)
+            results = [
+                {'document': document_data, 'upload_url': upload_url}
+                for document_data, upload_url in zip(serializer.data, upload_urls)
+            ]
+
+            return Response({'results': results}, status=201)
+
+        except Exception as e:
+            return Response({'error': f'Failed to create documents: {str(e)}'}, status=500)
+
     @extend_schema(
         summary="Descargar documento",
         description="""
@@ -356,9 +808,14 @@ class DocumentViewSet(viewsets.ModelViewSet):
         **Requisitos:**
         - El documento debe existir
         - El documento debe estar aprobado (si tiene flujo de validación)
+        - El archivo debe haberse subido a S3 (`upload_state` = `U`)
         
         **Respuesta:**
         - `download_url`: URL presignada válida por 1 hora para descargar el archivo
+
+        **Caché:**
+        - La misma URL se reutiliza para el documento mientras le quede más de `PRESIGNED_URL_REFRESH_MARGIN`
+          (5 minutos por defecto) de validez, lo que permite a navegadores y CDN cachear la descarga
         """,
         tags=["Documentos"],
         responses={
@@ -398,6 +855,9 @@ class DocumentViewSet(viewsets.ModelViewSet):
     
         if document.status != Document.STATUS.APPROVED:
             return Response({'error': 'Document is not available for download'}, status=400)
+
+        if document.upload_state != Document.UPLOAD_STATE.UPLOADED:
+            return Response({'error': 'Document file has not been uploaded yet'}, status=400)
     
         try:
             url = download_from_s3(document.bucket_key)
@@ -405,6 +865,96 @@ class DocumentViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
+    @extend_schema(
+        summary="Completar subida multiparte",
+        description="""
+        Completa la subida multiparte de un documento una vez subidas todas sus partes.
+
+        **Requisitos:**
+        - El documento debe tener una subida multiparte en curso
+        - Se deben enviar todas las partes con su `part_number` y el `ETag` devuelto por S3 al subirlas
+        """,
+        tags=["Documentos"],
+        request=CompleteMultipartUploadSerializer,
+        responses={
+            200: {
+                'type': 'object',
+                'properties': {
+                    'message': {'type': 'string', 'enum': ['Upload completed']}
+                }
+            },
+            400: {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string'}
+                }
+            }
+        }
+    )
+    @action(detail=True, methods=['post'], url_path='multipart/complete')
+    def complete_multipart(self, request, pk=None):
+        document = self.get_object()
+        parts = request.data.get('parts')
+
+        if not document.upload_id:
+            return Response({'error': 'Document has no multipart upload in progress'}, status=400)
+
+        if not isinstance(parts, list) or not parts:
+            return Response({'error': 'parts must be a non-empty list'}, status=400)
+
+        if any(not isinstance(part, dict) or not isinstance(part.get('part_number'), int) or not part.get('etag') for part in parts):
+            return Response({'error': 'Each part requires part_number and etag'}, status=400)
+
+        try:
+            complete_multipart_upload(document.bucket_key, document.upload_id, parts)
+        except Exception as e:
+            return Response({'error': str(e)}, status=400)
+
+        Document.objects.filter(pk=document.pk).update(upload_id=None, updated_at=timezone.now())
+        return Response({'message': 'Upload completed'}, status=200)
+
+    @extend_schema(
+        summary="Cancelar subida multiparte",
+        description="""
+        Cancela la subida multiparte en curso de un documento.
+
+        **Proceso:**
+        1. Se aborta la subida en S3, liberando las partes ya subidas
+        2. Se elimina el documento y su flujo de validación
+        """,
+        tags=["Documentos"],
+        request=None,
+        responses={
+            200: {
+                'type': 'object',
+                'properties': {
+                    'message': {'type': 'string', 'enum': ['Upload aborted']}
+                }
+            },
+            400: {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string'}
+                }
+            }
+        }
+    )
+    @action(detail=True, methods=['post'], url_path='multipart/abort')
+    def abort_multipart(self, request, pk=None):
+        document = self.get_object()
+
+        if not document.upload_id:
+            return Response({'error': 'Document has no multipart upload in progress'}, status=400)
+
+        try:
+            abort_multipart_upload(document.bucket_key, document.upload_id)
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+
+        with transaction.atomic():
+            delete_documents(Document.objects.filter(pk=document.pk))
+        return Response({'message': 'Upload aborted'}, status=200)
+
     @extend_schema(
         summary="Aprobar documento",
         description="""
@@ -420,24 +970,13 @@ class DocumentViewSet(viewsets.ModelViewSet):
         **Estados del documento:**
         - `PENDING`: Documento en proceso de validación
         - `APPROVED`: Documento completamente aprobado
+
+        **Concurrencia:**
+        - El flujo de validación se bloquea durante la transición, por lo que aprobaciones y rechazos
+          simultáneos sobre el mismo documento se aplican uno tras otro
         """,
         tags=["Validación de Documentos"],
-        request={
-            'type': 'object',
-            'properties': {
-                'approver_user_id': {
-                    'type': 'string', 
-                    'format': 'uuid', 
-                    'description': 'ID del usuario que aprueba el documento'
-                },
-                'reason': {
-                    'type': 'string', 
-                    'description': 'Razón de la aprobación (opcional)',
-                    'example': 'Documento revisado y cumple con todos los requisitos'
-                }
-            },
-            'required': ['approver_user_id']
-        },
+        request=ApproveDocumentSerializer,
         responses={
             200: {
                 'type': 'object',
@@ -485,7 +1024,6 @@ class DocumentViewSet(viewsets.ModelViewSet):
             )
         ]
     )
-    @transaction.atomic
     @action(detail=True, methods=['post'], url_path='approve')
     def approve(self, request, pk=None):
         document = self.get_object()
@@ -495,43 +1033,7 @@ class DocumentViewSet(viewsets.ModelViewSet):
         if not approver_user_id:
             return Response({'error': 'Actor user ID is required'}, status=400)
 
-        flow = document.validation_flow
-
-        if not flow or not flow.enable:
-            return Response({'error': 'Validation flow is not enabled'}, status=400)
-
-        try:
-            step = flow.steps.get(approver_user_id=approver_user_id)
-        except ValidationStep.DoesNotExist:
-            return Response({
-                'error': f'User {approver_user_id} is not authorized to approve this document'
-            }, status=403)
-
-        if step.status != ValidationStep.STATUS.PENDING:
-            return Response({'error': 'Your validation step is not pending'}, status=400)
-
-        order = step.order
-        total_steps = flow.steps.count()
-        
-        if order == total_steps:
-            for s in flow.steps.filter(order__lte=order):
-                s.status = ValidationStep.STATUS.APPROVED
-                if s.order == order:
-                    s.reason = reason
-                s.save()
-            document.status = Document.STATUS.APPROVED
-            document.save()
-            document.validation_flow.enable = False
-            document.validation_flow.save()
-            return Response({'message': 'Document approved'}, status=200)
-        else:
-            steps_to_approve = flow.steps.filter(order__lte=order)
-            for s in steps_to_approve:
-                s.status = ValidationStep.STATUS.APPROVED
-                if s.order == order:
-                    s.reason = reason
-                s.save()
-            return Response({'message': 'Step approved'}, status=200)
+        return self.decision_response(approve_documents([document.pk], approver_user_id, reason)[0])
 
 
     @extend_schema(
@@ -550,24 +1052,11 @@ class DocumentViewSet(viewsets.ModelViewSet):
         - Un rechazo detiene todo el flujo de validación
         - El documento queda en estado `REJECTED` permanentemente
         - Se requiere obligatoriamente una razón del rechazo
+        - El flujo de validación se bloquea durante la transición, por lo que aprobaciones y rechazos
+          simultáneos sobre el mismo documento se aplican uno tras otro
         """,
         tags=["Validación de Documentos"],
-        request={
-            'type': 'object',
-            'properties': {
-                'approver_user_id': {
-                    'type': 'string', 
-                    'format': 'uuid', 
-                    'description': 'ID del usuario que rechaza el documento'
-                },
-                'reason': {
-                    'type': 'string', 
-                    'description': 'Razón obligatoria del rechazo',
-                    'example': 'El documento no cumple con los requisitos de formato establecidos'
-                }
-            },
-            'required': ['approver_user_id', 'reason']
-        },
+        request=RejectDocumentSerializer,
         responses={
             200: {
                 'type': 'object',
@@ -615,7 +1104,6 @@ class DocumentViewSet(viewsets.ModelViewSet):
             )
         ]
     )
-    @transaction.atomic
     @action(detail=True, methods=['post'], url_path='reject')
     def reject(self, request, pk=None):
         document = self.get_object()
@@ -628,51 +1116,496 @@ class DocumentViewSet(viewsets.ModelViewSet):
         if not reason:
             return Response({'error': 'Reason is required for rejection'}, status=400)
 
-        flow = document.validation_flow
-        if not flow or not flow.enable:
-            return Response({'error': 'Validation flow is not enabled'}, status=400)
+        return self.decision_response(reject_documents([document.pk], approver_user_id, reason)[0])
+
+    def decision_response(self, result):
+        if 'error' in result:
+            return Response({'error': result['error']}, status=result['status'])
+        return Response({'message': result['message']}, status=result['status'])
+
+    def parse_bulk_decision(self, request, reason_required):
+        """
+        Valida el payload de `bulk-approve`/`bulk-reject`. Devuelve
+        `(document_ids, approver_user_id, reason, error)` con los ids sin
+        duplicados y en el orden recibido.
+        """
+        document_ids = request.data.get('document_ids')
+        approver_user_id = request.data.get('approver_user_id')
+        reason = request.data.get('reason', '')
+
+        if not approver_user_id:
+            return None, None, None, 'Approver user ID is required'
+        if reason_required and not reason:
+            return None, None, None, 'Reason is required for rejection'
+        if not isinstance(document_ids, list) or not document_ids:
+            return None, None, None, 'document_ids must be a non-empty list'
+        if len(document_ids) > MAX_BULK_DECISIONS:
+            return None, None, None, f'A maximum of {MAX_BULK_DECISIONS} documents can be processed per request'
+        try:
+            document_ids = list(dict.fromkeys(uuid.UUID(str(document_id)) for document_id in document_ids))
+        except ValueError:
+            return None, None, None, 'document_ids must be a list of document UUIDs'
+        return document_ids, approver_user_id, reason, None
+
+    @extend_schema(
+        summary="Aprobar documentos en lote",
+        description=f"""
+        Aprueba el paso de `approver_user_id` en varios documentos en una sola petición, con las mismas
+        reglas que `POST /documents/{{id}}/approve/`.
+
+        **Proceso:**
+        1. Los flujos de todos los documentos se bloquean en una sola consulta
+        2. Cada documento se valida por separado; los que no se pueden aprobar no impiden aprobar el resto
+        3. Pasos, flujos y documentos se actualizan con una sentencia por tabla y se registran los eventos
+
+        **Límites:**
+        - Máximo {MAX_BULK_DECISIONS} documentos por petición
+
+        **Respuesta:**
+        - `results`: Un resultado por documento, en el orden de la petición, con `status` (200, 400, 403 o 404)
+          y `message` (`Step approved`, `Document approved`) o `error`
+        """,
+        tags=["Validación de Documentos"],
+        request=BulkApproveDocumentsSerializer,
+        responses={
+            200: {
+                'type': 'object',
+                'properties': {
+                    'results': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'document_id': {'type': 'string', 'format': 'uuid'},
+                                'status': {'type': 'integer'},
+                                'message': {'type': 'string'},
+                                'error': {'type': 'string'},
+                            }
+                        }
+                    }
+                }
+            },
+            400: {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string'}
+                }
+            }
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='bulk-approve')
+    def bulk_approve(self, request):
+        document_ids, approver_user_id, reason, error = self.parse_bulk_decision(request, reason_required=False)
+        if error:
+            return Response({'error': error}, status=400)
+        return Response({'results': approve_documents(document_ids, approver_user_id, reason)}, status=200)
+
+    @extend_schema(
+        summary="Rechazar documentos en lote",
+        description=f"""
+        Rechaza varios documentos en el paso de `approver_user_id` en una sola petición, con las mismas
+        reglas que `POST /documents/{{id}}/reject/`. La misma razón se guarda en todos.
+
+        **Proceso:**
+        1. Los flujos de todos los documentos se bloquean en una sola consulta
+        2. Cada documento se valida por separado; los que no se pueden rechazar no impiden rechazar el resto
+        3. Pasos, flujos y documentos se actualizan con una sentencia por tabla y se registran los eventos
+
+        **Límites:**
+        - Máximo {MAX_BULK_DECISIONS} documentos por petición
+
+        **Respuesta:**
+        - `results`: Un resultado por documento, en el orden de la petición, con `status` (200, 400, 403 o 404)
+          y `message` (`Document rejected`) o `error`
+        """,
+        tags=["Validación de Documentos"],
+        request=BulkRejectDocumentsSerializer,
+        responses={
+            200: {
+                'type': 'object',
+                'properties': {
+                    'results': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'document_id': {'type': 'string', 'format': 'uuid'},
+                                'status': {'type': 'integer'},
+                                'message': {'type': 'string'},
+                                'error': {'type': 'string'},
+                            }
+                        }
+                    }
+                }
+            },
+            400: {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string'}
+                }
+            }
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='bulk-reject')
+    def bulk_reject(self, request):
+        document_ids, approver_user_id, reason, error = self.parse_bulk_decision(request, reason_required=True)
+        if error:
+            return Response({'error': error}, status=400)
+        return Response({'results': reject_documents(document_ids, approver_user_id, reason)}, status=200)
+
+
+@extend_schema(
+    summary="Bandeja de pendientes del aprobador",
+    description="""
+    Obtiene los flujos de validación en los que es el turno del aprobador indicado, con el paso actual.
+
+    **Criterios:**
+    - El flujo de validación está habilitado
+    - El aprobador es el del paso actual del flujo (`current_order`), tenga el flujo pasos propios o use una plantilla
+
+    Cada resultado incluye el documento asociado. Los resultados se paginan por cursor;
+    para obtener la siguiente página se sigue la URL devuelta en `next`.
+    """,
+    tags=["Validación de Documentos"]
+)
+class ApproverPendingStepsView(generics.ListAPIView):
+    serializer_class = PendingStepSerializer
+    pagination_class = PendingStepCursorPagination
+
+    def get_queryset(self):
+        return ValidationFlow.objects.filter(
+            current_approver_user_id=self.kwargs['approver_user_id'],
+            enable=True,
+        ).select_related('document')
+
+
+@extend_schema(
+    summary="Feed de cambios de documentos",
+    description="""
+    Devuelve los eventos de cambio de estado de documentos (creación, aprobación de paso,
+    aprobación, rechazo y borrado) en orden estable y creciente.
+
+    **Uso:**
+    - La primera llamada sin `since` devuelve los eventos desde el principio
+    - Cada respuesta incluye en `since` el cursor a enviar en la siguiente llamada, aunque no haya eventos nuevos
+    - Mientras `next` no sea nulo hay más eventos disponibles de inmediato
+
+    Los eventos se escriben en la misma transacción que el cambio, así que un evento solo aparece
+    si el cambio se confirmó. Un evento puede tardar en aparecer mientras haya transacciones más
+    antiguas en curso, pero nunca aparece por detrás de un cursor ya entregado.
+    """,
+    tags=["Documentos"]
+)
+class ChangeFeedView(generics.ListAPIView):
+    serializer_class = DocumentEventSerializer
+    pagination_class = ChangeFeedPagination
+
+    def get_queryset(self):
+        return visible_document_events()
 
+
+class DocumentEventStreamView(View):
+    """
+    Stream Server-Sent Events con los cambios de estado de documentos, opcionalmente
+    filtrado por `company` o `document`. Requiere servir la aplicación por ASGI
+    (`storage.asgi`): cada conexión es una corrutina, no un hilo.
+    """
+    keepalive_seconds = 15
+
+    async def get(self, request):
         try:
-            step = flow.steps.get(approver_user_id=approver_user_id)
-        except ValidationStep.DoesNotExist:
-            return Response({
-                'error': f'User {approver_user_id} is not authorized to reject this document'
-            }, status=403)
+            company_id, document_id = parse_event_stream_filters(request.GET)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=400)
 
-        if step.status != ValidationStep.STATUS.PENDING:
-            return Response({'error': 'Your validation step is not pending'}, status=400)
+        subscription = await broadcaster.subscribe(company_id=company_id, document_id=document_id)
+        response = StreamingHttpResponse(self.stream(subscription), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
-  
-        step.status = ValidationStep.STATUS.REJECTED
-        step.reason = reason
-        step.save()
+    async def stream(self, subscription):
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=self.keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if event is None:
+                    break
+                yield f'id: {event["id"]}\nevent: {event["event_type"]}\ndata: {json.dumps(event)}\n\n'
+        finally:
+            broadcaster.unsubscribe(subscription)
 
 
-        document.status = Document.STATUS.REJECTED
-        document.save()
+class _EchoBuffer:
+    # `csv.writer` escribe en un buffer; este devuelve la línea en vez de guardarla.
+    def write(self, value):
+        return value
 
-        flow.enable = False
-        flow.save()
 
-        return Response({'message': 'Document rejected'}, status=200)
+class CompanyDocumentExportView(View):
+    """
+    Exporta todos los documentos vivos de una empresa como NDJSON (una línea
+    JSON por documento) o CSV (`?format=ndjson|csv`), con los campos de
+    `DocumentSerializer`.
 
+    Las filas se leen con un cursor de servidor en bloques de `chunk_size`,
+    con `values()` y no como instancias, y se envían según se leen: la memoria
+    no crece con el número de documentos. Por ASGI se itera con la API async
+    del ORM; por WSGI, con la síncrona.
+    """
+    chunk_size = 2000
+    columns = (
+        ('id', 'id'), ('name', 'name'), ('mime_type', 'mime_type'), ('size_bytes', 'size_bytes'),
+        ('bucket_key', 'bucket_key'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+        ('status', 'status'), ('upload_state', 'upload_state'), ('etag', 'etag'),
+        ('company', 'company_id'), ('business_entity', 'business_entity_id'),
+    )
+    content_types = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
 
+    def get(self, request, company_id):
+        export_format = request.GET.get('format', 'ndjson')
+        if export_format not in self.content_types:
+            return JsonResponse({'error': 'format must be one of: ndjson, csv'}, status=400)
+        if company_cache.get(company_id) is None:
+            return JsonResponse({'detail': 'No Company matches the given query.'}, status=404)
 
+        rows = (
+            Document.objects.alive()
+            .filter(company_id=company_id)
+            .order_by('created_at', 'id')
+            .values(*(field for _, field in self.columns))
+        )
+        self.json_encoder = JSONEncoder()
+        self.csv_writer = csv.writer(_EchoBuffer())
+        encode = self.encode_csv if export_format == 'csv' else self.encode_ndjson
+        if isinstance(request, ASGIRequest):
+            content = self.astream(rows, export_format, encode)
+        else:
+            content = self.stream(rows, export_format, encode)
 
+        response = StreamingHttpResponse(content, content_type=self.content_types[export_format])
+        response['Content-Disposition'] = f'attachment; filename="documents-{company_id}.{export_format}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
+    def stream(self, rows, export_format, encode):
+        if export_format == 'csv':
+            yield self.csv_writer.writerow(name for name, _ in self.columns)
+        lines, sent = [], False
+        for row in rows.iterator(chunk_size=self.chunk_size):
+            lines.append(encode(row))
+            # La primera fila sale sola para que el cliente reciba datos en cuanto llega.
+            if len(lines) == self.chunk_size or not sent:
+                yield ''.join(lines)
+                lines, sent = [], True
+        if lines:
+            yield ''.join(lines)
 
+    async def astream(self, rows, export_format, encode):
+        if export_format == 'csv':
+            yield self.csv_writer.writerow(name for name, _ in self.columns)
+        lines, sent = [], False
+        async for row in rows.aiterator(chunk_size=self.chunk_size):
+            lines.append(encode(row))
+            # La primera fila sale sola para que el cliente reciba datos en cuanto llega.
+            if len(lines) == self.chunk_size or not sent:
+                yield ''.join(lines)
+                lines, sent = [], True
+        if lines:
+            yield ''.join(lines)
 
+    def encode_ndjson(self, row):
+        return self.json_encoder.encode({name: row[field] for name, field in self.columns}) + '\n'
 
+    def encode_csv(self, row):
+        # Mismo formato que el JSON (y que DocumentSerializer) para UUIDs y fechas.
+        values = (row[field] for _, field in self.columns)
+        return self.csv_writer.writerow(
+            value if value is None or isinstance(value, (str, int)) else self.json_encoder.default(value)
+            for value in values
+        )
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncDocumentCreateView(View):
+    """
+    Variante async de `POST /api/documents/` para servir por ASGI. Acepta el
+    mismo payload y devuelve la misma respuesta. La URL presignada se calcula
+    en el event loop; el ORM pasa por el hilo de `sync_to_async` y solo la
+    llamada a S3 que inicia la subida multiparte va a un hilo aparte.
+    """
 
+    async def post(self, request):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
 
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return await self.create_document(data)
 
+        record, stored = await sync_to_async(claim_idempotency_key)(
+            'documents.create', key, get_request_fingerprint(data)
+        )
+        if stored is not None:
+            status, body, replayed = stored
+            if replayed and status == 201:
+                body = await sync_to_async(refresh_upload_urls)(body)
+            response = JsonResponse(body, status=status)
+            if replayed:
+                response['Idempotent-Replayed'] = 'true'
+            return response
 
+        try:
+            response = await self.create_document(data)
+        except Exception:
+            await sync_to_async(save_idempotent_response)(record, 500, None)
+            raise
+        await sync_to_async(save_idempotent_response)(record, response.status_code, json.loads(response.content))
+        return response
 
+    async def create_document(self, data):
+        try:
+            error = validate_document_payload(data)
+            if error:
+                return JsonResponse({'error': error}, status=400)
 
+            company_id = data.get('company_id')
+            entity_data = data.get('entity')
+            document_data = data.get('document')
+
+            company = await company_cache.aget(company_id)
+            if company is None:
+                return JsonResponse({'error': f'Company with id {company_id} does not exist'}, status=400)
+
+            business_entity = await business_entity_cache.aget(entity_data['entity_id'])
+            if business_entity is None:
+                return JsonResponse({'error': f'BusinessEntity with id {entity_data["entity_id"]} does not exist'}, status=400)
+
+            error = validate_upload_size(document_data, company)
+            if error:
+                return JsonResponse({'error': error}, status=400)
+
+            template, error = await sync_to_async(get_flow_template)(data, company)
+            if error:
+                return JsonResponse({'error': error}, status=400)
+
+            bucket_key = build_bucket_key(company_id, entity_data, document_data)
+
+            document, validation_flow, steps = build_document_records(
+                data, company, business_entity, bucket_key,
+                created_by=data.get('created_by'), template=template
+            )
+
+            if document_data.get('sha256') and await sync_to_async(reuse_uploaded_blob)(document, document_data):
+                response_data = {'deduplicated': True}
+            elif use_multipart_upload(document_data):
+                response_data = await sync_to_async(start_multipart_upload, thread_sensitive=False)(document, document_data)
+            else:
+                response_data = {
+                    'upload_url': await agenerate_presigned_upload_url(bucket_key, document_data['mime_type'])
+                }
+            await sync_to_async(save_document_records)(document, validation_flow, steps, sha256=document_data.get('sha256'))
+
+            response_data['document'] = DocumentSerializer(document).data
+            return JsonResponse(response_data, status=201)
+
+        except Exception as e:
+            return JsonResponse({'error': f'Failed to create document: {str(e)}'}, status=500)
 
- 
-        
 
+class AsyncDocumentDownloadView(View):
+    """
+    Variante async de `GET /api/documents/{id}/download/` para servir por ASGI.
+    """
+
+    async def get(self, request, pk):
+        document = await Document.objects.alive().filter(pk=pk).afirst()
+        if document is None:
+            return JsonResponse({'detail': 'No Document matches the given query.'}, status=404)
+
+        if document.status != Document.STATUS.APPROVED:
+            return JsonResponse({'error': 'Document is not available for download'}, status=400)
+
+        if document.upload_state != Document.UPLOAD_STATE.UPLOADED:
+            return JsonResponse({'error': 'Document file has not been uploaded yet'}, status=400)
+
+        try:
+            url = await adownload_from_s3(document.bucket_key)
+            return JsonResponse({'download_url': url}, status=200)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+@extend_schema(
+    summary="Métricas del servicio",
+    description="""
+    Devuelve contadores internos del proceso que atiende la petición.
+
+    **Métricas:**
+    - `presigned_url_cache`: aciertos, fallos y ratio de aciertos de la caché de URLs presignadas de descarga
+    - `model_cache`: por modelo (`company`, `business_entity`), aciertos en el LRU del proceso y en la caché
+      compartida, fallos, entradas en el LRU y ratio de aciertos
+    - `jobs`: por tipo de job, jobs en cola, en ejecución y agotados (`dead`), y totales acumulados por
+      los workers de `run_workers` (completados, reintentados, fallidos y duración media)
+    """,
+    tags=["Métricas"],
+    responses={
+        200: {
+            'type': 'object',
+            'properties': {
+                'presigned_url_cache': {
+                    'type': 'object',
+                    'properties': {
+                        'hits': {'type': 'integer'},
+                        'misses': {'type': 'integer'},
+                        'hit_ratio': {'type': 'number'}
+                    }
+                },
+                'model_cache': {
+                    'type': 'object',
+                    'additionalProperties': {
+                        'type': 'object',
+                        'properties': {
+                            'local_hits': {'type': 'integer'},
+                            'shared_hits': {'type': 'integer'},
+                            'misses': {'type': 'integer'},
+                            'entries': {'type': 'integer'},
+                            'hit_ratio': {'type': 'number'}
+                        }
+                    }
+                },
+                'jobs': {
+                    'type': 'object',
+                    'additionalProperties': {
+                        'type': 'object',
+                        'properties': {
+                            'queued': {'type': 'integer'},
+                            'running': {'type': 'integer'},
+                            'dead': {'type': 'integer'},
+                            'completed': {'type': 'integer'},
+                            'retried': {'type': 'integer'},
+                            'failed': {'type': 'integer'},
+                            'avg_runtime_ms': {'type': 'number', 'nullable': True}
+                        }
+                    }
+                }
+            }
+        }
+    }
+)
+class MetricsView(APIView):
 
+    def get(self, request):
+        return Response({
+            'presigned_url_cache': get_presigned_url_cache_stats(),
+            'model_cache': get_model_cache_stats(),
+            'jobs': get_job_metrics(),
+        }, status=200)
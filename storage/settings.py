@@ -20,6 +20,30 @@ AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME')
 AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME')
+AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL') or None
+AWS_S3_ADDRESSING_STYLE = os.getenv('AWS_S3_ADDRESSING_STYLE', 'auto')
+AWS_S3_SIGNATURE_VERSION = os.getenv('AWS_S3_SIGNATURE_VERSION', 's3v4')
+# Sign presigned URLs locally instead of through botocore (same output, much faster)
+AWS_S3_FAST_PRESIGN = os.getenv('AWS_S3_FAST_PRESIGN', 'true').lower() == 'true'
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_S3_MAX_POOL_CONNECTIONS', 50))
+AWS_S3_MAX_ATTEMPTS = int(os.getenv('AWS_S3_MAX_ATTEMPTS', 3))
+AWS_S3_RETRY_MODE = os.getenv('AWS_S3_RETRY_MODE', 'standard')
+AWS_S3_CONNECT_TIMEOUT = float(os.getenv('AWS_S3_CONNECT_TIMEOUT', 5))
+AWS_S3_READ_TIMEOUT = float(os.getenv('AWS_S3_READ_TIMEOUT', 30))
+
+UPLOAD_EVENTS_QUEUE_URL = os.getenv('UPLOAD_EVENTS_QUEUE_URL')
+UPLOAD_EVENTS_SQS_ENDPOINT_URL = os.getenv('UPLOAD_EVENTS_SQS_ENDPOINT_URL') or None
+UPLOAD_EVENTS_SPOOL_DIR = os.getenv('UPLOAD_EVENTS_SPOOL_DIR')
+
+MULTIPART_UPLOAD_THRESHOLD = int(os.getenv('MULTIPART_UPLOAD_THRESHOLD', 10 * 1024 * 1024))
+MULTIPART_PART_SIZE = int(os.getenv('MULTIPART_PART_SIZE', 8 * 1024 * 1024))
+
+PRESIGNED_URL_EXPIRES_IN = int(os.getenv('PRESIGNED_URL_EXPIRES_IN', 3600))
+PRESIGNED_URL_REFRESH_MARGIN = int(os.getenv('PRESIGNED_URL_REFRESH_MARGIN', 300))
+PRESIGNED_URL_CACHE_ALIAS = 'presigned_urls'
+
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', 60))
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -96,6 +120,44 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+PRESIGNED_URL_CACHE_BACKEND = os.getenv('PRESIGNED_URL_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Point PRESIGNED_URL_CACHE_BACKEND/LOCATION at a shared backend (e.g. Redis) to share
+    # presigned URLs between workers.
+    'presigned_urls': {
+        'BACKEND': PRESIGNED_URL_CACHE_BACKEND,
+        'LOCATION': os.getenv('PRESIGNED_URL_CACHE_LOCATION', 'presigned-urls'),
+    },
+}
+
+if PRESIGNED_URL_CACHE_BACKEND.endswith('LocMemCache'):
+    # LocMemCache evicts the least recently used entries once MAX_ENTRIES is reached.
+    CACHES['presigned_urls']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('PRESIGNED_URL_CACHE_MAX_ENTRIES', 10000)),
+    }
+
+# Company/BusinessEntity lookups are cached in a per-process LRU. Set MODEL_CACHE_BACKEND/LOCATION
+# to a shared backend (e.g. Redis) to add a second tier shared between workers.
+MODEL_CACHE_BACKEND = os.getenv('MODEL_CACHE_BACKEND')
+MODEL_CACHE_ALIAS = 'models' if MODEL_CACHE_BACKEND else None
+MODEL_CACHE_MAX_ENTRIES = int(os.getenv('MODEL_CACHE_MAX_ENTRIES', 10000))
+MODEL_CACHE_LOCAL_TTL = int(os.getenv('MODEL_CACHE_LOCAL_TTL', 30))
+MODEL_CACHE_TTL = int(os.getenv('MODEL_CACHE_TTL', 300))
+
+if MODEL_CACHE_BACKEND:
+    CACHES['models'] = {
+        'BACKEND': MODEL_CACHE_BACKEND,
+        'LOCATION': os.getenv('MODEL_CACHE_LOCATION', 'models'),
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -17,7 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter 
-from documents.views import CompanyViewSet,BusinessEntityViewSet,DocumentViewSet,ValidationFlowViewSet,ValidationStepViewSet
+from documents.views import CompanyViewSet,BusinessEntityViewSet,DocumentViewSet,ValidationFlowViewSet,ValidationFlowTemplateViewSet,ValidationStepViewSet,ApproverPendingStepsView,ChangeFeedView,DocumentEventStreamView,CompanyDocumentExportView,AsyncDocumentCreateView,AsyncDocumentDownloadView,MetricsView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView,SpectacularRedocView
 
 router = DefaultRouter()
@@ -25,11 +25,21 @@ router.register(r'companies', CompanyViewSet)
 router.register(r'entities', BusinessEntityViewSet)
 router.register(r'documents', DocumentViewSet)
 router.register(r'validationflows', ValidationFlowViewSet)
+router.register(r'validationflowtemplates', ValidationFlowTemplateViewSet)
 router.register(r'validationsteps', ValidationStepViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Before the router so `stream` is not taken as a document id
+    path('api/documents/stream/', DocumentEventStreamView.as_view(), name='document-stream'),
     path('api/', include(router.urls)),
+    path('api/approvers/<str:approver_user_id>/pending/', ApproverPendingStepsView.as_view(), name='approver-pending'),
+    # Async variants of document creation and download, for ASGI deployments
+    path('api/async/documents/', AsyncDocumentCreateView.as_view(), name='async-document-create'),
+    path('api/async/documents/<uuid:pk>/download/', AsyncDocumentDownloadView.as_view(), name='async-document-download'),
+    path('api/companies/<uuid:company_id>/documents/export/', CompanyDocumentExportView.as_view(), name='company-document-export'),
+    path('api/changes/', ChangeFeedView.as_view(), name='changes'),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
     # Swagger URLs
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),